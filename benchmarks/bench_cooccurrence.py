@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark the tag co-occurrence engine on a synthetic library.
+
+Times counting all tag pairs from scratch, an incremental update after 1% of
+the items were retagged, the PMI top-k neighbors of every tag and the .npz
+cache round trip.
+
+Usage: python benchmarks/bench_cooccurrence.py [assignments ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cooccurrence import TagCooccurrence  # noqa: E402
+from zoterolibrary import LibrarySnapshot  # noqa: E402
+
+
+def synthetic_pairs(n_assignments, tags_per_item=5, seed=0):
+    """(itemID, tagID) pairs with Zipf-distributed tag popularity, as in real libraries."""
+    rng = np.random.default_rng(seed)
+    n_items = n_assignments // tags_per_item
+    n_tags = max(10, n_assignments // 20)
+    tags = np.minimum(rng.zipf(1.3, size=n_assignments), n_tags)
+    items = np.repeat(np.arange(1, n_items + 1), tags_per_item)[:n_assignments]
+    return sorted(set(zip(items.tolist(), tags.tolist()))), n_tags
+
+
+def timed(label, run):
+    start = time.perf_counter()
+    result = run()
+    print(f"  {label:<28} {time.perf_counter() - start:8.3f} s")
+    return result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    for n_assignments in sizes:
+        pairs, n_tags = synthetic_pairs(n_assignments)
+        names = {tag_id: f"tag {tag_id}" for tag_id in range(1, n_tags + 1)}
+        library = LibrarySnapshot(names, pairs)
+        # Retag every 100th item
+        retagged = sorted({(item, tag % n_tags + 1 if item % 100 == 0 else tag) for item, tag in pairs})
+        changed_library = LibrarySnapshot(names, retagged)
+
+        print(f"{len(pairs)} tag assignments, {len(set(tag for _, tag in pairs))} tags")
+        cooccurrence = timed("count from scratch", lambda: TagCooccurrence.from_library(library))
+        timed("update after 1% retagged", lambda: cooccurrence.update(changed_library))
+        timed("PMI top-10 of every tag", lambda: cooccurrence.top_neighbors(10, "pmi", min_count=2))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cooccurrence.npz")
+            timed("save + load .npz", lambda: (cooccurrence.save(path), TagCooccurrence.load(path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark the edge rendering of the category network.
+
+Compares the old figure, with one go.Scatter trace per edge, against the
+batched figure that draws all edges as one NaN-separated polyline, by the
+size of the written HTML and the time write_html takes.
+
+Usage: python benchmarks/bench_network.py [edges ...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from visualizer import ZoteroVisualizer  # noqa: E402
+
+EDGE_STYLE = dict(mode="lines", line=dict(width=0.5, color="#888"), hoverinfo="none", showlegend=False)
+
+
+def synthetic_graph(n_edges, n_categories=20, seed=0):
+    """Random positions and (category, tag) edges with about two categories per tag."""
+    rng = np.random.default_rng(seed)
+    n_tags = max(1, n_edges // 2)
+    positions = rng.uniform(-1.0, 1.0, size=(n_categories + n_tags, 2))
+    edges = [
+        (int(c), n_categories + int(t))
+        for c, t in zip(rng.integers(0, n_categories, n_edges), rng.integers(0, n_tags, n_edges))
+    ]
+    return positions, edges, [f"category {i}" for i in range(n_categories)]
+
+
+def legacy_figure(positions, edges):
+    fig = go.Figure()
+    for src, dst in edges:
+        fig.add_trace(go.Scatter(x=positions[[src, dst], 0], y=positions[[src, dst], 1], **EDGE_STYLE))
+    return fig
+
+
+def batched_figure(positions, edges, category_names):
+    fig = go.Figure()
+    for _, x, y in ZoteroVisualizer._edge_polylines(positions, edges, category_names, per_category=False):
+        fig.add_trace(go.Scattergl(x=x, y=y, **EDGE_STYLE))
+    return fig
+
+
+def timed(label, build, path):
+    start = time.perf_counter()
+    build().write_html(path, include_plotlyjs=False)
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print(f"  {label:<22} {elapsed:8.2f} s {size / 1024:10.0f} KiB")
+    return elapsed, size
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "network.html")
+        for n_edges in sizes:
+            positions, edges, category_names = synthetic_graph(n_edges)
+            print(f"{n_edges} edges (build + write_html, without plotly.js)")
+            legacy_time, legacy_size = timed("one trace per edge", lambda: legacy_figure(positions, edges), path)
+            fast_time, fast_size = timed(
+                "single edge trace", lambda: batched_figure(positions, edges, category_names), path
+            )
+            print(f"  Speedup: {legacy_time / fast_time:.1f}x, {legacy_size / fast_size:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
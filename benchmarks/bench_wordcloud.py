@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark the word cloud input paths on a synthetic library.
+
+Compares the old path (every tag assignment joined into one shuffled string
+and re-tokenized by WordCloud.generate) against generate_from_frequencies
+fed with SQL-aggregated counts.
+
+Usage: python benchmarks/bench_wordcloud.py [assignments]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wordcloud import WordCloud  # noqa: E402
+
+from zoteroanalyzer import ZoteroAnalyzer  # noqa: E402
+
+WORDCLOUD_KWARGS = dict(width=800, height=400, max_words=100, random_state=0)
+
+
+def build_library(db_path, assignments, n_tags=5000, tags_per_item=10):
+    """Create a synthetic zotero.sqlite with the given number of tag assignments."""
+    rng = random.Random(0)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    conn.execute("CREATE TABLE itemTags (tagID INTEGER, itemID INTEGER)")
+    conn.executemany(
+        "INSERT INTO tags (tagID, name) VALUES (?, ?)",
+        ((i, f"topic {i} physics") for i in range(n_tags)),
+    )
+    # Zipf-like tag popularity, like a real library
+    weights = [1.0 / (i + 1) for i in range(n_tags)]
+    tag_ids = rng.choices(range(n_tags), weights=weights, k=assignments)
+    conn.executemany(
+        "INSERT INTO itemTags (tagID, itemID) VALUES (?, ?)",
+        ((tag_id, i // tags_per_item) for i, tag_id in enumerate(tag_ids)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_word_cloud(analyzer):
+    tags = analyzer.all_tags()
+    tags = [tag.replace(" ", "-") for tag in tags]
+    random.shuffle(tags)
+    return WordCloud(regexp=r"\w[\w'-]*", **WORDCLOUD_KWARGS).generate(" ".join(tags))
+
+
+def frequency_word_cloud(analyzer):
+    return WordCloud(**WORDCLOUD_KWARGS).generate_from_frequencies(analyzer.tag_frequencies())
+
+
+def timed(label, fn, db_path):
+    with ZoteroAnalyzer(db_path, "unused", "http://localhost", "unused") as analyzer:
+        start = time.perf_counter()
+        fn(analyzer)
+        elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed:8.2f} s")
+    return elapsed
+
+
+def main():
+    assignments = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "zotero.sqlite")
+        build_library(db_path, assignments)
+        print(f"Synthetic library: {assignments} tag assignments")
+        legacy = timed("shuffled text + generate", legacy_word_cloud, db_path)
+        fast = timed("generate_from_frequencies", frequency_word_cloud, db_path)
+    print(f"Speedup: {legacy / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
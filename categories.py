@@ -0,0 +1,232 @@
+import hashlib
+import json
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# JSON schema for structured categorization output, in the strict subset
+# accepted by response_format={"type": "json_schema"}.
+CATEGORY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "categories": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "tags": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["name", "tags"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["categories"],
+    "additionalProperties": False,
+}
+
+
+def parse_categorized_markdown(categorized_content: str) -> Dict[str, List[str]]:
+    """
+    Parse "# category" headers followed by "[[tag]]" links into a dictionary.
+
+    :param categorized_content: Markdown as produced by ZoteroAnalyzer.categorize_tags.
+    :return: Dictionary with categories as keys and lists of tags as values.
+    """
+    categories = {}
+    current_category = None
+
+    for line in categorized_content.strip().split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+
+        # Check if this is a category header (starts with #)
+        if line.startswith("#"):
+            current_category = line.lstrip("#").strip()
+            categories[current_category] = []
+        elif current_category:
+            # Extract tags from the line (anything in [[...]])
+            categories[current_category].extend(re.findall(r"\[\[(.*?)\]\]", line))
+
+    return categories
+
+
+def render_categorized_markdown(categories: Dict[str, List[str]]) -> str:
+    """
+    Render categories in the "# category" / "[[tag]]|[[tag]]" markdown format.
+
+    :param categories: Dictionary with categories as keys and lists of tags as values.
+    :return: Markdown string.
+    """
+    blocks = []
+    for category, tags in categories.items():
+        blocks.append(f"# {category}\n" + "|".join(f"[[{tag}]]" for tag in tags))
+    return "\n".join(blocks) + "\n"
+
+
+def merge_categories(
+    parts: Iterable[Dict[str, List[str]]], allowed_tags: Optional[Iterable[str]] = None
+) -> Dict[str, List[str]]:
+    """
+    Merge several category dictionaries, joining categories whose names only differ in case or spacing.
+
+    Tags are deduplicated per category, keeping first-seen order. If allowed_tags is given,
+    tags outside of it (e.g. renamed or invented by the model) are dropped, as are categories
+    left empty.
+
+    :param parts: Category dictionaries to merge.
+    :param allowed_tags: Tags that may appear in the result.
+    :return: Merged dictionary with categories as keys and lists of tags as values.
+    """
+    allowed = set(allowed_tags) if allowed_tags is not None else None
+    names: Dict[str, str] = {}
+    merged: Dict[str, Dict[str, None]] = {}
+    for part in parts:
+        for category, tags in part.items():
+            key = " ".join(category.split()).casefold()
+            name = names.setdefault(key, category.strip())
+            bucket = merged.setdefault(name, {})
+            for tag in tags:
+                if allowed is None or tag in allowed:
+                    bucket[tag] = None
+    return {name: list(tags) for name, tags in merged.items() if tags}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for budgeting prompts (about four characters per token).
+
+    :param text: Text to estimate.
+    :return: Estimated number of tokens.
+    """
+    return len(text) // 4 + 1
+
+
+def _tag_hash(tag: str) -> float:
+    """Stable pseudo-random number in [0, 1) derived from a tag, the same in every run."""
+    return int.from_bytes(hashlib.sha1(tag.encode("utf-8")).digest()[:8], "big") / 2 ** 64
+
+
+def chunk_tags(tags: Iterable[str], max_tokens: int) -> List[List[str]]:
+    """
+    Split tags into sorted chunks whose estimated prompt size stays below max_tokens.
+
+    Chunk boundaries are chosen by the content of the tags, not by position: a chunk
+    ends after a tag whose hash falls below its share of the budget, so chunks average
+    about max_tokens. A chunk that would exceed the budget is cut after its tag with the
+    lowest hash instead. Adding or removing a tag therefore changes the chunk it falls
+    into, seldom a neighbour as well, and cached responses of the other chunks stay valid.
+
+    :param tags: Tags to split.
+    :param max_tokens: Token budget for the tags of one chunk.
+    :return: List of tag chunks.
+    """
+    chunks: List[List[str]] = []
+    current: List[Tuple[str, int]] = []
+    used = 0
+    for tag in sorted(set(tags)):
+        cost = estimate_tokens(repr(tag)) + 1
+        while current and used + cost > max_tokens:
+            cut = min(range(len(current)), key=lambda i: _tag_hash(current[i][0])) + 1
+            chunks.append([name for name, _ in current[:cut]])
+            current = current[cut:]
+            used = sum(size for _, size in current)
+        current.append((tag, cost))
+        used += cost
+        if _tag_hash(tag) < cost / max_tokens:
+            chunks.append([name for name, _ in current])
+            current, used = [], 0
+    if current:
+        chunks.append([name for name, _ in current])
+    return chunks
+
+
+class StructuredCategories(NamedTuple):
+    """Validated result of a structured categorization."""
+
+    categories: Dict[str, List[str]]
+    # Tags the model returned that are not in the library; dropped from categories
+    unknown_tags: List[str]
+    # Library tags the model did not put into any category
+    uncategorized_tags: List[str]
+
+
+class CategoryStreamParser:
+    """Incremental parser for {"categories": [{"name": ..., "tags": [...]}, ...]} responses.
+
+    Feed it the response text as it streams in; every category object is
+    returned as soon as its closing brace has arrived.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_array = False
+        self._done = False
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text: str) -> List[Tuple[str, List[str]]]:
+        """
+        Add streamed text and return the categories completed by it.
+
+        :param text: Next piece of the response.
+        :return: List of (category, tags) tuples.
+        :raises ValueError: If a completed category does not match the schema.
+        """
+        self._buffer += text
+        completed = []
+        if not self._in_array:
+            match = re.search(r'"categories"\s*:\s*\[', self._buffer)
+            if match is None:
+                return completed
+            self._buffer = self._buffer[match.end():]
+            self._in_array = True
+        pos = 0
+        while not self._done:
+            while pos < len(self._buffer) and self._buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(self._buffer):
+                break
+            if self._buffer[pos] == "]":
+                self._done = True
+                break
+            try:
+                obj, pos = self._decoder.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError:
+                break  # object not complete yet
+            completed.append(self._validate(obj))
+        self._buffer = self._buffer[pos:]
+        return completed
+
+    def close(self) -> None:
+        """
+        Check that the stream ended after a complete categories array.
+
+        :raises ValueError: If the response was truncated or never contained a categories array.
+        """
+        if not self._done:
+            raise ValueError("Structured categorization response ended before the categories array was closed")
+
+    @staticmethod
+    def _validate(obj) -> Tuple[str, List[str]]:
+        if (
+            not isinstance(obj, dict)
+            or not isinstance(obj.get("name"), str)
+            or not isinstance(obj.get("tags"), list)
+            or not all(isinstance(tag, str) for tag in obj["tags"])
+        ):
+            raise ValueError(f"Invalid category in structured response: {obj!r}")
+        return obj["name"].strip(), obj["tags"]
+
+
+def parse_structured_categories(content: str) -> List[Tuple[str, List[str]]]:
+    """
+    Parse a complete structured categorization response.
+
+    :param content: JSON response text.
+    :return: List of (category, tags) tuples in response order.
+    """
+    parser = CategoryStreamParser()
+    categories = parser.feed(content)
+    parser.close()
+    return categories
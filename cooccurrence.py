@@ -0,0 +1,284 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from zoterolibrary import LibrarySnapshot
+
+SCORE_METHODS = ("count", "pmi", "jaccard")
+# Bumped when the layout of the .npz cache changes
+CACHE_VERSION = 2
+COOCCURRENCE_DIR = os.path.join(tempfile.gettempdir(), "zotero-cooccurrence")
+
+
+def cache_path(db_path: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Returns the .npz cache file of a database, named after its absolute path so libraries never share one.
+
+    :param db_path: Path to the Zotero SQLite file.
+    :param cache_dir: Directory of the cache files. Defaults to COOCCURRENCE_DIR in the temp directory.
+    :return: Path of the cache file.
+    """
+    source = Path(db_path).absolute()
+    return os.path.join(cache_dir or COOCCURRENCE_DIR, hashlib.sha1(str(source).encode()).hexdigest()[:16] + ".npz")
+
+
+def _incidence(library: LibrarySnapshot) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+    """Item x tag 0/1 matrix straight from the library's CSR arrays, with the sorted itemIDs and tagIDs of its axes."""
+    item_ids = np.frombuffer(library.item_ids, dtype=np.int64).copy()
+    tag_ids = np.frombuffer(library.tag_ids, dtype=np.int64).copy()
+    indices = np.searchsorted(tag_ids, np.frombuffer(library.item_tag_ids, dtype=np.int64))
+    indptr = np.frombuffer(library.item_offsets, dtype=np.int64).copy()
+    data = np.ones(len(indices), dtype=np.int64)
+    return item_ids, tag_ids, sparse.csr_matrix((data, indices, indptr), shape=(len(item_ids), len(tag_ids)))
+
+
+def _reindex_columns(matrix: sparse.csr_matrix, columns: np.ndarray, width: int) -> sparse.csr_matrix:
+    """Move the columns of a CSR matrix to the given positions of a wider matrix."""
+    return sparse.csr_matrix((matrix.data, columns[matrix.indices], matrix.indptr), shape=(matrix.shape[0], width))
+
+
+class TagCooccurrence:
+    """Sparse tag x tag co-occurrence counts of a library.
+
+    counts[i, j] is the number of items carrying both tag_ids[i] and tag_ids[j];
+    the diagonal holds the item count of each tag. The counts are the product
+    of the item x tag incidence matrix with itself, computed by scipy.sparse in
+    one pass. The incidence matrix is kept as well, so update() only adds and
+    subtracts the products of the items whose tags changed.
+    """
+
+    def __init__(
+        self,
+        tag_ids: np.ndarray,
+        counts: sparse.csr_matrix,
+        item_ids: np.ndarray,
+        incidence: sparse.csr_matrix,
+    ):
+        """
+        :param tag_ids: Sorted tagIDs of the rows and columns of counts.
+        :param counts: Symmetric tag x tag co-occurrence counts.
+        :param item_ids: Sorted itemIDs of the rows of incidence.
+        :param incidence: Item x tag 0/1 matrix the counts were computed from.
+        """
+        self.tag_ids = tag_ids
+        self.counts = counts
+        self.item_ids = item_ids
+        self.incidence = incidence
+
+    @classmethod
+    def from_library(cls, library: LibrarySnapshot) -> "TagCooccurrence":
+        """
+        Count the co-occurrences of all tags of a library.
+
+        :param library: Library to count.
+        :return: New TagCooccurrence.
+        """
+        item_ids, tag_ids, incidence = _incidence(library)
+        counts = (incidence.T @ incidence).tocsr()
+        counts.sort_indices()
+        return cls(tag_ids, counts, item_ids, incidence)
+
+    @property
+    def item_count(self) -> int:
+        """Number of items with at least one tag, the N of the PMI."""
+        return int(np.count_nonzero(np.diff(self.incidence.indptr)))
+
+    def _index(self, tag_id: int) -> int:
+        i = int(np.searchsorted(self.tag_ids, tag_id))
+        if i == len(self.tag_ids) or self.tag_ids[i] != tag_id:
+            raise KeyError(tag_id)
+        return i
+
+    def count(self, tag_a: int, tag_b: int) -> int:
+        """
+        Returns the number of items carrying both tags.
+
+        :param tag_a: First tagID.
+        :param tag_b: Second tagID, the same as tag_a for the item count of the tag.
+        :return: Number of items, 0 for unknown tags.
+        """
+        try:
+            return int(self.counts[self._index(tag_a), self._index(tag_b)])
+        except KeyError:
+            return 0
+
+    def update(self, library: LibrarySnapshot) -> int:
+        """
+        Bring the counts up to date with a newer snapshot of the same library.
+
+        Only the items whose tags differ are multiplied out again: their old
+        rows are subtracted and their new rows added. Tags no longer assigned
+        to any item are dropped.
+
+        :param library: Current library.
+        :return: Number of items whose tags changed.
+        """
+        item_ids, tag_ids, incidence = _incidence(library)
+        same_tags = np.array_equal(self.tag_ids, tag_ids)
+        if same_tags:
+            all_tags, old, new, counts = tag_ids, self.incidence, incidence, self.counts
+        else:
+            all_tags = np.union1d(self.tag_ids, tag_ids)
+            position = np.searchsorted(all_tags, self.tag_ids)
+            old = _reindex_columns(self.incidence, position, len(all_tags))
+            new = _reindex_columns(incidence, np.searchsorted(all_tags, tag_ids), len(all_tags))
+            previous = self.counts.tocoo()
+            counts = sparse.csr_matrix(
+                (previous.data, (position[previous.row], position[previous.col])), shape=(len(all_tags),) * 2
+            )
+
+        changed = self._changed_items(old, item_ids, new)
+        if not len(changed):
+            return 0
+        old_rows = old[np.searchsorted(self.item_ids, np.intersect1d(changed, self.item_ids, assume_unique=True))]
+        new_rows = new[np.searchsorted(item_ids, np.intersect1d(changed, item_ids, assume_unique=True))]
+        counts = (counts - old_rows.T @ old_rows + new_rows.T @ new_rows).tocsr()
+        counts.eliminate_zeros()
+
+        if same_tags:
+            self.counts, self.incidence = counts, new
+        else:
+            keep = np.flatnonzero(counts.diagonal() > 0)
+            self.counts = counts[keep][:, keep].tocsr()
+            self.incidence = new[:, keep].tocsr()
+            self.tag_ids = all_tags[keep]
+        self.counts.sort_indices()
+        self.item_ids = item_ids
+        return len(changed)
+
+    def _changed_items(self, old: sparse.csr_matrix, item_ids: np.ndarray, new: sparse.csr_matrix) -> np.ndarray:
+        """itemIDs whose row differs between the old and the new incidence matrix, with both on the same columns."""
+        if np.array_equal(self.item_ids, item_ids) and np.array_equal(old.indptr, new.indptr):
+            # Same items with as many tags each: compare the tag columns in place
+            rows = np.searchsorted(old.indptr, np.flatnonzero(old.indices != new.indices), side="right") - 1
+            return item_ids[np.unique(rows)]
+        # (itemID, column) assignments present in only one of the two versions; both lists
+        # are unique already, as itemTags has one row per item and tag
+        width = old.shape[1]
+        old_pairs = np.repeat(self.item_ids, np.diff(old.indptr)) * width + old.indices
+        new_pairs = np.repeat(item_ids, np.diff(new.indptr)) * width + new.indices
+        return np.unique(np.setxor1d(old_pairs, new_pairs, assume_unique=True) // width)
+
+    def scores(self, method: str = "pmi", min_count: int = 1) -> sparse.csr_matrix:
+        """
+        Score every pair of co-occurring tags.
+
+        - "count": number of shared items.
+        - "pmi": pointwise mutual information log(N c_ab / (c_a c_b)), high for tags
+          that appear together more often than their frequencies suggest.
+        - "jaccard": c_ab / (c_a + c_b - c_ab), the overlap of the two item sets.
+
+        :param method: One of SCORE_METHODS.
+        :param min_count: Ignore pairs sharing fewer items, as PMI overrates rare pairs.
+        :return: Tag x tag matrix with a score for each co-occurring pair and an empty diagonal.
+        """
+        if method not in SCORE_METHODS:
+            raise ValueError(f"method must be one of {', '.join(SCORE_METHODS)}")
+        counts = self.counts.tocoo()
+        mask = (counts.row != counts.col) & (counts.data >= min_count)
+        rows, cols, shared = counts.row[mask], counts.col[mask], counts.data[mask].astype(np.float64)
+        totals = self.counts.diagonal().astype(np.float64)
+        if method == "count":
+            values = shared
+        elif method == "pmi":
+            values = np.log(shared * self.item_count / (totals[rows] * totals[cols]))
+        else:
+            values = shared / (totals[rows] + totals[cols] - shared)
+        # Built from COO, so pairs scoring exactly 0 (e.g. PMI of independent tags) stay stored
+        size = len(self.tag_ids)
+        scores = sparse.csr_matrix((values, (rows, cols)), shape=(size, size))
+        scores.sort_indices()
+        return scores
+
+    def neighbors(self, tag_id: int, k: int = 10, method: str = "pmi", min_count: int = 1) -> List[Tuple[int, float]]:
+        """
+        Returns the tags scoring highest with a tag.
+
+        :param tag_id: tagID to find neighbors for.
+        :param k: Maximum number of neighbors.
+        :param method: One of SCORE_METHODS.
+        :param min_count: Ignore tags sharing fewer items.
+        :return: (tagID, score) tuples, best first. Empty for unknown tags.
+        """
+        try:
+            i = self._index(tag_id)
+        except KeyError:
+            return []
+        return self._top_k(self.scores(method, min_count), i, k)
+
+    def top_neighbors(self, k: int = 10, method: str = "pmi", min_count: int = 1) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Returns the best-scoring neighbors of every tag.
+
+        :param k: Maximum number of neighbors per tag.
+        :param method: One of SCORE_METHODS.
+        :param min_count: Ignore pairs sharing fewer items.
+        :return: Dictionary with tagIDs as keys and (tagID, score) tuples, best first, as values.
+        """
+        scores = self.scores(method, min_count)
+        return {int(tag_id): self._top_k(scores, i, k) for i, tag_id in enumerate(self.tag_ids)}
+
+    def _top_k(self, scores: sparse.csr_matrix, row: int, k: int) -> List[Tuple[int, float]]:
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        values, columns = scores.data[start:end], scores.indices[start:end]
+        if len(values) > k:
+            best = np.argpartition(-values, k - 1)[:k]
+            values, columns = values[best], columns[best]
+        # Ties broken by tagID, so results are stable
+        order = np.lexsort((self.tag_ids[columns], -values))
+        return [(int(self.tag_ids[columns[i]]), float(values[i])) for i in order]
+
+    def save(self, path: str, fingerprint: Tuple[int, ...] = ()) -> None:
+        """
+        Write the counts and the incidence matrix to an uncompressed .npz file, which loads faster than a recount.
+
+        The file is written next to the destination and moved into place, so readers never see half of it.
+
+        :param path: Destination path.
+        :param fingerprint: File fingerprint of the database the counts are up to date with.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "wb") as f:
+            np.savez(
+                f,
+                version=CACHE_VERSION,
+                fingerprint=np.array(fingerprint, dtype=np.int64),
+                tag_ids=self.tag_ids,
+                item_ids=self.item_ids,
+                counts_data=self.counts.data,
+                counts_indices=self.counts.indices,
+                counts_indptr=self.counts.indptr,
+                incidence_indices=self.incidence.indices,
+                incidence_indptr=self.incidence.indptr,
+            )
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["TagCooccurrence", Tuple[int, ...]]:
+        """
+        Read a TagCooccurrence written by save().
+
+        :param path: Path of the .npz file.
+        :return: Loaded TagCooccurrence and the database fingerprint it was saved with.
+        """
+        with np.load(path) as cache:
+            if int(cache["version"]) != CACHE_VERSION:
+                raise ValueError(f"{path} was written by another version")
+            fingerprint = tuple(int(value) for value in cache["fingerprint"])
+            tag_ids, item_ids = cache["tag_ids"], cache["item_ids"]
+            size = len(tag_ids)
+            counts = sparse.csr_matrix(
+                (cache["counts_data"], cache["counts_indices"], cache["counts_indptr"]), shape=(size, size)
+            )
+            indices = cache["incidence_indices"]
+            incidence = sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int64), indices, cache["incidence_indptr"]),
+                shape=(len(item_ids), size),
+            )
+        return cls(tag_ids, counts, item_ids, incidence), fingerprint
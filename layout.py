@@ -0,0 +1,239 @@
+import glob
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def build_category_graph(
+    categories: Dict[str, List[str]],
+) -> Tuple[List[str], List[str], List[Tuple[int, int]]]:
+    """
+    Build the category/tag graph with one shared node per tag.
+
+    Nodes 0..len(categories)-1 are the categories, followed by the unique tags in
+    first-seen order. A tag listed under several categories gets one edge to each.
+
+    :param categories: Dictionary with categories as keys and lists of tags as values.
+    :return: Tuple of category names, tag names and (category index, node index) edges.
+    """
+    category_names = list(categories)
+    tag_index: Dict[str, int] = {}
+    edges = []
+    for c, tags in enumerate(categories.values()):
+        for tag in dict.fromkeys(tags):
+            node = tag_index.setdefault(tag, len(category_names) + len(tag_index))
+            edges.append((c, node))
+    return category_names, list(tag_index), edges
+
+
+class ForceLayout:
+    """Fruchterman-Reingold force-directed layout, vectorized with NumPy.
+
+    Graphs up to exact_threshold nodes compute all pairwise repulsions. Larger
+    graphs use a one-level Barnes-Hut approximation: nodes are binned into a
+    grid, nodes in the same cell repel each other exactly and every other cell
+    acts as a single mass at its centroid.
+    """
+
+    def __init__(
+        self,
+        iterations: int = 60,
+        seed: int = 0,
+        exact_threshold: int = 400,
+        gravity: float = 0.05,
+        cache_dir: Optional[str] = None,
+        max_cached: int = 16,
+        max_cache_files: int = 64,
+    ):
+        """
+        :param iterations: Number of simulation steps.
+        :param seed: Seed for the random initial positions.
+        :param exact_threshold: Largest node count that uses exact pairwise repulsion.
+        :param gravity: Pull towards the origin that keeps components together.
+        :param cache_dir: Directory to persist layouts in. None keeps them in memory only.
+        :param max_cached: Number of layouts kept in memory, least recently used dropped first.
+        :param max_cache_files: Number of layout files kept in cache_dir, least recently used deleted first.
+        """
+        self.iterations = iterations
+        self.seed = seed
+        self.exact_threshold = exact_threshold
+        self.gravity = gravity
+        self.cache_dir = cache_dir
+        self.max_cached = max_cached
+        self.max_cache_files = max_cache_files
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def _key(self, n_nodes: int, edges: np.ndarray, initial: Optional[np.ndarray]) -> str:
+        digest = hashlib.sha256()
+        digest.update(repr((n_nodes, self.iterations, self.seed, self.exact_threshold, self.gravity)).encode())
+        digest.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+        if initial is not None:
+            digest.update(np.ascontiguousarray(initial, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def layout(
+        self,
+        n_nodes: int,
+        edges: Sequence[Tuple[int, int]],
+        initial: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Compute node positions, reusing a cached result for an unchanged graph.
+
+        :param n_nodes: Number of nodes.
+        :param edges: (source, target) node index pairs.
+        :param initial: Optional (n_nodes, 2) starting positions.
+        :return: (n_nodes, 2) array of positions.
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        key = self._key(n_nodes, edges, initial)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key].copy()
+        path = os.path.join(self.cache_dir, f"layout_{key}.npy") if self.cache_dir else None
+        if path and os.path.exists(path):
+            positions = np.load(path)
+            # Mark as recently used for _prune_cache_dir
+            os.utime(path)
+        else:
+            positions = self._simulate(n_nodes, edges, initial)
+            if path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.save(path, positions)
+                self._prune_cache_dir()
+        self._cache[key] = positions
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return positions.copy()
+
+    def _prune_cache_dir(self) -> None:
+        """Delete the least recently used layout files beyond max_cache_files."""
+        paths = glob.glob(os.path.join(self.cache_dir, "layout_*.npy"))
+        if len(paths) <= self.max_cache_files:
+            return
+        paths.sort(key=lambda path: os.stat(path).st_mtime_ns)
+        for path in paths[: len(paths) - self.max_cache_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Pruned by another process sharing the directory
+                pass
+
+    def _simulate(self, n: int, edges: np.ndarray, initial: Optional[np.ndarray]) -> np.ndarray:
+        if n == 0:
+            return np.zeros((0, 2))
+        rng = np.random.default_rng(self.seed)
+        if initial is None:
+            pos = rng.uniform(-1.0, 1.0, size=(n, 2))
+        else:
+            # A little jitter separates nodes that start on the same spot
+            pos = np.array(initial, dtype=np.float64) + rng.normal(scale=1e-3, size=(n, 2))
+        k = np.sqrt(4.0 / n)  # optimal distance for an area of 2x2
+        temperature = 0.1 * max(np.ptp(pos[:, 0]), np.ptp(pos[:, 1]), 1.0)
+        cooling = temperature / (self.iterations + 1)
+        src, dst = edges[:, 0], edges[:, 1]
+
+        for _ in range(self.iterations):
+            if n <= self.exact_threshold:
+                disp = self._repulsion_exact(pos, k)
+            else:
+                disp = self._repulsion_grid(pos, k)
+
+            # Attraction along edges: d^2 / k
+            delta = pos[src] - pos[dst]
+            dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 1e-9)
+            pull = delta * (dist / k)[:, None]
+            for axis in range(2):
+                disp[:, axis] -= np.bincount(src, weights=pull[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(dst, weights=pull[:, axis], minlength=n)
+
+            disp -= self.gravity * pos / k
+
+            # Move at most `temperature` per step
+            length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 1e-9)
+            pos += disp * (np.minimum(length, temperature) / length)[:, None]
+            temperature -= cooling
+        return pos
+
+    @staticmethod
+    def _repulsion_exact(pos: np.ndarray, k: float) -> np.ndarray:
+        """Repulsion k^2 / d between all node pairs."""
+        dx = pos[:, 0, None] - pos[None, :, 0]
+        dy = pos[:, 1, None] - pos[None, :, 1]
+        weight = k * k / np.maximum(dx * dx + dy * dy, 1e-9)
+        np.fill_diagonal(weight, 0.0)
+        return np.stack([(dx * weight).sum(axis=1), (dy * weight).sum(axis=1)], axis=1)
+
+    @staticmethod
+    def _repulsion_grid(pos: np.ndarray, k: float, nodes_per_cell: int = 25) -> np.ndarray:
+        """
+        Repulsion with a one-level Barnes-Hut approximation over equal-count cells.
+
+        Nodes are split into vertical strips by x and each strip into rows by y, so every
+        cell holds about nodes_per_cell nodes even where the layout is dense. Nodes repel the
+        nodes of their own and the eight neighbouring cells exactly; every other cell acts on
+        the whole cell as one mass at its centroid.
+        """
+        n = len(pos)
+        strips = max(1, int(np.sqrt(n / nodes_per_cell)))
+        rank_x = np.empty(n, dtype=np.int64)
+        rank_x[np.argsort(pos[:, 0], kind="stable")] = np.arange(n)
+        strip = rank_x * strips // n
+        order = np.lexsort((pos[:, 1], strip))
+        strip_sorted = strip[order]
+        strip_size = np.bincount(strip, minlength=strips)
+        strip_start = np.concatenate([[0], np.cumsum(strip_size)[:-1]])
+        within = np.arange(n) - strip_start[strip_sorted]
+        cell_sorted = strip_sorted * strips + within * strips // strip_size[strip_sorted]
+        cell = np.empty(n, dtype=np.int64)
+        cell[order] = cell_sorted
+        n_cells = strips * strips
+
+        counts = np.bincount(cell, minlength=n_cells)
+        centroids = np.stack(
+            [np.bincount(cell, weights=pos[:, axis], minlength=n_cells) for axis in range(2)], axis=1
+        ) / np.maximum(counts, 1)[:, None]
+
+        # Neighbouring cells by (strip, row) index, including the cell itself
+        grid_s, grid_r = np.divmod(np.arange(n_cells), strips)
+        offsets = [(ds, dr) for ds in (-1, 0, 1) for dr in (-1, 0, 1)]
+        neighbour_cells = np.stack(
+            [(grid_s + ds) * strips + (grid_r + dr) for ds, dr in offsets], axis=1
+        )
+        neighbour_valid = np.stack(
+            [
+                (grid_s + ds >= 0) & (grid_s + ds < strips) & (grid_r + dr >= 0) & (grid_r + dr < strips)
+                for ds, dr in offsets
+            ],
+            axis=1,
+        )
+        neighbour_cells = np.where(neighbour_valid, neighbour_cells, 0)
+
+        # Far field between cell centroids, skipping neighbouring cells
+        delta = centroids[:, None, :] - centroids[None, :, :]
+        dist2 = np.maximum(np.einsum("ijk,ijk->ij", delta, delta), 1e-9)
+        weight = counts[None, :] * k * k / dist2
+        weight[np.repeat(np.arange(n_cells), 9)[neighbour_valid.ravel()], neighbour_cells[neighbour_valid]] = 0.0
+        disp = np.einsum("ijk,ij->ik", delta, weight)[cell]
+
+        # Near field: exact pairs with the nodes of neighbouring cells, padded to a common width
+        cell_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        width = int(counts.max())
+        slot = np.arange(width)
+        valid = slot[None, :] < counts[:, None]
+        members = np.where(valid, order[np.minimum(cell_start[:, None] + slot, n - 1)], -1)
+        neighbours = np.where(neighbour_valid[:, :, None], members[neighbour_cells], -1).reshape(n_cells, -1)
+        # Separate float32 x/y planes are much faster here than interleaved (..., 2) arrays
+        near = []
+        for axis in range(2):
+            coord = np.append(pos[:, axis], 1e6).astype(np.float32)  # index -1 is a far-away pad
+            near.append(coord[members][:, :, None] - coord[neighbours][:, None, :])
+        dx, dy = near
+        weight = np.float32(k * k) / np.maximum(dx * dx + dy * dy, np.float32(1e-9))
+        weight[members[:, :, None] == neighbours[:, None, :]] = 0.0
+        disp[members[valid], 0] += (dx * weight).sum(axis=2)[valid]
+        disp[members[valid], 1] += (dy * weight).sum(axis=2)[valid]
+        return disp
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+
+class ResponseCache:
+    """Persistent, content-addressed cache for chat completion responses."""
+
+    def __init__(
+        self,
+        path: str = ".llm_cache.sqlite",
+        ttl_seconds: float = 30 * 24 * 3600,
+        max_entries: int = 10000,
+    ):
+        """
+        Open (or create) the cache database.
+
+        :param path: Path to the SQLite cache file.
+        :param ttl_seconds: Entries older than this are treated as missing and evicted.
+        :param max_entries: Least recently used entries beyond this count are evicted.
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, template: str, temperature: float, items: Iterable[str], **fields) -> str:
+        """
+        Build the cache key for a request.
+
+        :param model: Model name.
+        :param template: Prompt template before the items are filled in.
+        :param temperature: Sampling temperature.
+        :param items: Tags (or category names) sent with the prompt; order does not matter.
+        :param fields: Any other values filled into the template.
+        :return: Hex digest identifying the request.
+        """
+        items_hash = hashlib.sha256("\n".join(sorted(items)).encode("utf-8")).hexdigest()
+        payload = json.dumps(
+            [model, template, temperature, items_hash, fields], sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        :param key: Key from ResponseCache.key.
+        :return: Cached response, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def set(self, key: str, response: str) -> None:
+        """
+        Store a response and evict expired and least recently used entries.
+
+        :param key: Key from ResponseCache.key.
+        :param response: Response text to store.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?
+                )
+            """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Close the cache database.
+        """
+        self._conn.close()
@@ -0,0 +1,213 @@
+import asyncio
+import random
+import time
+from typing import Callable, List, Optional, Sequence
+
+import openai
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+class TokenBucket:
+    """Asyncio token bucket allowing `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        :param rate: Tokens added per second.
+        :param capacity: Maximum number of stored tokens. Defaults to one second worth of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Wait until the requested number of tokens is available and take them.
+
+        :param tokens: Number of tokens to take.
+        """
+        # Waiters queue on the lock so they are served in arrival order
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class AsyncLLMClient:
+    """Asyncio chat completions client with concurrency limits, rate limiting and retries."""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        model: str,
+        temperature: float = 0.5,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        max_retries: int = 5,
+        timeout: float = 120.0,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        """
+        Configure the client. The underlying AsyncOpenAI client is created per event loop on first use.
+
+        :param api_key: API key for OpenAI.
+        :param base_url: Base URL for OpenAI API.
+        :param model: Model name for OpenAI API.
+        :param temperature: Sampling temperature.
+        :param max_concurrency: Maximum number of requests in flight.
+        :param requests_per_minute: Request rate limit. None disables rate limiting.
+        :param max_retries: Retries on 429, 5xx, timeouts and connection errors.
+        :param timeout: Per-request timeout in seconds.
+        :param backoff_base: First backoff delay in seconds, doubled on every retry.
+        :param backoff_max: Upper bound for a single backoff delay in seconds.
+        """
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._bucket = None
+
+    def _bind(self) -> None:
+        """
+        Create the loop-bound client, semaphore and rate limiter for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        self._loop = loop
+        self._client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            timeout=self.timeout,
+            max_retries=0,  # retries are handled here, with backoff shared across requests
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._bucket = (
+            TokenBucket(self.requests_per_minute / 60.0) if self.requests_per_minute else None
+        )
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """
+        Returns the delay before the next attempt, honouring a Retry-After header if present.
+        """
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return random.uniform(delay / 2, delay)
+
+    async def complete(self, prompt: str, **kwargs) -> str:
+        """
+        Send a single-message chat completion request and return the reply text.
+
+        :param prompt: User message.
+        :param kwargs: Additional arguments for chat.completions.create, e.g. max_tokens.
+        :return: Content of the first choice.
+        """
+        self._bind()
+        kwargs.setdefault("temperature", self.temperature)
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    response = await self._client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": prompt}],
+                        **kwargs,
+                    )
+                return response.choices[0].message.content
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+
+    async def complete_many(
+        self, prompts: Sequence[str], on_reply: Optional[Callable[[int, str], None]] = None, **kwargs
+    ) -> List[str]:
+        """
+        Complete several prompts concurrently within the configured limits.
+
+        If a request fails for good, the others still run to completion before its error is
+        raised, so on_reply has seen every reply that arrived.
+
+        :param prompts: User messages.
+        :param on_reply: Called with the prompt index and the reply text as soon as each reply arrives.
+        :param kwargs: Additional arguments for chat.completions.create.
+        :return: Reply texts in prompt order.
+        """
+
+        async def complete_one(index: int, prompt: str) -> str:
+            reply = await self.complete(prompt, **kwargs)
+            if on_reply is not None:
+                on_reply(index, reply)
+            return reply
+
+        results = await asyncio.gather(
+            *(complete_one(i, prompt) for i, prompt in enumerate(prompts)), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return list(results)
+
+    async def aclose(self) -> None:
+        """
+        Close the underlying HTTP client.
+        """
+        if self._client is not None:
+            await self._client.close()
+        self._loop = None
+        self._client = None
+
+    def run(
+        self, prompts: Sequence[str], on_reply: Optional[Callable[[int, str], None]] = None, **kwargs
+    ) -> List[str]:
+        """
+        Blocking wrapper around complete_many for synchronous callers.
+
+        :param prompts: User messages.
+        :param on_reply: Called with the prompt index and the reply text as soon as each reply arrives.
+        :param kwargs: Additional arguments for chat.completions.create.
+        :return: Reply texts in prompt order.
+        """
+        if not prompts:
+            return []
+
+        async def run_and_close():
+            # The client belongs to the loop asyncio.run closes afterwards
+            try:
+                return await self.complete_many(prompts, on_reply=on_reply, **kwargs)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run_and_close())
@@ -1,9 +1,45 @@
+import argparse
 import os
+import sys
 from dotenv import load_dotenv
 
+from layout import ForceLayout
+from llmcache import ResponseCache
 from zoteroanalyzer import ZoteroAnalyzer
 from visualizer import ZoteroVisualizer
 
+REQUIRED_VARS = ["ZOTERO_DB_PATH", "CBORG_API_KEY", "CBORG_BASE_URL", "CBORG_MODEL"]
+WORD_CLOUD_PATH = "wordcloud.png"
+# Network layouts kept between runs, so an unchanged graph is not simulated again
+LAYOUT_CACHE_DIR = ".layout_cache"
+
+
+def parse_args(argv):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Analyze and visualize Zotero tags.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always ask the model instead of reusing cached categorization responses.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only categorize tags that are not in the previous categorized_tags.md yet.",
+    )
+    parser.add_argument(
+        "--compact-html",
+        action="store_true",
+        help="Write small HTML files that share one plotly.min.js, show shortened hover previews "
+        "and come with a gzip-compressed JSON copy of each figure.",
+    )
+    parser.add_argument(
+        "--show-wordcloud",
+        action="store_true",
+        help=f"Also display the word cloud in a window; it is always saved to {WORD_CLOUD_PATH}.",
+    )
+    return parser.parse_args(argv)
+
 
 def load_config():
     """Load configuration from environment variables."""
@@ -14,10 +50,12 @@ def load_config():
         "CBORG_API_KEY": os.getenv("CBORG_API_KEY"),
         "CBORG_BASE_URL": os.getenv("CBORG_BASE_URL"),
         "CBORG_MODEL": os.getenv("CBORG_MODEL"),
+        "LLM_CACHE_PATH": os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite"),
+        "ZOTERO_SNAPSHOT": os.getenv("ZOTERO_SNAPSHOT", "true").lower() not in ("0", "false", "no"),
     }
 
     # Validate configuration
-    missing_vars = [key for key, value in config.items() if not value]
+    missing_vars = [key for key in REQUIRED_VARS if not config[key]]
     if missing_vars:
         raise ValueError(
             f"Missing required environment variables: {', '.join(missing_vars)}"
@@ -28,23 +66,35 @@ def load_config():
 
 def create_analyzer(config):
     """Create and return a ZoteroAnalyzer instance."""
+    cache_path = config.get("LLM_CACHE_PATH")
     return ZoteroAnalyzer(
         config["ZOTERO_DB_PATH"],
         config["CBORG_API_KEY"],
         config["CBORG_BASE_URL"],
         config["CBORG_MODEL"],
+        snapshot=config.get("ZOTERO_SNAPSHOT", True),
+        cache=ResponseCache(cache_path) if cache_path else None,
     )
 
 
-def run_analysis(analyzer):
+def run_analysis(analyzer, incremental=False, compact_html=False, show_wordcloud=False):
     """Run the main analysis workflow."""
     # Categorize the tags using the chat completions API
-    categorized_content = analyzer.categorize_tags(save=True, for_obsidian_mardown=True)
+    categorized_content = analyzer.categorize_tags(
+        save=True, for_obsidian_mardown=True, incremental=incremental
+    )
 
-    # Visualize the tags words in a word cloud
+    # Visualize the tags words in a word cloud, without blocking on a window unless asked to
     analyzer.create_word_cloud(
-        width=800, height=400, max_words=100, background_color="black", colormap="turbo"
+        save_path=WORD_CLOUD_PATH,
+        show=show_wordcloud,
+        width=800,
+        height=400,
+        max_words=100,
+        background_color="black",
+        colormap="turbo",
     )
+    print(f"Word cloud saved to: {WORD_CLOUD_PATH}")
 
     # Save the unique tags in a text file for further analysis
     analyzer.unique_tags(save=True)
@@ -53,7 +103,13 @@ def run_analysis(analyzer):
     tag_to_titles = analyzer.get_tag_to_titles()
 
     # Create interactive visualizations
-    visualizer = ZoteroVisualizer()
+    layout_engine = ForceLayout(cache_dir=LAYOUT_CACHE_DIR)
+    if compact_html:
+        visualizer = ZoteroVisualizer(
+            layout_engine=layout_engine, include_plotlyjs="directory", hover_preview=5, write_json_gz=True
+        )
+    else:
+        visualizer = ZoteroVisualizer(layout_engine=layout_engine)
     categories = visualizer.parse_categorized_tags(categorized_content)
 
     # Create radar chart (still just tag counts)
@@ -67,17 +123,28 @@ def run_analysis(analyzer):
     print(f"Network visualization saved to: {network_path}")
 
 
-def main():
+def main(argv=None):
     """Main entry point for the application."""
+    args = parse_args([] if argv is None else argv)
     try:
         # Load configuration
         config = load_config()
+        if args.no_cache:
+            config["LLM_CACHE_PATH"] = None
 
         # Create analyzer
         analyzer = create_analyzer(config)
 
-        # Run analysis
-        run_analysis(analyzer)
+        # Run analysis on a single shared database connection
+        try:
+            run_analysis(
+                analyzer,
+                incremental=args.incremental,
+                compact_html=args.compact_html,
+                show_wordcloud=args.show_wordcloud,
+            )
+        finally:
+            analyzer.close()
 
         print("Analysis completed successfully!")
 
@@ -87,4 +154,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,237 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import wait
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+
+def extract_pages(pdf_path: str) -> List[str]:
+    """
+    Extract the text of every page of a PDF.
+
+    :param pdf_path: Path to the PDF file.
+    :return: Page texts in page order, "" for pages without text.
+    """
+    import pdfplumber  # imported here so only the worker processes pay for it
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+class ExtractionResult(NamedTuple):
+    """Outcome of extracting one PDF."""
+
+    path: str
+    pages: List[str]
+    # None on success, otherwise why the file was skipped
+    error: Optional[str]
+    seconds: float
+    # The worker timed out or crashed, which may not happen again on a less loaded machine
+    transient: bool = False
+
+
+class ExtractionStats:
+    """Running totals of an extraction run, passed to the progress callback."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.files = 0
+        self.failed = 0
+        self.pages = 0
+
+    def add(self, result: ExtractionResult) -> None:
+        self.files += 1
+        self.pages += len(result.pages)
+        if result.error is not None:
+            self.failed += 1
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def __str__(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f"{self.files} files ({self.failed} failed), {self.pages} pages in {self.elapsed:.1f} s: "
+            f"{self.files / elapsed:.2f} files/s, {self.pages / elapsed:.1f} pages/s"
+        )
+
+
+def _worker_main(conn, extract: Callable[[str], List[str]]) -> None:
+    """Worker process loop: receive a path, send back (pages, error, seconds), stop on None."""
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        if path is None:
+            return
+        start = time.perf_counter()
+        try:
+            pages, error = extract(path), None
+        except Exception as e:
+            pages, error = [], f"{type(e).__name__}: {e}"
+        conn.send((pages, error, time.perf_counter() - start))
+
+
+class _Worker:
+    """A worker process, its end of the pipe and the file it is working on."""
+
+    def __init__(self, ctx, extract):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, extract), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.path = None
+        self.started = 0.0
+
+    def assign(self, path: str) -> None:
+        self.conn.send(path)
+        self.path = path
+        self.started = time.perf_counter()
+
+    def stop(self, kill: bool = False) -> None:
+        if not kill:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(1.0)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ParallelExtractor:
+    """Extract PDFs in a pool of worker processes.
+
+    Every worker handles one file at a time. A worker that exceeds the per-file
+    timeout (pdfplumber hangs on some PDFs) is killed and replaced, and a worker
+    that crashes is replaced as well; both cases are reported as failed results
+    instead of stopping the run. Results are handed to the consumer through a
+    bounded queue, so a slow consumer (e.g. the embedding stage) holds back
+    extraction instead of piling up pages in memory.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        timeout: float = 120.0,
+        max_pending: int = 32,
+        extract: Callable[[str], List[str]] = extract_pages,
+        on_progress: Optional[Callable[[ExtractionResult, ExtractionStats], None]] = None,
+    ):
+        """
+        :param workers: Number of worker processes. Defaults to the number of CPUs.
+        :param timeout: Seconds a single file may take before its worker is killed.
+        :param max_pending: Extracted files that may wait for the consumer.
+        :param extract: Module-level function mapping a path to page texts, run in the workers.
+        :param on_progress: Called with every result and the running totals, in the consuming thread.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.extract = extract
+        self.on_progress = on_progress
+        self.stats = ExtractionStats()
+
+    def imap(self, paths: Iterable[str]) -> Iterator[ExtractionResult]:
+        """
+        Extract the given files, yielding results in completion order.
+
+        :param paths: PDF paths. Consumed lazily, as workers become free.
+        :return: Iterator of ExtractionResult, one per path.
+        """
+        self.stats = ExtractionStats()
+        results: "queue.Queue" = queue.Queue(self.max_pending)
+        stop = threading.Event()
+        supervisor = threading.Thread(target=self._supervise, args=(iter(paths), results, stop), daemon=True)
+        supervisor.start()
+        try:
+            while True:
+                item = results.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                self.stats.add(item)
+                if self.on_progress is not None:
+                    self.on_progress(item, self.stats)
+                yield item
+        finally:
+            stop.set()
+            supervisor.join()
+
+    def _supervise(self, paths: Iterator[str], results: "queue.Queue", stop: threading.Event) -> None:
+        """Feed paths to the workers and collect their results, replacing hung or crashed workers."""
+        # Workers are started from this thread, while the consumer may be running torch: never fork
+        ctx = multiprocessing.get_context("spawn")
+        pool: List[_Worker] = []
+        try:
+            pool = [_Worker(ctx, self.extract) for _ in range(self.workers)]
+            exhausted = False
+            while not stop.is_set():
+                for worker in pool:
+                    if worker.path is None and not exhausted:
+                        path = next(paths, None)
+                        if path is None:
+                            exhausted = True
+                        else:
+                            worker.assign(path)
+                busy = [worker for worker in pool if worker.path is not None]
+                if not busy:
+                    break
+                deadline = min(worker.started for worker in busy) + self.timeout
+                ready = wait(
+                    [worker.conn for worker in busy] + [worker.process.sentinel for worker in busy],
+                    timeout=max(0.0, deadline - time.perf_counter()),
+                )
+                now = time.perf_counter()
+                for i, worker in enumerate(pool):
+                    if worker.path is None:
+                        continue
+                    result, replace = None, False
+                    if worker.conn in ready:
+                        try:
+                            pages, error, seconds = worker.conn.recv()
+                            result = ExtractionResult(worker.path, pages, error, seconds)
+                        except (EOFError, OSError):
+                            pass  # died while sending, handled as a crash below
+                    if result is None and (worker.conn in ready or worker.process.sentinel in ready):
+                        worker.process.join(1.0)
+                        error = f"worker crashed (exit code {worker.process.exitcode})"
+                        result = ExtractionResult(worker.path, [], error, now - worker.started, transient=True)
+                        replace = True
+                    elif result is None and now - worker.started >= self.timeout:
+                        error = f"timed out after {self.timeout:g} s"
+                        result = ExtractionResult(worker.path, [], error, now - worker.started, transient=True)
+                        replace = True
+                    if result is None:
+                        continue
+                    if replace:
+                        worker.stop(kill=True)
+                        pool[i] = _Worker(ctx, self.extract)
+                    else:
+                        worker.path = None
+                    if not self._put(results, result, stop):
+                        return
+        except BaseException as e:
+            self._put(results, e, stop)
+        finally:
+            for worker in pool:
+                worker.stop(kill=stop.is_set())
+            self._put(results, None, stop)
+
+    @staticmethod
+    def _put(results: "queue.Queue", item, stop: threading.Event) -> bool:
+        """Put an item on the bounded queue, giving up once the consumer has stopped."""
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
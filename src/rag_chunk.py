@@ -0,0 +1,191 @@
+import re
+from collections import Counter
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+# Sentence ends: ., ! or ? followed by whitespace
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# Paragraph breaks in the cleaned page text
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count: words and punctuation marks, about what a WordPiece tokenizer produces for English.
+
+    :param text: Text to count.
+    :return: Number of tokens.
+    """
+    return len(re.findall(r"\w+|[^\w\s]", text))
+
+
+class Chunk(NamedTuple):
+    """A piece of page text small enough to be embedded as a whole."""
+
+    id: str
+    text: str
+    # 1-based page number
+    page: int
+    # Character offset of the chunk in the cleaned page text
+    offset: int
+    # Position of the chunk on its page
+    index: int
+
+
+class TextChunker:
+    """Split extracted PDF pages into overlapping chunks of at most max_tokens tokens.
+
+    Repeated running headers and footers and bare page numbers are removed first.
+    Chunks end at sentence ends, preferably at paragraph ends, and only a sentence
+    longer than the whole window is cut between words. Each chunk starts with the
+    last sentences of the previous one, up to overlap tokens, so text near a chunk
+    border stays searchable with its context.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 200,
+        overlap: int = 40,
+        count_tokens: Optional[Callable[[str], int]] = None,
+        strip_headers: bool = True,
+    ):
+        """
+        :param max_tokens: Maximum tokens per chunk, e.g. the embedding model's window minus special tokens.
+        :param overlap: Tokens of the previous chunk repeated at the start of the next.
+        :param count_tokens: Token counter, e.g. based on the model's tokenizer. Defaults to estimate_tokens.
+        :param strip_headers: Remove lines repeated at the top or bottom of most pages.
+        """
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.count_tokens = count_tokens or estimate_tokens
+        self.strip_headers = strip_headers
+
+    def chunk_pages(self, pages: List[str], item_key: str) -> List[Chunk]:
+        """
+        Chunk the pages of one document.
+
+        :param pages: Page texts in page order, "" for pages without text.
+        :param item_key: Zotero attachment key, used in the chunk IDs.
+        :return: Chunks with IDs of the form "{item_key}_p{page}_c{index}".
+        """
+        repeated = self._repeated_lines(pages) if self.strip_headers else set()
+        chunks = []
+        for page_number, page in enumerate(pages, start=1):
+            text = self.clean_page(page, repeated)
+            for index, (offset, chunk_text) in enumerate(self.chunk_text(text)):
+                chunks.append(Chunk(f"{item_key}_p{page_number}_c{index}", chunk_text, page_number, offset, index))
+        return chunks
+
+    def chunk_text(self, text: str) -> List[Tuple[int, str]]:
+        """
+        Chunk a cleaned text.
+
+        :param text: Text with paragraphs separated by blank lines.
+        :return: List of (character offset, chunk text) tuples.
+        """
+        # (start, end, tokens, ends_paragraph) for every sentence, long ones already cut
+        sentences = []
+        for paragraph in self._spans(text, PARAGRAPH_BREAK, 0, len(text)):
+            parts = list(self._spans(text, SENTENCE_END, *paragraph))
+            for i, (start, end) in enumerate(parts):
+                pieces = self._split_long(text, start, end)
+                for j, (piece_start, piece_end, tokens) in enumerate(pieces):
+                    last = i == len(parts) - 1 and j == len(pieces) - 1
+                    sentences.append((piece_start, piece_end, tokens, last))
+
+        chunks = []
+        current: List[tuple] = []
+        used = 0
+        for sentence in sentences:
+            tokens = sentence[2]
+            if current and used + tokens > self.max_tokens:
+                chunks.append(current)
+                current, used = self._overlap_tail(current, tokens)
+            current.append(sentence)
+            used += tokens
+            # Close the chunk at a paragraph end once it is reasonably full
+            if sentence[3] and used >= self.max_tokens // 2:
+                chunks.append(current)
+                current, used = [], 0
+        if current:
+            chunks.append(current)
+        return [(chunk[0][0], text[chunk[0][0]: chunk[-1][1]]) for chunk in chunks]
+
+    def _overlap_tail(self, sentences: List[tuple], next_tokens: int) -> Tuple[List[tuple], int]:
+        """Trailing sentences of a finished chunk to repeat in the next one."""
+        tail: List[tuple] = []
+        used = 0
+        for sentence in reversed(sentences):
+            if used + sentence[2] > self.overlap or used + sentence[2] + next_tokens > self.max_tokens:
+                break
+            tail.insert(0, sentence)
+            used += sentence[2]
+        return tail, used
+
+    def _split_long(self, text: str, start: int, end: int) -> List[Tuple[int, int, int]]:
+        """Cut a sentence longer than max_tokens between words."""
+        tokens = self.count_tokens(text[start:end])
+        if tokens <= self.max_tokens:
+            return [(start, end, tokens)]
+        pieces = []
+        piece_start, piece_end, used = start, start, 0
+        for word in re.finditer(r"\S+", text[start:end]):
+            word_tokens = self.count_tokens(word.group())
+            if used and used + word_tokens > self.max_tokens:
+                pieces.append((piece_start, piece_end, used))
+                piece_start, used = start + word.start(), 0
+            piece_end = start + word.end()
+            used += word_tokens
+        pieces.append((piece_start, piece_end, used))
+        return pieces
+
+    @staticmethod
+    def _spans(text: str, separator: re.Pattern, start: int, end: int):
+        """Yield the (start, end) spans of text[start:end] between separator matches, trimmed and non-empty."""
+        position = start
+        for match in list(separator.finditer(text, start, end)) + [None]:
+            stop = match.start() if match else end
+            segment = text[position:stop]
+            if segment.strip():
+                lead = len(segment) - len(segment.lstrip())
+                yield position + lead, position + len(segment.rstrip())
+            if match:
+                position = match.end()
+
+    @staticmethod
+    def _line_key(line: str) -> str:
+        """Header/footer comparison key: whitespace-collapsed, with digits masked (page numbers)."""
+        return re.sub(r"\d+", "#", " ".join(line.split()))
+
+    def _repeated_lines(self, pages: List[str], edge_lines: int = 2) -> set:
+        """Keys of lines at the top or bottom of at least half of the pages (and three or more)."""
+        counts: Counter = Counter()
+        text_pages = [page for page in pages if page.strip()]
+        for page in text_pages:
+            lines = [line for line in page.splitlines() if line.strip()]
+            counts.update({self._line_key(line) for line in lines[:edge_lines] + lines[-edge_lines:]})
+        threshold = max(3, (len(text_pages) + 1) // 2)
+        return {key for key, count in counts.items() if count >= threshold}
+
+    def clean_page(self, page: str, repeated: set = frozenset()) -> str:
+        """
+        Remove headers, footers and page numbers and rejoin lines broken by the PDF layout.
+
+        :param page: Extracted page text.
+        :param repeated: Line keys from _repeated_lines to drop.
+        :return: Page text with paragraphs separated by blank lines.
+        """
+        lines = []
+        for line in page.splitlines():
+            key = self._line_key(line)
+            if key in repeated or re.fullmatch(r"(page )?#( of #)?", key, re.IGNORECASE):
+                continue
+            lines.append(line.strip())
+        text = "\n".join(lines).strip()
+        paragraphs = PARAGRAPH_BREAK.split(text)
+        # Join words hyphenated at a line break, then the remaining lines of each paragraph
+        paragraphs = [
+            re.sub(r"\s*\n\s*", " ", re.sub(r"(\w)-\n(?=[a-z])", r"\1", paragraph)) for paragraph in paragraphs
+        ]
+        return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
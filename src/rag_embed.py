@@ -0,0 +1,137 @@
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def unit_length(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scale embeddings to unit length, so dot product equals cosine similarity.
+
+    :param embeddings: (n, dim) array, or a single (dim,) embedding.
+    :return: Float32 array of the same shape.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=-1, keepdims=True), 1e-12)
+
+
+class EmbeddedBatch(NamedTuple):
+    """A batch of chunks with their embeddings, ready to be stored."""
+
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Dict]
+    embeddings: np.ndarray
+
+
+class EmbeddingBatcher:
+    """Embed chunks in fixed-size batches that span document boundaries.
+
+    Chunks are collected with add() until batch_size of them are waiting, so
+    small PDFs no longer produce tiny encode calls. On a machine without a GPU
+    the batches are encoded by a SentenceTransformer multi-process pool.
+    """
+
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        batch_size: int = 256,
+        device: Optional[str] = None,
+        processes: Optional[int] = None,
+        normalize: bool = False,
+        model=None,
+    ):
+        """
+        :param model_name: SentenceTransformer model to load on first use.
+        :param batch_size: Chunks per encode call.
+        :param device: Torch device, e.g. "cuda" or "cpu". None lets sentence-transformers pick one.
+        :param processes: Encoding processes when running on CPU. None uses one per four CPUs;
+            1 encodes in this process.
+        :param normalize: Scale embeddings to unit length, see unit_length(). Queries against the
+            index must be normalized the same way, see RagSearcher.
+        :param model: Already loaded SentenceTransformer to use instead of loading model_name.
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self.processes = processes if processes is not None else max(1, (os.cpu_count() or 1) // 4)
+        self.normalize = normalize
+        self._model = model
+        self._pool = None
+        self._pending: List[tuple] = []
+        self.chunks = 0
+        self.seconds = 0.0
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts right away, bypassing the batch queue.
+
+        :param texts: Texts to embed.
+        :return: (len(texts), dim) array.
+        """
+        start = time.perf_counter()
+        model = self.model
+        if self.processes > 1 and model.device.type == "cpu":
+            if self._pool is None:
+                self._pool = model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+            embeddings = model.encode_multi_process(texts, self._pool, batch_size=self.batch_size)
+        else:
+            embeddings = model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.normalize:
+            embeddings = unit_length(embeddings)
+        self.chunks += len(texts)
+        self.seconds += time.perf_counter() - start
+        return embeddings
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict]) -> List[EmbeddedBatch]:
+        """
+        Queue chunks and embed every batch that is full.
+
+        :param ids: Chunk IDs.
+        :param documents: Chunk texts.
+        :param metadatas: Chunk metadata.
+        :return: Batches completed by these chunks, possibly none.
+        """
+        self._pending.extend(zip(ids, documents, metadatas))
+        batches = []
+        while len(self._pending) >= self.batch_size:
+            batches.append(self._embed(self._pending[: self.batch_size]))
+            self._pending = self._pending[self.batch_size:]
+        return batches
+
+    def flush(self) -> List[EmbeddedBatch]:
+        """
+        Embed the chunks still waiting for a full batch.
+
+        :return: The last, partial batch, or no batch if nothing was waiting.
+        """
+        pending, self._pending = self._pending, []
+        return [self._embed(pending)] if pending else []
+
+    def _embed(self, chunks: List[tuple]) -> EmbeddedBatch:
+        ids, documents, metadatas = (list(column) for column in zip(*chunks))
+        return EmbeddedBatch(ids, documents, metadatas, self.encode(documents))
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def close(self) -> None:
+        """
+        Stop the encoding processes, if any were started.
+        """
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
@@ -0,0 +1,144 @@
+import json
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+
+class KeywordHit(NamedTuple):
+    """A chunk found by a keyword search."""
+
+    id: str
+    document: str
+    metadata: Dict
+    # BM25 score, lower is better (SQLite's convention)
+    score: float
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn free text into an FTS5 query matching any of its terms.
+
+    Every term is quoted, so FTS5 syntax characters in the text are searched
+    literally. Like FTS5's unicode61 tokenizer, runs of letters and digits form
+    one term, so a formula such as "Fe3O4" is matched as written.
+
+    :param text: Search text.
+    :return: FTS5 MATCH expression, "" if the text has no terms.
+    """
+    terms = re.findall(r"\w+", text)
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+
+
+class ChunkTextIndex:
+    """SQLite FTS5 index of the RAG chunks for BM25 keyword search.
+
+    Kept next to the Chroma collection by RagIndex. Dense retrieval misses exact
+    terms such as chemical formulas and acronyms; this index finds them.
+    """
+
+    def __init__(self, path: str = ".rag_fts.sqlite"):
+        """
+        Open (or create) the index database.
+
+        :param path: Path to the SQLite file.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Chunk metadata in a regular table, indexed for deletes and filters; the FTS5 table
+        # holds only the text, under the same rowid
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_info (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                path TEXT,
+                item_key TEXT,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chunk_info_path ON chunk_info (path);
+            CREATE INDEX IF NOT EXISTS chunk_info_item_key ON chunk_info (item_key);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5(text, tokenize = "unicode61 remove_diacritics 2");
+        """
+        )
+        self._conn.commit()
+
+    def _delete_rows(self, where: str, params: tuple) -> None:
+        rowids = [(rowid,) for (rowid,) in self._conn.execute(f"SELECT rowid FROM chunk_info WHERE {where}", params)]
+        self._conn.executemany("DELETE FROM chunk_text WHERE rowid = ?", rowids)
+        self._conn.executemany("DELETE FROM chunk_info WHERE rowid = ?", rowids)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict]) -> None:
+        """
+        Add or replace chunks.
+
+        :param ids: Chunk IDs.
+        :param documents: Chunk texts.
+        :param metadatas: Chunk metadata with at least "path" and "item_key".
+        """
+        with self._lock:
+            for id_, document, metadata in zip(ids, documents, metadatas):
+                self._delete_rows("id = ?", (id_,))
+                cur = self._conn.execute(
+                    "INSERT INTO chunk_info (id, path, item_key, metadata) VALUES (?, ?, ?, ?)",
+                    (id_, metadata.get("path"), metadata.get("item_key"), json.dumps(metadata)),
+                )
+                self._conn.execute("INSERT INTO chunk_text (rowid, text) VALUES (?, ?)", (cur.lastrowid, document))
+            self._conn.commit()
+
+    def delete_path(self, path: str) -> None:
+        """
+        Remove all chunks of a PDF.
+
+        :param path: Path metadata of the chunks.
+        """
+        with self._lock:
+            self._delete_rows("path = ?", (path,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """
+        Remove all chunks.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM chunk_text")
+            self._conn.execute("DELETE FROM chunk_info")
+            self._conn.commit()
+
+    def search(self, text: str, top_k: int = 10, item_keys: Optional[Iterable[str]] = None) -> List[KeywordHit]:
+        """
+        Find the chunks ranking best by BM25 for any of the terms of a text.
+
+        :param text: Search text.
+        :param top_k: Number of chunks to return.
+        :param item_keys: Only search the chunks of these attachments.
+        :return: Hits, best first.
+        """
+        query = fts_query(text)
+        if not query:
+            return []
+        sql = """
+            SELECT chunk_info.id, chunk_text.text, chunk_info.metadata, bm25(chunk_text) AS score
+            FROM chunk_text JOIN chunk_info ON chunk_info.rowid = chunk_text.rowid
+            WHERE chunk_text MATCH ?
+        """
+        params: List = [query]
+        if item_keys is not None:
+            sql += " AND chunk_info.item_key IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(item_keys)))
+        sql += " ORDER BY score LIMIT ?"
+        params.append(top_k)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [KeywordHit(id_, text, json.loads(metadata), score) for id_, text, metadata, score in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_info").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Close the index database.
+        """
+        self._conn.close()
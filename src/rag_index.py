@@ -1,74 +1,408 @@
+import argparse
 import os
-import pdfplumber
-import chromadb
-from sentence_transformers import SentenceTransformer
-from dotenv import load_dotenv
-
-load_dotenv()
-ZOTERO_DB_PATH = os.getenv("ZOTERO_DB_PATH", "")
-ZOTERO_STORAGE_PATH = os.path.join(os.path.dirname(ZOTERO_DB_PATH), "storage")
-
-
-# Initialize ChromaDB client
-client = chromadb.PersistentClient(path="./chromadb_data")
-
-# Create or get collection
-collection = client.get_or_create_collection(name="pdf_rag")
-
-# Load open-source embedding model
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-
-
-def extract_text_from_pdf(pdf_path):
-    texts = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text()
-            if text:
-                texts.append(text)
-    return texts
-
-
-def add_pdf_to_chromadb(pdf_path):
-    texts = extract_text_from_pdf(pdf_path)
-    embeddings = embedder.encode(texts)
-    ids = [f"{os.path.basename(pdf_path)}_page_{i}" for i in range(len(texts))]
-    # Check which IDs already exist
-    existing = collection.get(ids=ids)
-    existing_ids = set(existing["ids"]) if existing and "ids" in existing else set()
-    # Filter out already existing IDs
-    new_indices = [i for i, id_ in enumerate(ids) if id_ not in existing_ids]
-    if new_indices:
-        new_embeddings = [embeddings[i] for i in new_indices]
-        new_texts = [texts[i] for i in new_indices]
-        new_ids = [ids[i] for i in new_indices]
-        collection.add(embeddings=new_embeddings, documents=new_texts, ids=new_ids)
-
-
-def query_rag(question, top_k=3):
-    question_embedding = embedder.encode([question])[0]
-    results = collection.query(query_embeddings=[question_embedding], n_results=top_k)
-    return results["documents"][0]
-
-
-# Add all PDFs directly from Zotero storage (no folder recursion)
-for item in os.listdir(ZOTERO_STORAGE_PATH):
-    if item.startswith('.'):
-        continue
-    item_folder = os.path.join(ZOTERO_STORAGE_PATH, item)
-    if not os.path.isdir(item_folder):
-        continue
-    item_path = None
-    for file in os.listdir(item_folder):
-        if file.startswith('.'):
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pdf_extract import ExtractionResult, ExtractionStats, ParallelExtractor, extract_pages
+from rag_chunk import TextChunker
+from rag_embed import MODEL_NAME, EmbeddedBatch, EmbeddingBatcher
+from rag_fts import ChunkTextIndex
+from rag_manifest import RagManifest
+
+CHROMA_PATH = "./chromadb_data"
+COLLECTION_NAME = "pdf_rag"
+FTS_PATH = ".rag_fts.sqlite"
+# Bumped when the chunk IDs or metadata change, so the next update re-indexes everything
+INDEX_LAYOUT = 2
+
+
+def open_collection(chroma_path: str = CHROMA_PATH, collection_name: str = COLLECTION_NAME, create: bool = True):
+    """
+    Open the Chroma collection holding the PDF chunks.
+
+    :param chroma_path: Directory of the persistent Chroma database.
+    :param collection_name: Name of the collection.
+    :param create: Create the collection if it does not exist yet.
+    :return: Chroma collection.
+    :raises FileNotFoundError: If create is False and the collection has not been built.
+    """
+    missing = f"No RAG index '{collection_name}' in {chroma_path}: build it with rag_index.py first"
+    if not create and not os.path.isdir(chroma_path):
+        # PersistentClient would create an empty database
+        raise FileNotFoundError(missing)
+    import chromadb
+    from chromadb.errors import ChromaError
+
+    client = chromadb.PersistentClient(path=chroma_path)
+    if create:
+        return client.get_or_create_collection(name=collection_name)
+    try:
+        return client.get_collection(name=collection_name)
+    except (ValueError, ChromaError) as e:
+        # ValueError before Chroma 0.6, NotFoundError (a ChromaError) since
+        raise FileNotFoundError(missing) from e
+
+
+def find_storage_pdfs(storage_path: str):
+    """Yield the first PDF of every Zotero storage folder (no folder recursion)."""
+    for item in os.listdir(storage_path):
+        if item.startswith('.'):
+            continue
+        item_folder = os.path.join(storage_path, item)
+        if not os.path.isdir(item_folder):
             continue
-        potential_path = os.path.join(item_folder, file)
-        if os.path.isfile(potential_path) and potential_path.lower().endswith(".pdf"):
-            item_path = potential_path
-            break
-    if item_path is not None:
-        print(f"Processing PDF: {item_path}...")
+        for file in os.listdir(item_folder):
+            if file.startswith('.'):
+                continue
+            potential_path = os.path.join(item_folder, file)
+            if os.path.isfile(potential_path) and potential_path.lower().endswith(".pdf"):
+                yield potential_path
+                break
+
+
+class RagIndex:
+    """Chroma index of the text chunks of the PDFs in Zotero's storage folder.
+
+    Chroma, the embedding model and the chunker's tokenizer are loaded on first
+    use, so creating an index (or importing this module in an extraction worker)
+    is cheap.
+    """
+
+    def __init__(
+        self,
+        storage_path: str,
+        chroma_path: str = CHROMA_PATH,
+        collection_name: str = COLLECTION_NAME,
+        manifest_path: str = ".rag_manifest.sqlite",
+        fts_path: Optional[str] = FTS_PATH,
+        model_name: str = MODEL_NAME,
+        normalize: bool = False,
+        batch_size: int = 256,
+        processes: Optional[int] = None,
+        chunk_tokens: int = 240,
+        chunk_overlap: int = 40,
+        extract_workers: Optional[int] = None,
+        extract_timeout: float = 120.0,
+        extract: Callable[[str], List[str]] = extract_pages,
+        progress_every: int = 25,
+    ):
+        """
+        :param storage_path: Zotero storage folder with one subfolder per attachment.
+        :param chroma_path: Directory of the persistent Chroma database.
+        :param collection_name: Name of the Chroma collection.
+        :param manifest_path: SQLite manifest of the indexed files.
+        :param fts_path: SQLite FTS5 keyword index kept alongside Chroma. None disables it.
+        :param model_name: SentenceTransformer model for the embeddings.
+        :param normalize: Store unit-length embeddings. Search with RagSearcher(normalize=True) then.
+        :param batch_size: Chunks per embedding batch.
+        :param processes: Embedding processes on CPU, see EmbeddingBatcher.
+        :param chunk_tokens: Maximum model tokens per chunk.
+        :param chunk_overlap: Tokens repeated between neighbouring chunks.
+        :param extract_workers: PDF extraction processes. None uses one per CPU.
+        :param extract_timeout: Seconds a single PDF may take to extract.
+        :param extract: Module-level function extracting page texts, run in the workers.
+        :param progress_every: Print a progress line every this many PDFs.
+        """
+        self.storage_path = storage_path
+        self.chroma_path = chroma_path
+        self.collection_name = collection_name
+        self.manifest_path = manifest_path
+        self.fts_path = fts_path
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.extract_workers = extract_workers
+        self.extract_timeout = extract_timeout
+        self.extract = extract
+        self.progress_every = progress_every
+        self.batcher = EmbeddingBatcher(model_name, batch_size=batch_size, processes=processes, normalize=normalize)
+        self._collection = None
+        self._fts = None
+        self._chunker = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            self._collection = open_collection(self.chroma_path, self.collection_name)
+        return self._collection
+
+    @property
+    def fts(self) -> Optional[ChunkTextIndex]:
+        if self._fts is None and self.fts_path:
+            self._fts = ChunkTextIndex(self.fts_path)
+        return self._fts
+
+    @property
+    def chunker(self) -> TextChunker:
+        if self._chunker is None:
+            # Count tokens with the model's own tokenizer, so chunks fit its window (256 for MiniLM)
+            tokenizer = self.batcher.model.tokenizer
+            self._chunker = TextChunker(
+                max_tokens=self.chunk_tokens,
+                overlap=self.chunk_overlap,
+                count_tokens=lambda text: len(tokenizer.tokenize(text)),
+            )
+        return self._chunker
+
+    @property
+    def version(self) -> str:
+        """Index layout, embedding model, normalization and chunk sizes, recorded in the manifest."""
+        version = f"{INDEX_LAYOUT}:{self.batcher.model_name}:{self.chunk_tokens}:{self.chunk_overlap}"
+        # Suffixed only when set, so indexes built before the option keep their version
+        return version + ":normalized" if self.batcher.normalize else version
+
+    def pdf_chunks(self, pdf_path: str, pages: List[str]) -> Tuple[List[str], List[str], List[Dict]]:
+        """
+        Chunk the pages of a PDF.
+
+        :param pdf_path: Path of the PDF in the storage folder.
+        :param pages: Page texts in page order.
+        :return: Chunk IDs, texts and metadata.
+        """
+        item_key = os.path.basename(os.path.dirname(pdf_path))
+        chunks = self.chunker.chunk_pages(pages, item_key)
+        # The path metadata lets delete_pdf find the chunks again
+        metadatas = [
+            {"path": pdf_path, "item_key": item_key, "page": chunk.page, "offset": chunk.offset, "chunk": chunk.index}
+            for chunk in chunks
+        ]
+        return [chunk.id for chunk in chunks], [chunk.text for chunk in chunks], metadatas
+
+    def store_batch(self, batch: EmbeddedBatch) -> None:
+        self.collection.upsert(
+            embeddings=batch.embeddings.tolist(), documents=batch.documents, metadatas=batch.metadatas, ids=batch.ids
+        )
+        if self.fts is not None:
+            self.fts.add(batch.ids, batch.documents, batch.metadatas)
+
+    def add_pdf(self, pdf_path: str, pages: Optional[List[str]] = None) -> int:
+        """
+        Index a single PDF right away, outside of the manifest.
+
+        :param pdf_path: Path of the PDF.
+        :param pages: Already extracted page texts. Extracted here if not given.
+        :return: Number of chunks stored.
+        """
+        if pages is None:
+            pages = extract_pages(pdf_path)
+        ids, documents, metadatas = self.pdf_chunks(pdf_path, pages)
+        for batch in self.batcher.add(ids, documents, metadatas) + self.batcher.flush():
+            self.store_batch(batch)
+        return len(ids)
+
+    def delete_pdf(self, pdf_path: str) -> None:
+        self.collection.delete(where={"path": pdf_path})
+        if self.fts is not None:
+            self.fts.delete_path(pdf_path)
+
+    def purge(self, page_size: int = 1000) -> None:
+        """
+        Delete all chunks from Chroma and the keyword index.
+
+        :param page_size: Chunks deleted from Chroma at a time.
+        """
+        while True:
+            ids = self.collection.get(include=[], limit=page_size)["ids"]
+            if not ids:
+                break
+            self.collection.delete(ids=ids)
+        if self.fts is not None:
+            self.fts.clear()
+
+    def rebuild_fts(self, page_size: int = 1000) -> int:
+        """
+        Fill the keyword index from the chunks already stored in Chroma.
+
+        :param page_size: Chunks read from Chroma at a time.
+        :return: Number of chunks copied.
+        :raises ValueError: If the index has no fts_path.
+        """
+        if self.fts is None:
+            raise ValueError("No keyword index to rebuild: fts_path is not set")
+        copied = 0
+        try:
+            while True:
+                page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=copied)
+                if not page["ids"]:
+                    return copied
+                self.fts.add(page["ids"], page["documents"], page["metadatas"])
+                copied += len(page["ids"])
+        finally:
+            self._fts.close()
+            self._fts = None
+
+    def query(self, question: str, top_k: int = 3) -> List[str]:
+        """
+        Find the chunks closest to a question.
+
+        :param question: Query text.
+        :param top_k: Number of chunks to return.
+        :return: Chunk texts, closest first.
+        """
+        question_embedding = self.batcher.model.encode([question])[0]
+        results = self.collection.query(query_embeddings=[question_embedding.tolist()], n_results=top_k)
+        return results["documents"][0]
+
+    def report_progress(self, result: ExtractionResult, stats: ExtractionStats) -> None:
+        if result.error is not None:
+            print(f"Error processing {result.path}: {result.error}")
+        if stats.files % self.progress_every == 0:
+            print(f"Extracted {stats}")
+
+    def update(self) -> ExtractionStats:
+        """
+        Bring the index in line with the storage folder.
+
+        Only new and changed PDFs are extracted; the manifest knows what is indexed already.
+        Chunks of changed and removed PDFs are deleted first. If the manifest was written for
+        another index version (or is new), all chunks are deleted and every PDF is indexed again.
+
+        :return: Extraction statistics of the run.
+        """
+        manifest = RagManifest(self.manifest_path)
         try:
-            add_pdf_to_chromadb(item_path)
-        except Exception as e:
-            print(f"Error processing {item_path}: {e}")
+            if manifest.version != self.version:
+                print(f"Index version changed from {manifest.version} to {self.version}: re-indexing all PDFs")
+                self.purge()
+                manifest.reset(self.version)
+            scan = manifest.scan(find_storage_pdfs(self.storage_path))
+            print(
+                f"{len(scan.new)} new, {len(scan.changed)} changed, {scan.unchanged} unchanged "
+                f"and {len(scan.removed)} removed PDFs"
+            )
+            for path in scan.removed:
+                self.delete_pdf(path)
+                manifest.remove(path)
+            return self._index(manifest, {state.path: state for state in scan.new + scan.changed}, scan.changed)
+        finally:
+            self.batcher.close()
+            manifest.close()
+            if self._fts is not None:
+                self._fts.close()
+                self._fts = None
+
+    def _index(self, manifest: RagManifest, states: Dict, changed_states: List) -> ExtractionStats:
+        # Extract in worker processes while this process embeds and stores the finished files.
+        # Chunks of several files share embedding batches, so a file is only recorded in the
+        # manifest once the batch holding its last chunk is stored.
+        extractor = ParallelExtractor(
+            workers=self.extract_workers,
+            timeout=self.extract_timeout,
+            extract=self.extract,
+            on_progress=self.report_progress,
+        )
+        changed = {state.path for state in changed_states}
+        chunk_counts = {}
+        waiting = {}
+
+        def store(batches):
+            for batch in batches:
+                paths = [metadata["path"] for metadata in batch.metadatas]
+                try:
+                    self.store_batch(batch)
+                except Exception as e:
+                    print(f"Error storing chunks of {', '.join(sorted(set(paths)))}: {e}")
+                    for path in paths:
+                        waiting.pop(path, None)  # not recorded, so the next run tries again
+                    continue
+                for path in paths:
+                    if path in waiting:
+                        waiting[path] -= 1
+                        if waiting[path] == 0:
+                            del waiting[path]
+                            manifest.record(states[path], chunk_counts[path])
+
+        for result in extractor.imap(states):
+            # The old chunks of a changed file go even if it no longer extracts
+            if result.path in changed:
+                self.delete_pdf(result.path)
+            if result.error is not None:
+                # Parse errors are recorded so the file is skipped until it changes; timeouts and
+                # crashes are not, so the next run tries again
+                if not result.transient:
+                    manifest.record(states[result.path], 0, result.error)
+                continue
+            print(f"Processing PDF: {result.path}...")
+            ids, documents, metadatas = self.pdf_chunks(result.path, result.pages)
+            chunk_counts[result.path] = len(ids)
+            if not ids:
+                manifest.record(states[result.path], 0)
+                continue
+            waiting[result.path] = len(ids)
+            store(self.batcher.add(ids, documents, metadatas))
+        store(self.batcher.flush())
+        print(f"Done: {extractor.stats}")
+        print(f"Embedded {self.batcher.chunks} chunks at {self.batcher.chunks_per_second:.1f} chunks/s")
+        return extractor.stats
+
+
+def parse_args(argv):
+    """Parse command line arguments, with defaults taken from the environment."""
+    db_path = os.getenv("ZOTERO_DB_PATH", "")
+    processes = os.getenv("RAG_EMBED_PROCESSES")
+    parser = argparse.ArgumentParser(description="Index the PDFs in Zotero's storage folder for semantic search.")
+    parser.add_argument(
+        "--storage",
+        default=os.path.join(os.path.dirname(db_path), "storage"),
+        help="Zotero storage folder (default: next to ZOTERO_DB_PATH).",
+    )
+    parser.add_argument("--chroma-path", default=CHROMA_PATH, help="Chroma database directory.")
+    parser.add_argument(
+        "--manifest", default=os.getenv("RAG_MANIFEST_PATH", ".rag_manifest.sqlite"), help="Manifest file."
+    )
+    parser.add_argument("--fts-path", default=os.getenv("RAG_FTS_PATH", FTS_PATH), help="Keyword index file.")
+    parser.add_argument(
+        "--rebuild-fts",
+        action="store_true",
+        help="Copy all chunks stored in Chroma into the keyword index, e.g. for an index built without it.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("RAG_EXTRACT_WORKERS", "0")) or None,
+        help="PDF extraction processes (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=float(os.getenv("RAG_EXTRACT_TIMEOUT", "120")),
+        help="Seconds a single PDF may take to extract.",
+    )
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        default=os.getenv("RAG_NORMALIZE", "false").lower() in ("1", "true", "yes"),
+        help="Store unit-length embeddings; search with the same setting.",
+    )
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("RAG_EMBED_BATCH_SIZE", "256")))
+    parser.add_argument("--processes", type=int, default=int(processes) if processes else None)
+    parser.add_argument("--chunk-tokens", type=int, default=int(os.getenv("RAG_CHUNK_TOKENS", "240")))
+    parser.add_argument("--chunk-overlap", type=int, default=int(os.getenv("RAG_CHUNK_OVERLAP", "40")))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Index new and changed PDFs of the Zotero storage folder."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    args = parse_args([] if argv is None else argv)
+    index = RagIndex(
+        args.storage,
+        chroma_path=args.chroma_path,
+        manifest_path=args.manifest,
+        fts_path=args.fts_path,
+        normalize=args.normalize,
+        batch_size=args.batch_size,
+        processes=args.processes,
+        chunk_tokens=args.chunk_tokens,
+        chunk_overlap=args.chunk_overlap,
+        extract_workers=args.workers,
+        extract_timeout=args.timeout,
+    )
+    if args.rebuild_fts:
+        print(f"Copied {index.rebuild_fts()} chunks into the keyword index")
+    index.update()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Iterable, List, NamedTuple, Optional
+
+
+class FileState(NamedTuple):
+    """Size, modification time and content hash of a storage PDF."""
+
+    path: str
+    # Zotero attachment key, the name of the storage folder the file is in
+    item_key: str
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class ManifestScan(NamedTuple):
+    """Difference between the storage folder and the manifest."""
+
+    new: List[FileState]
+    changed: List[FileState]
+    unchanged: int
+    # Paths in the manifest that no longer exist
+    removed: List[str]
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Hash a file's content.
+
+    :param path: Path to the file.
+    :param block_size: Bytes read at a time.
+    :return: Hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RagManifest:
+    """SQLite record of the PDFs in the RAG index, used to index only what changed."""
+
+    def __init__(self, path: str = ".rag_manifest.sqlite"):
+        """
+        Open (or create) the manifest database.
+
+        :param path: Path to the SQLite manifest file.
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                item_key TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                error TEXT,
+                indexed REAL NOT NULL
+            )
+        """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    @property
+    def version(self) -> Optional[str]:
+        """Layout of the index the recorded files were chunked and embedded with, None for a new manifest."""
+        row = self._conn.execute("SELECT value FROM settings WHERE name = 'version'").fetchone()
+        return row[0] if row else None
+
+    def reset(self, version: str) -> None:
+        """
+        Forget all files and start over with a new index layout.
+
+        :param version: Layout of the index the files will be recorded for.
+        """
+        self._conn.execute("DELETE FROM files")
+        self._conn.execute("INSERT OR REPLACE INTO settings (name, value) VALUES ('version', ?)", (version,))
+        self._conn.commit()
+
+    def get(self, path: str) -> Optional[FileState]:
+        """
+        Look up the recorded state of a file.
+
+        :param path: Path of the PDF.
+        :return: Recorded FileState, or None if the file is not in the manifest.
+        """
+        row = self._conn.execute(
+            "SELECT path, item_key, size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        return FileState(*row) if row else None
+
+    def scan(self, paths: Iterable[str]) -> ManifestScan:
+        """
+        Compare the given files with the manifest.
+
+        Files whose size and mtime match the manifest are unchanged without being read. Only
+        the others are hashed, so a touched but identical file is not indexed again.
+
+        :param paths: Paths of the PDFs currently in storage.
+        :return: ManifestScan with the new and changed files to index and the removed paths.
+        """
+        new, changed, unchanged = [], [], 0
+        seen = set()
+        for path in paths:
+            seen.add(path)
+            stat = os.stat(path)
+            recorded = self.get(path)
+            if recorded and (recorded.size, recorded.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                unchanged += 1
+                continue
+            state = FileState(
+                path, os.path.basename(os.path.dirname(path)), stat.st_size, stat.st_mtime_ns, file_sha256(path)
+            )
+            if recorded is None:
+                new.append(state)
+            elif recorded.sha256 == state.sha256:
+                unchanged += 1
+                self._conn.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", (state.size, state.mtime_ns, path)
+                )
+            else:
+                changed.append(state)
+        self._conn.commit()
+        removed = [path for (path,) in self._conn.execute("SELECT path FROM files") if path not in seen]
+        return ManifestScan(new, changed, unchanged, removed)
+
+    def record(self, state: FileState, chunks: int, error: Optional[str] = None) -> None:
+        """
+        Record a file as indexed.
+
+        Files that failed are recorded too, with their error, so they are only retried once
+        they change.
+
+        :param state: FileState from scan.
+        :param chunks: Number of chunks stored for the file.
+        :param error: Why the file could not be indexed, if it could not.
+        """
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files (path, item_key, size, mtime_ns, sha256, chunks, error, indexed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (*state, chunks, error, time.time()),
+        )
+        self._conn.commit()
+
+    def remove(self, path: str) -> None:
+        """
+        Forget a file.
+
+        :param path: Path of the PDF.
+        """
+        self._conn.execute("DELETE FROM files WHERE path = ?", (path,))
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Close the manifest database.
+        """
+        self._conn.close()
@@ -1,22 +1,232 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import argparse
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
-# Initialize ChromaDB client
-client = chromadb.PersistentClient(path="./chromadb_data")
+from rag_index import CHROMA_PATH, COLLECTION_NAME, FTS_PATH, open_collection
+from rag_embed import MODEL_NAME, unit_length
+from rag_fts import ChunkTextIndex
 
-# Get existing collection
-collection = client.get_collection(name="pdf_rag")
+SEARCH_MODES = ("hybrid", "dense", "keyword")
 
-# Load open-source embedding model
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
 
+class SearchHit(NamedTuple):
+    """A chunk found by a search."""
 
-def search(query, top_k=5):
-    query_embedding = embedder.encode([query])[0]
-    results = collection.query(query_embeddings=[query_embedding], n_results=top_k)
-    return results["documents"][0], results["ids"][0]
+    id: str
+    document: str
+    metadata: Dict
+    # Embedding distance, None for hits found only by keyword
+    distance: Optional[float]
+    # Reciprocal rank fusion score in hybrid searches, higher is better
+    score: Optional[float] = None
 
 
-docs, ids = search("Sum rules")
-for doc, id_ in zip(docs, ids):
-    print(f"ID: {id_}\nDocument: {doc}\n{'-'*40}")
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of IDs by summing 1 / (k + rank) over the rankings each ID appears in.
+
+    :param rankings: ID lists, best first.
+    :param k: Damping constant; 60 is the value from the original RRF paper.
+    :return: (ID, score) tuples, best first.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+class RagSearcher:
+    """Long-lived semantic search over the RAG index.
+
+    The collection and the embedding model are loaded once, on first use or by
+    warm(), and reused by every search; pass an already loaded model to share
+    it with other components. Query embeddings are kept in a small LRU cache,
+    so repeated queries skip the model.
+    """
+
+    def __init__(
+        self,
+        chroma_path: str = CHROMA_PATH,
+        collection_name: str = COLLECTION_NAME,
+        model_name: str = MODEL_NAME,
+        model=None,
+        query_cache_size: int = 256,
+        fts_path: Optional[str] = None,
+        normalize: bool = False,
+    ):
+        """
+        :param chroma_path: Directory of the persistent Chroma database.
+        :param collection_name: Name of the collection built by rag_index.
+        :param model_name: SentenceTransformer model the index was built with.
+        :param model: Already loaded SentenceTransformer to use instead of loading model_name.
+        :param query_cache_size: Number of query embeddings to keep.
+        :param fts_path: FTS5 keyword index written by rag_index, needed for hybrid and keyword searches.
+            It is opened on the first search after rag_index has created it; a missing file is never created.
+        :param normalize: Scale query embeddings to unit length, for an index built with normalize=True.
+        """
+        self.chroma_path = chroma_path
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self._model = model
+        self._collection = None
+        self.fts_path = fts_path
+        self.normalize = normalize
+        self._fts: Optional[ChunkTextIndex] = None
+        self.query_cache_size = query_cache_size
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    @property
+    def collection(self):
+        with self._lock:
+            if self._collection is None:
+                self._collection = open_collection(self.chroma_path, self.collection_name, create=False)
+            return self._collection
+
+    @property
+    def fts(self) -> Optional[ChunkTextIndex]:
+        with self._lock:
+            # Checked again on every search until the file exists, so an index built while the searcher runs is used
+            if self._fts is None and self.fts_path and os.path.exists(self.fts_path):
+                self._fts = ChunkTextIndex(self.fts_path)
+            return self._fts
+
+    def warm(self) -> "RagSearcher":
+        """
+        Load the model and open the collection now instead of on the first search.
+
+        :return: The searcher itself.
+        """
+        self.model.encode(["warm up"])
+        _ = self.collection
+        return self
+
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query, reusing the embedding of a recent identical query.
+
+        :param query: Query text.
+        :return: Query embedding.
+        """
+        with self._lock:
+            if query in self._query_cache:
+                self._query_cache.move_to_end(query)
+                return self._query_cache[query]
+        embedding = self.model.encode([query])[0]
+        if self.normalize:
+            embedding = unit_length(embedding)
+        embedding = embedding.tolist()
+        with self._lock:
+            self._query_cache[query] = embedding
+            while len(self._query_cache) > self.query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
+
+    def query(self, query: str, top_k: int = 5, where: Optional[Dict] = None) -> List[SearchHit]:
+        """
+        Find the chunks closest to a query.
+
+        :param query: Query text.
+        :param top_k: Number of chunks to return.
+        :param where: Optional Chroma metadata filter, e.g. {"item_key": {"$in": [...]}}.
+        :return: Hits, closest first.
+        """
+        results = self.collection.query(
+            query_embeddings=[self.embed_query(query)],
+            n_results=top_k,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            SearchHit(*hit)
+            for hit in zip(results["ids"][0], results["documents"][0], results["metadatas"][0], results["distances"][0])
+        ]
+
+    def retrieve(
+        self, query: str, top_k: int = 5, item_keys: Optional[List[str]] = None, mode: str = "hybrid"
+    ) -> List[SearchHit]:
+        """
+        Find chunks by meaning, by keywords (BM25) or by both, fused with reciprocal rank fusion.
+
+        :param query: Query text.
+        :param top_k: Number of chunks to return.
+        :param item_keys: Only search the chunks of these attachments.
+        :param mode: "hybrid", "dense" or "keyword". Without a keyword index, "hybrid" falls back to "dense".
+        :return: Hits, best first.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+        fts = self.fts
+        if fts is None and mode != "dense":
+            if mode == "keyword":
+                raise ValueError("Keyword search needs the index from fts_path")
+            mode = "dense"
+        where = {"item_key": {"$in": list(item_keys)}} if item_keys is not None else None
+        if mode == "dense":
+            return self.query(query, top_k, where=where)
+        if mode == "keyword":
+            return [
+                SearchHit(hit.id, hit.document, hit.metadata, None)
+                for hit in fts.search(query, top_k, item_keys=item_keys)
+            ]
+
+        # Fuse deeper candidate lists than requested, so a chunk ranked fairly high by both can win
+        candidates = max(4 * top_k, 20)
+        dense = self.query(query, candidates, where=where)
+        keyword = fts.search(query, candidates, item_keys=item_keys)
+        hits = {hit.id: hit for hit in keyword}
+        hits.update({hit.id: hit for hit in dense})
+        fused = reciprocal_rank_fusion([[hit.id for hit in dense], [hit.id for hit in keyword]])
+        return [
+            SearchHit(id_, hits[id_].document, hits[id_].metadata, getattr(hits[id_], "distance", None), score)
+            for id_, score in fused[:top_k]
+        ]
+
+    def search(self, query: str, top_k: int = 5) -> Tuple[List[str], List[str]]:
+        """
+        Find the chunks closest to a query.
+
+        :param query: Query text.
+        :param top_k: Number of chunks to return.
+        :return: Chunk texts and chunk IDs, closest first.
+        """
+        hits = self.query(query, top_k)
+        return [hit.document for hit in hits], [hit.id for hit in hits]
+
+
+def main(argv=None):
+    """Print the chunks closest to a query."""
+    parser = argparse.ArgumentParser(description="Semantic search over the indexed Zotero PDFs.")
+    parser.add_argument("query", help="Search text.")
+    parser.add_argument("--top-k", type=int, default=5, help="Number of chunks to show.")
+    parser.add_argument("--chroma-path", default=CHROMA_PATH, help="Chroma database directory.")
+    parser.add_argument("--fts-path", default=FTS_PATH, help="Keyword index file.")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="hybrid", help="Ranking to use.")
+    parser.add_argument(
+        "--normalize",
+        action="store_true",
+        default=os.getenv("RAG_NORMALIZE", "false").lower() in ("1", "true", "yes"),
+        help="Normalize the query embedding, for an index built with --normalize.",
+    )
+    args = parser.parse_args(argv)
+
+    searcher = RagSearcher(args.chroma_path, fts_path=args.fts_path, normalize=args.normalize)
+    for hit in searcher.retrieve(args.query, args.top_k, mode=args.mode):
+        print(f"ID: {hit.id}\nDocument: {hit.document}\n{'-'*40}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
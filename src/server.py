@@ -1,153 +1,362 @@
 # mcp server.py
+import json
 import os
-import sqlite3
+import sys
+import threading
 from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 from dotenv import load_dotenv
-import openai
 
 from mcp.server.fastmcp import FastMCP
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from tagindex import TagIndex  # noqa: E402
+from zoterodb import ConnectionPool, DatabaseWatcher  # noqa: E402
+from rag_search import RagSearcher  # noqa: E402
+from rag_index import CHROMA_PATH, FTS_PATH  # noqa: E402
+
 load_dotenv()
 
 # Initialize FastMCP
 mcp = FastMCP("zotero-mcp")
 
 
+class LibraryState(NamedTuple):
+    """Tag data served from memory until the database changes."""
+
+    tags: TagIndex
+    # Item counts of the tags, without items in the trash
+    frequencies: Dict[str, int]
+    # collectionIDs by casefolded collection name
+    collections: Dict[str, List[int]]
+    # Connection pool generation the data was loaded at
+    generation: int
+
+
 class ZoteroSearcher:
     def __init__(self):
         self.db_path = os.getenv("ZOTERO_DB_PATH")
-        self.api_key = os.getenv("CBORG_API_KEY")
-        self.base_url = os.getenv("CBORG_BASE_URL")
-        self.model = os.getenv("CBORG_MODEL")
         self.zotero_storage_path = Path(self.db_path).parent / "storage"
 
-        # Initialize OpenAI client for summaries
-        self.client = openai.Client(api_key=self.api_key, base_url=self.base_url)
+        # Read-only connections reused across tool calls, reopened when Zotero changes the database.
+        # By default they read a cached snapshot copy, so queries never wait for Zotero's locks.
+        self.pool = ConnectionPool(
+            self.db_path,
+            size=int(os.getenv("ZOTERO_POOL_SIZE", "4")),
+            snapshot=os.getenv("ZOTERO_SNAPSHOT", "true").lower() not in ("0", "false", "no"),
+            snapshot_dir=os.getenv("ZOTERO_SNAPSHOT_DIR") or None,
+        )
+        self.watcher = DatabaseWatcher(
+            self.db_path, interval=float(os.getenv("ZOTERO_WATCH_INTERVAL", "2")), on_change=self.refresh
+        )
+        self._state: Optional[LibraryState] = None
+        self._state_lock = threading.Lock()
+
+        # Semantic search over the PDF chunks indexed by rag_index.py, kept warm for the server's lifetime
+        self.rag = RagSearcher(
+            os.getenv("RAG_CHROMA_PATH", CHROMA_PATH),
+            fts_path=os.getenv("RAG_FTS_PATH", FTS_PATH),
+            normalize=os.getenv("RAG_NORMALIZE", "false").lower() in ("1", "true", "yes"),
+        )
+
+    def state(self) -> LibraryState:
+        """Returns the in-memory tag data, reloaded only after the database changed."""
+        self.pool.check()
+        state = self._state
+        if state is None or state.generation != self.pool.generation:
+            state = self._load_state()
+        return state
+
+    def _load_state(self) -> LibraryState:
+        with self._state_lock:
+            generation = self.pool.generation
+            if self._state is None or self._state.generation != generation:
+                with self.pool.connection() as db:
+                    self._state = LibraryState(
+                        TagIndex.load(db), db.tag_frequencies(exclude_deleted=True), db.collection_ids(), generation
+                    )
+            return self._state
+
+    def refresh(self):
+        """Reopen the connections and reload the tag data; called by the watcher after Zotero wrote."""
+        self.pool.reload()
+        try:
+            self._load_state()
+        except Exception as e:
+            # The next tool call retries
+            print(f"Reloading the library failed: {e}", file=sys.stderr)
+
+    def start_watcher(self):
+        """Watch the database in the background, so tool calls are served without checking it themselves."""
+        self.pool.check_interval = None
+        self.watcher.start()
+
+    def warm_rag(self):
+        """Load the embedding model and the index, so the first semantic search is fast."""
+        try:
+            self.rag.warm()
+        except Exception as e:
+            # stdout carries the MCP protocol
+            print(f"Semantic search unavailable: {e}", file=sys.stderr)
 
 
 # Initialize the searcher
 searcher = ZoteroSearcher()
 
 
+OUTPUT_FORMATS = ("markdown", "json")
+# Largest page a tool returns, whatever limit is asked for
+MAX_PAGE_SIZE = 500
+
+
+def _decode_cursor(cursor: str, parts: int) -> Optional[Tuple[int, ...]]:
+    """Parse a cursor of dot-separated integers, zeros if it is empty and None if it is malformed."""
+    if not cursor:
+        return (0,) * parts
+    try:
+        values = tuple(int(value) for value in cursor.split("."))
+    except ValueError:
+        return None
+    return values if len(values) == parts and min(values) >= 0 else None
+
+
+def _check_page_args(cursor: str, parts: int, format: str) -> Tuple[Optional[Tuple[int, ...]], Optional[str]]:
+    """Decode a cursor and validate the output format; returns (cursor values, error message)."""
+    if format not in OUTPUT_FORMATS:
+        return None, f"Unknown format: '{format}'. Use one of: {', '.join(OUTPUT_FORMATS)}"
+    values = _decode_cursor(cursor, parts)
+    if values is None:
+        return None, f"Invalid cursor: '{cursor}'. Pass the next_cursor of a previous reply, or nothing."
+    return values, None
+
+
+def _preview(text: Optional[str], length: int = 200) -> Optional[str]:
+    if text and len(text) > length:
+        return text[:length] + "..."
+    return text
+
+
 @mcp.tool()
-def get_all_tags() -> str:
+def get_all_tags(limit: int = 200, cursor: str = "", format: str = "markdown") -> str:
     """
-    Get all unique tags currently in the Zotero library.
+    Get all unique tags currently in the Zotero library, most used first.
+
+    Args:
+        limit: Maximum number of tags to return (at most 500)
+        cursor: next_cursor from a previous reply, to get the following tags
+        format: "markdown" (default) or "json" for {"total", "tags": [{"name", "papers"}], "next_cursor"}
 
     Returns:
-        List of all unique tags
-    """
-    conn = sqlite3.connect(searcher.db_path)
-    cur = conn.cursor()
-
-    # Get only tags that are actually used by current items (not deleted)
-    cur.execute(
-        """
-        SELECT DISTINCT tags.name, COUNT(DISTINCT itemTags.itemID) as count
-        FROM tags
-        JOIN itemTags ON tags.tagID = itemTags.tagID
-        JOIN items ON itemTags.itemID = items.itemID
-        WHERE items.itemID NOT IN (SELECT itemID FROM deletedItems)
-            AND items.libraryID IS NOT NULL
-        GROUP BY tags.name
-        ORDER BY count DESC
+        List of unique tags with their number of papers
     """
-    )
-
-    tags = cur.fetchall()
-    conn.close()
+    values, error = _check_page_args(cursor, 1, format)
+    if error:
+        return error
+    (offset,) = values
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # Only tags that are actually used by current items (not deleted), kept in memory between changes
+    tags = sorted(searcher.state().frequencies.items(), key=lambda t: (-t[1], t[0]))
+    page = tags[offset: offset + limit]
+    next_cursor = str(offset + len(page)) if offset + len(page) < len(tags) else None
+
+    if format == "json":
+        return json.dumps(
+            {
+                "total": len(tags),
+                "tags": [{"name": tag, "papers": count} for tag, count in page],
+                "next_cursor": next_cursor,
+            }
+        )
 
     if not tags:
         return "No tags found in the library."
+    if not page:
+        return f"No more tags: the library has {len(tags)}."
 
-    result = "# All Tags in Zotero Library\n\n"
-    result += f"Total unique tags: {len(tags)}\n\n"
+    lines = ["# All Tags in Zotero Library", "", f"Total unique tags: {len(tags)}"]
+    if offset or next_cursor:
+        lines.append(f"Showing tags {offset + 1}-{offset + len(page)}")
+    lines.append("")
 
     # Group by usage frequency
-    high_use = [t for t in tags if t[1] >= 5]
-    medium_use = [t for t in tags if 2 <= t[1] < 5]
-    low_use = [t for t in tags if t[1] == 1]
+    high_use = [t for t in page if t[1] >= 5]
+    medium_use = [t for t in page if 2 <= t[1] < 5]
+    low_use = [t for t in page if t[1] == 1]
 
     if high_use:
-        result += "## Frequently Used Tags (5+ papers)\n"
-        for tag, count in high_use:
-            result += f"- {tag} ({count} papers)\n"
-        result += "\n"
+        lines.append("## Frequently Used Tags (5+ papers)")
+        lines.extend(f"- {tag} ({count} papers)" for tag, count in high_use)
+        lines.append("")
 
     if medium_use:
-        result += "## Moderately Used Tags (2-4 papers)\n"
-        for tag, count in medium_use:
-            result += f"- {tag} ({count} papers)\n"
-        result += "\n"
+        lines.append("## Moderately Used Tags (2-4 papers)")
+        lines.extend(f"- {tag} ({count} papers)" for tag, count in medium_use)
+        lines.append("")
 
     if low_use:
-        result += f"## Rarely Used Tags (1 paper) - {len(low_use)} tags\n"
-        # Just show first 20 to avoid overwhelming output
-        for tag, count in low_use[:20]:
-            result += f"- {tag}\n"
-        if len(low_use) > 20:
-            result += f"... and {len(low_use) - 20} more\n"
+        rare = sum(1 for _, count in tags if count == 1)
+        lines.append(f"## Rarely Used Tags (1 paper) - {rare} tags")
+        lines.extend(f"- {tag}" for tag, _ in low_use)
+        lines.append("")
 
-    return result
+    if next_cursor:
+        lines.append(f'More tags: call again with cursor="{next_cursor}"')
+    return "\n".join(lines) + "\n"
 
 
 @mcp.tool()
-def search_by_tag(tag: str) -> str:
+def search_by_tag(tag: str, limit: int = 25, cursor: str = "", format: str = "markdown") -> str:
     """
     Find all papers with a specific tag.
 
     Args:
-        tag: The tag to search for
+        tag: The tag to search for (case-insensitive)
+        limit: Maximum number of papers to return (at most 500)
+        cursor: next_cursor from a previous reply, to get the following papers
+        format: "markdown" (default) or "json" for {"tag", "total", "papers": [{"key", "title", "abstract"}],
+            "next_cursor"}
 
     Returns:
         List of papers with the specified tag
     """
-    conn = sqlite3.connect(searcher.db_path)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        SELECT DISTINCT
-            items.key,
-            title.value as title,
-            abstract.value as abstract
-        FROM items
-        JOIN itemTags ON items.itemID = itemTags.itemID
-        JOIN tags ON itemTags.tagID = tags.tagID
-        LEFT JOIN itemData title_data ON items.itemID = title_data.itemID AND title_data.fieldID = 1
-        LEFT JOIN itemDataValues title ON title_data.valueID = title.valueID
-        LEFT JOIN itemData abstract_data ON items.itemID = abstract_data.itemID AND abstract_data.fieldID = 90
-        LEFT JOIN itemDataValues abstract ON abstract_data.valueID = abstract.valueID
-        WHERE LOWER(tags.name) = LOWER(?)
-            AND items.itemID NOT IN (SELECT itemID FROM deletedItems)
-            AND items.libraryID IS NOT NULL
-    """,
-        (tag,),
-    )
-
-    papers = cur.fetchall()
-    conn.close()
-
+    # The cursor holds the last itemID shown and the number of papers shown so far
+    values, error = _check_page_args(cursor, 2, format)
+    if error:
+        return error
+    after_item_id, shown = values
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    tags = searcher.state().tags
+    tag_ids = tags.lookup(tag)
+    papers: List[tuple] = []
+    total = 0
+    if tag_ids:
+        with searcher.pool.connection() as db:
+            papers = db.items_with_tags(tag_ids, after_item_id=after_item_id, limit=limit)
+            total = db.count_items_with_tags(tag_ids)
+    next_cursor = f"{papers[-1][0]}.{shown + len(papers)}" if papers and shown + len(papers) < total else None
+
+    if format == "json":
+        reply = {
+            "tag": tags.display_name(tag),
+            "total": total,
+            "papers": [
+                {"key": key, "title": title, "abstract": _preview(abstract)} for _, key, title, abstract in papers
+            ],
+            "next_cursor": next_cursor,
+        }
+        if not tag_ids:
+            reply["similar_tags"] = tags.suggest(tag)
+        return json.dumps(reply)
+
+    if not tag_ids:
+        result = f"No papers found with tag: '{tag}'"
+        suggestions = tags.suggest(tag)
+        if suggestions:
+            result += f"\n\nSimilar tags: {', '.join(suggestions)}"
+        return result
     if not papers:
+        if shown:
+            return f"No more papers with tag: '{tag}'"
         return f"No papers found with tag: '{tag}'"
 
-    result = f"# Papers with tag: {tag}\n\n"
-    result += f"Found {len(papers)} papers\n\n"
+    lines = [f"# Papers with tag: {tags.display_name(tag)}", "", f"Found {total} papers"]
+    if shown or next_cursor:
+        lines.append(f"Showing papers {shown + 1}-{shown + len(papers)}")
+    lines.append("")
 
-    for i, (key, title, abstract) in enumerate(papers, 1):
-        result += f"## {i}. {title or 'Untitled'}\n"
-        result += f"**Key**: {key}\n"
+    for i, (_, key, title, abstract) in enumerate(papers, shown + 1):
+        lines.append(f"## {i}. {title or 'Untitled'}")
+        lines.append(f"**Key**: {key}")
         if abstract:
-            abstract_preview = abstract[:200]
-            if len(abstract) > 200:
-                abstract_preview += "..."
-            result += f"**Abstract**: {abstract_preview}\n"
+            lines.append(f"**Abstract**: {_preview(abstract)}")
+        lines.append("")
+
+    if next_cursor:
+        lines.append(f'More papers: call again with cursor="{next_cursor}"')
+    return "\n".join(lines) + "\n"
+
+
+@mcp.tool()
+def semantic_search(
+    query: str, top_k: int = 5, tag_filter: str = "", year: int = 0, collection: str = "", mode: str = "hybrid"
+) -> str:
+    """
+    Search the full text of the papers' PDFs by meaning and by keywords.
+
+    Args:
+        query: What to look for, in natural language or as exact terms (formulas, acronyms)
+        top_k: Number of passages to return (at most 500)
+        tag_filter: Only search papers with this tag (optional)
+        year: Only search papers published in this year (optional)
+        collection: Only search papers in this collection (optional)
+        mode: "hybrid" (default), "dense" for meaning only or "keyword" for exact terms only
+
+    Returns:
+        Matching passages with the title and key of their paper
+    """
+    top_k = max(1, min(top_k, MAX_PAGE_SIZE))
+    filters = {"tag": tag_filter or None, "year": year or None, "collection": collection or None}
+    keys = None
+    if any(value is not None for value in filters.values()):
+        # Names are matched casefolded in memory, as in search_by_tag, and filtered by ID in SQL
+        state = searcher.state()
+        tag_ids = state.tags.lookup(tag_filter) if tag_filter else None
+        collection_ids = state.collections.get(collection.casefold(), []) if collection else None
+        with searcher.pool.connection() as db:
+            keys = db.attachment_keys(tag_ids=tag_ids, year=year or None, collection_ids=collection_ids)
+        if not keys:
+            described = ", ".join(f"{name}: '{value}'" for name, value in filters.items() if value is not None)
+            return f"No papers with PDFs found with {described}"
+    # Not holding a pooled connection while the query is embedded
+    try:
+        hits = searcher.rag.retrieve(query, top_k, item_keys=keys, mode=mode)
+    except ValueError as e:
+        return str(e)
+    except FileNotFoundError as e:
+        return f"Semantic search is unavailable. {e}"
+    with searcher.pool.connection() as db:
+        parents = db.attachment_parents(hit.metadata.get("item_key") for hit in hits)
+
+    if not hits:
+        return f"No passages found for: '{query}'"
+
+    result = f"# Passages matching: {query}\n\n"
+    if tag_filter:
+        result += f"Papers with tag: {tag_filter}\n"
+    if year:
+        result += f"Papers from: {year}\n"
+    if collection:
+        result += f"Papers in collection: {collection}\n"
+    if any(value is not None for value in filters.values()):
+        result += "\n"
+
+    for i, hit in enumerate(hits, 1):
+        attachment_key = hit.metadata.get("item_key")
+        key, title = parents.get(attachment_key, (attachment_key, None))
+        result += f"## {i}. {title or 'Untitled'}\n"
+        result += f"**Key**: {key}"
+        if "page" in hit.metadata:
+            result += f" (page {hit.metadata['page']})"
         result += "\n"
+        if hit.distance is not None:
+            result += f"**Distance**: {hit.distance:.3f}\n"
+        if hit.score is not None:
+            result += f"**Score**: {hit.score:.4f}\n"
+        excerpt = " ".join(hit.document.split())
+        if len(excerpt) > 300:
+            excerpt = excerpt[:300] + "..."
+        result += f"**Passage**: {excerpt}\n\n"
 
     return result
 
 
 if __name__ == "__main__":
+    # Load the embedding model while the client connects
+    threading.Thread(target=searcher.warm_rag, daemon=True).start()
+    # Refresh the connections and the tag data whenever Zotero writes
+    searcher.start_watcher()
     # Run the FastMCP server
     mcp.run()
@@ -0,0 +1,138 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set, Tuple
+
+from zoterodb import ZoteroDatabase
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Returns the character trigrams of a text, padded so that word starts and ends count.
+
+    :param text: Casefolded text.
+    :return: Set of trigrams.
+    """
+    padded = f"  {text} "
+    return {padded[i: i + 3] for i in range(len(padded) - 2)}
+
+
+class TagIndex:
+    """In-memory lookup from tag names to tagIDs, built once from the tags table.
+
+    Names are matched casefolded, so "XMCD", "xmcd" and "Xmcd" resolve to the
+    same tagIDs (Zotero keeps one tagID per spelling). Besides exact lookups it
+    answers prefix queries by bisecting the sorted names, and misspelled names
+    by trigram similarity, so the SQL that follows only compares integer keys.
+    """
+
+    def __init__(self, tag_names: Dict[int, str], fingerprint: Optional[tuple] = None):
+        """
+        :param tag_names: Dictionary with tagID as keys and tag names as values.
+        :param fingerprint: Database fingerprint the index was built at.
+        """
+        self.fingerprint = fingerprint
+        self._ids: Dict[str, List[int]] = {}
+        self._names: Dict[str, str] = {}
+        for tag_id, name in sorted(tag_names.items()):
+            key = name.casefold()
+            self._ids.setdefault(key, []).append(tag_id)
+            # Show the spelling with the lowest tagID, usually the first one created
+            self._names.setdefault(key, name)
+        self._keys = sorted(self._ids)
+
+        # trigram -> positions in _keys
+        self._trigrams: Dict[str, List[int]] = {}
+        self._trigram_counts: List[int] = []
+        for position, key in enumerate(self._keys):
+            grams = trigrams(key)
+            self._trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams.setdefault(gram, []).append(position)
+
+    @classmethod
+    def load(cls, db: ZoteroDatabase) -> "TagIndex":
+        """
+        Build the index from the tags table.
+
+        :param db: Database to read from.
+        :return: New TagIndex.
+        """
+        fingerprint = db.fingerprint()
+        return cls(dict(db.execute("SELECT tagID, name FROM tags")), fingerprint=fingerprint)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, name: str) -> bool:
+        return name.casefold() in self._ids
+
+    def lookup(self, name: str) -> List[int]:
+        """
+        Returns the tagIDs of a tag name, ignoring case.
+
+        :param name: Tag name.
+        :return: tagIDs, empty if no tag has this name.
+        """
+        return list(self._ids.get(name.casefold(), ()))
+
+    def display_name(self, name: str) -> str:
+        """
+        Returns the tag name as spelled in the library.
+
+        :param name: Tag name in any case.
+        :return: Stored spelling, or the name itself if it is unknown.
+        """
+        return self._names.get(name.casefold(), name)
+
+    def prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """
+        Returns the tag names starting with a prefix, ignoring case.
+
+        :param prefix: Start of the tag names.
+        :param limit: Maximum number of names to return.
+        :return: Tag names in alphabetical order of their casefolded form.
+        """
+        key = prefix.casefold()
+        names = []
+        for position in range(bisect_left(self._keys, key), len(self._keys)):
+            if not self._keys[position].startswith(key) or (limit is not None and len(names) >= limit):
+                break
+            names.append(self._names[self._keys[position]])
+        return names
+
+    def fuzzy(self, name: str, limit: int = 5, min_similarity: float = 0.3) -> List[Tuple[str, float]]:
+        """
+        Returns the tag names most similar to a name, by Jaccard similarity of their trigrams.
+
+        :param name: Possibly misspelled tag name.
+        :param limit: Maximum number of names to return.
+        :param min_similarity: Smallest similarity, between 0 and 1, to include.
+        :return: (tag name, similarity) tuples, most similar first.
+        """
+        grams = trigrams(name.casefold())
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for position in self._trigrams.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        matches = []
+        for position, count in shared.items():
+            similarity = count / (len(grams) + self._trigram_counts[position] - count)
+            if similarity >= min_similarity:
+                matches.append((self._keys[position], similarity))
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return [(self._names[key], similarity) for key, similarity in matches[:limit]]
+
+    def suggest(self, name: str, limit: int = 5) -> List[str]:
+        """
+        Returns tag names the user may have meant: names starting with the given name, then similar names.
+
+        :param name: Tag name without an exact match.
+        :param limit: Maximum number of names to return.
+        :return: Tag names.
+        """
+        names = self.prefix(name, limit=limit)
+        for similar, _ in self.fuzzy(name, limit=limit):
+            if len(names) >= limit:
+                break
+            if similar not in names:
+                names.append(similar)
+        return names
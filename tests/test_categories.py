@@ -0,0 +1,97 @@
+import pytest
+from categories import (
+    CategoryStreamParser,
+    chunk_tags,
+    merge_categories,
+    parse_categorized_markdown,
+    parse_structured_categories,
+    render_categorized_markdown,
+)
+
+
+class TestCategories:
+    """Test the categorized tags markdown helpers."""
+
+    def test_parse_and_render_round_trip(self):
+        """Test that rendered markdown parses back to the same categories."""
+        categories = {"AI/ML": ["python", "machine-learning"], "Data Science": ["data-science"]}
+
+        markdown = render_categorized_markdown(categories)
+
+        assert markdown == "# AI/ML\n[[python]]|[[machine-learning]]\n# Data Science\n[[data-science]]\n"
+        assert parse_categorized_markdown(markdown) == categories
+
+    def test_parse_ignores_text_before_first_header(self):
+        """Test that preamble text and blank lines are skipped."""
+        content = "Here you go:\n\n# Physics\n [[xmcd]]|[[sum rules]] \n\n[[magnetism]]\n"
+
+        assert parse_categorized_markdown(content) == {"Physics": ["xmcd", "sum rules", "magnetism"]}
+
+    def test_merge_categories(self):
+        """Test merging by normalized name, deduplicating and filtering tags."""
+        parts = [
+            {"Physics": ["xmcd", "magnetism"], "Empty": ["made-up"]},
+            {"physics ": ["magnetism", "sum rules"]},
+        ]
+
+        merged = merge_categories(parts, allowed_tags=["xmcd", "magnetism", "sum rules"])
+
+        assert merged == {"Physics": ["xmcd", "magnetism", "sum rules"]}
+
+    def test_chunk_tags(self):
+        """Test that chunks respect the token budget and cover every tag once."""
+        tags = [f"tag-{i}" for i in range(50)] + ["tag-1"]
+
+        chunks = chunk_tags(tags, max_tokens=20)
+
+        assert len(chunks) > 1
+        assert sorted(t for chunk in chunks for t in chunk) == sorted(set(tags))
+        assert chunk_tags(reversed(tags), max_tokens=20) == chunks
+
+    def test_chunk_tags_stable_boundaries(self):
+        """Test that adding a tag anywhere changes at most two chunks, so the other cached responses are reused."""
+        tags = [f"topic {i:03d}" for i in range(0, 600, 2)]
+        chunks = {tuple(chunk) for chunk in chunk_tags(tags, max_tokens=100)}
+
+        for i in range(1, 600, 2):
+            changed = {tuple(chunk) for chunk in chunk_tags(tags + [f"topic {i:03d}"], max_tokens=100)} - chunks
+            assert 1 <= len(changed) <= 2
+
+    def test_chunk_tags_oversized_tag(self):
+        """Test that a tag larger than the budget still gets its own chunk."""
+        assert chunk_tags(["x" * 400, "a"], max_tokens=5) == [["a"], ["x" * 400]]
+
+    def test_stream_parser_yields_completed_categories(self):
+        """Test that categories are returned as soon as their object is complete."""
+        content = (
+            '{"categories": [{"name": "Physics", "tags": ["xmcd", "sum rules"]}, '
+            '{"name": "Code", "tags": ["python"]}]}'
+        )
+        parser = CategoryStreamParser()
+        completed = []
+        first_seen = None
+
+        for i in range(0, len(content), 5):
+            completed.extend(parser.feed(content[i:i + 5]))
+            if completed and first_seen is None:
+                first_seen = i
+        parser.close()
+
+        assert completed == [("Physics", ["xmcd", "sum rules"]), ("Code", ["python"])]
+        assert first_seen < content.index('{"name": "Code"')
+
+    def test_stream_parser_handles_brackets_in_strings(self):
+        """Test that brackets and braces inside tag names do not confuse the parser."""
+        content = '{"categories": [{"name": "Odd {names}", "tags": ["a]b", "c}d"]}]}'
+
+        assert parse_structured_categories(content) == [("Odd {names}", ["a]b", "c}d"])]
+
+    def test_stream_parser_truncated(self):
+        """Test that a truncated response is reported."""
+        with pytest.raises(ValueError, match="ended before"):
+            parse_structured_categories('{"categories": [{"name": "Physics", "tags": ["xm')
+
+    def test_stream_parser_invalid_category(self):
+        """Test that objects not matching the schema are rejected."""
+        with pytest.raises(ValueError, match="Invalid category"):
+            parse_structured_categories('{"categories": [{"name": "Physics", "tags": "xmcd"}]}')
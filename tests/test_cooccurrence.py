@@ -0,0 +1,131 @@
+import os
+
+import numpy as np
+import pytest
+
+from cooccurrence import TagCooccurrence, cache_path
+from zoterolibrary import LibrarySnapshot
+
+TAG_NAMES = {1: "xmcd", 2: "magnetism", 3: "spin", 4: "ml"}
+
+
+def library(pairs):
+    return LibrarySnapshot(TAG_NAMES, sorted(pairs))
+
+
+def random_pairs(rng, items, tags, per_item):
+    return sorted({(item, int(tag)) for item in range(1, items + 1) for tag in rng.integers(1, tags + 1, per_item)})
+
+
+class TestTagCooccurrence:
+    """Test the sparse tag co-occurrence engine."""
+
+    @pytest.fixture
+    def cooccurrence(self):
+        # Items 1-3 carry xmcd and magnetism, item 3 also spin, item 4 only spin
+        return TagCooccurrence.from_library(library([(1, 1), (1, 2), (2, 1), (2, 2), (3, 1), (3, 2), (3, 3), (4, 3)]))
+
+    def test_counts(self, cooccurrence):
+        """Test that the matrix counts shared items and the diagonal the items per tag."""
+        assert cooccurrence.tag_ids.tolist() == [1, 2, 3]
+        assert cooccurrence.counts.toarray().tolist() == [[3, 3, 1], [3, 3, 1], [1, 1, 2]]
+        assert cooccurrence.count(1, 3) == 1
+        assert cooccurrence.count(3, 3) == 2
+        assert cooccurrence.count(1, 4) == 0
+        assert cooccurrence.item_count == 4
+
+    def test_scores(self, cooccurrence):
+        """Test the PMI and Jaccard scores of the tag pairs."""
+        jaccard = cooccurrence.scores("jaccard")
+        pmi = cooccurrence.scores("pmi")
+
+        assert jaccard[0, 1] == pytest.approx(1.0)
+        assert jaccard[0, 2] == pytest.approx(1 / 4)
+        assert pmi[0, 1] == pytest.approx(np.log(3 * 4 / (3 * 3)))
+        assert pmi[0, 2] == pytest.approx(np.log(1 * 4 / (3 * 2)))
+        assert jaccard.diagonal().tolist() == [0, 0, 0]
+        assert cooccurrence.scores("count", min_count=2).nnz == 2
+        with pytest.raises(ValueError):
+            cooccurrence.scores("cosine")
+
+    def test_neighbors(self, cooccurrence):
+        """Test the top-k neighbors of one tag and of all tags."""
+        assert cooccurrence.neighbors(1, k=1, method="jaccard") == [(2, 1.0)]
+        assert [tag for tag, _ in cooccurrence.neighbors(3, method="count")] == [1, 2]
+        assert cooccurrence.neighbors(4) == []
+        assert cooccurrence.top_neighbors(k=5, method="count", min_count=2) == {
+            1: [(2, 3.0)],
+            2: [(1, 3.0)],
+            3: [],
+        }
+
+    def test_counts_match_pairs(self):
+        """Test the sparse product against counting the tag pairs of every item one by one."""
+        rng = np.random.default_rng(0)
+        pairs = random_pairs(rng, 200, 4, 3)
+        cooccurrence = TagCooccurrence.from_library(library(pairs))
+
+        item_tags = {}
+        for item, tag in pairs:
+            item_tags.setdefault(item, set()).add(tag)
+        expected = {}
+        for tags in item_tags.values():
+            for a in tags:
+                for b in tags:
+                    expected[a, b] = expected.get((a, b), 0) + 1
+
+        assert {(a, b): cooccurrence.count(a, b) for a, b in expected} == expected
+        assert cooccurrence.counts.nnz == len(expected)
+        assert cooccurrence.item_count == len(item_tags)
+
+    def test_update_matches_recount(self):
+        """Test that incremental updates give the same counts as counting the new library from scratch."""
+        rng = np.random.default_rng(0)
+        before = random_pairs(rng, 200, 4, 3)
+        after = [(item + 20, tag) for item, tag in before if item % 7] + [(1000, 4), (1000, 1)]
+        cooccurrence = TagCooccurrence.from_library(library(before))
+
+        changed = cooccurrence.update(library(after))
+        expected = TagCooccurrence.from_library(library(after))
+
+        assert changed > 0
+        assert cooccurrence.tag_ids.tolist() == expected.tag_ids.tolist()
+        assert (cooccurrence.counts != expected.counts).nnz == 0
+        assert (cooccurrence.incidence != expected.incidence).nnz == 0
+        assert cooccurrence.update(library(after)) == 0
+
+    def test_update_drops_unused_tags(self, cooccurrence):
+        """Test that tags no longer assigned to any item disappear."""
+        assert cooccurrence.update(library([(1, 1), (1, 4)])) == 4
+
+        assert cooccurrence.tag_ids.tolist() == [1, 4]
+        assert cooccurrence.counts.toarray().tolist() == [[1, 1], [1, 1]]
+
+    def test_save_and_load(self, cooccurrence, tmp_path):
+        """Test the .npz round trip with the database fingerprint."""
+        path = str(tmp_path / "cache" / "cooccurrence.npz")
+        cooccurrence.save(path, (123, 4096, 0, 0))
+        loaded, fingerprint = TagCooccurrence.load(path)
+
+        assert fingerprint == (123, 4096, 0, 0)
+        assert loaded.tag_ids.tolist() == cooccurrence.tag_ids.tolist()
+        assert loaded.item_ids.tolist() == cooccurrence.item_ids.tolist()
+        assert (loaded.counts != cooccurrence.counts).nnz == 0
+        assert (loaded.incidence != cooccurrence.incidence).nnz == 0
+        assert os.listdir(tmp_path / "cache") == ["cooccurrence.npz"]
+
+    def test_cache_path_per_database(self, tmp_path):
+        """Test that every database gets its own cache file in the cache directory."""
+        first = cache_path(str(tmp_path / "a" / "zotero.sqlite"), str(tmp_path))
+        second = cache_path(str(tmp_path / "b" / "zotero.sqlite"), str(tmp_path))
+
+        assert first != second
+        assert os.path.dirname(first) == str(tmp_path)
+        assert first.endswith(".npz")
+
+    def test_empty_library(self):
+        """Test that a library without tags gives an empty matrix."""
+        cooccurrence = TagCooccurrence.from_library(LibrarySnapshot({}, []))
+
+        assert cooccurrence.counts.shape == (0, 0)
+        assert cooccurrence.top_neighbors() == {}
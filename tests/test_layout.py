@@ -0,0 +1,141 @@
+import os
+import numpy as np
+from unittest.mock import patch
+from layout import ForceLayout, build_category_graph
+
+
+class TestBuildCategoryGraph:
+    """Test the category/tag graph construction."""
+
+    def test_shared_tag_nodes(self):
+        """Test that a tag in several categories becomes one node with several edges."""
+        categories = {"Physics": ["xmcd", "magnetism", "xmcd"], "Code": ["python", "magnetism"]}
+
+        category_names, tag_names, edges = build_category_graph(categories)
+
+        assert category_names == ["Physics", "Code"]
+        assert tag_names == ["xmcd", "magnetism", "python"]
+        assert edges == [(0, 2), (0, 3), (1, 4), (1, 3)]
+
+
+class TestForceLayout:
+    """Test the ForceLayout engine."""
+
+    @staticmethod
+    def star_graph(n_categories, n_tags, seed=0):
+        rng = np.random.default_rng(seed)
+        edges = [(int(rng.integers(n_categories)), n_categories + t) for t in range(n_tags)]
+        return n_categories + n_tags, edges
+
+    def test_deterministic(self):
+        """Test that the same seed gives the same layout."""
+        n, edges = self.star_graph(3, 30)
+
+        first = ForceLayout(seed=1).layout(n, edges)
+        second = ForceLayout(seed=1).layout(n, edges)
+
+        assert first.shape == (n, 2)
+        np.testing.assert_array_equal(first, second)
+
+    def test_spreads_nodes(self):
+        """Test that nodes starting on the same spot are pulled apart."""
+        n, edges = self.star_graph(2, 40)
+
+        positions = ForceLayout().layout(n, edges, initial=np.zeros((n, 2)))
+
+        distances = np.hypot(*(positions[:, None, :] - positions[None, :, :]).transpose(2, 0, 1))
+        np.fill_diagonal(distances, np.inf)
+        assert distances.min() > 0.01
+
+    def test_linked_nodes_are_closer(self):
+        """Test that tags end up nearer to their own category than to others."""
+        n, edges = self.star_graph(4, 80)
+
+        positions = ForceLayout().layout(n, edges)
+
+        own = [np.hypot(*(positions[c] - positions[t])) for c, t in edges]
+        other = [np.hypot(*(positions[(c + 2) % 4] - positions[t])) for c, t in edges]
+        assert np.mean(own) < np.mean(other)
+
+    def test_grid_approximation(self):
+        """Test that large graphs use the grid approximation and stay finite."""
+        n, edges = self.star_graph(10, 1500)
+        engine = ForceLayout(iterations=20, exact_threshold=100)
+
+        with patch.object(ForceLayout, "_repulsion_exact", wraps=ForceLayout._repulsion_exact) as exact:
+            positions = engine.layout(n, edges)
+
+        exact.assert_not_called()
+        assert np.isfinite(positions).all()
+        assert len(np.unique(positions.round(6), axis=0)) == n
+
+    def test_grid_matches_exact_for_far_nodes(self):
+        """Test that grid repulsion approximates the exact result."""
+        pos = np.random.default_rng(0).uniform(-1, 1, size=(400, 2))
+
+        exact = ForceLayout._repulsion_exact(pos, 0.1)
+        grid = ForceLayout._repulsion_grid(pos, 0.1, nodes_per_cell=10)
+
+        error = np.hypot(*(grid - exact).T) / np.maximum(np.hypot(*exact.T), 1e-9)
+        assert np.median(error) < 0.05
+
+    def test_memory_cache(self):
+        """Test that an unchanged graph is not simulated again."""
+        n, edges = self.star_graph(3, 30)
+        engine = ForceLayout()
+        first = engine.layout(n, edges)
+
+        with patch.object(engine, "_simulate") as simulate:
+            second = engine.layout(n, edges)
+            engine.layout(n, edges + [(0, n - 1)])
+
+        np.testing.assert_array_equal(first, second)
+        simulate.assert_called_once()
+
+    def test_disk_cache(self, tmp_path):
+        """Test that layouts persist across engine instances."""
+        n, edges = self.star_graph(3, 30)
+        first = ForceLayout(cache_dir=str(tmp_path)).layout(n, edges)
+
+        engine = ForceLayout(cache_dir=str(tmp_path))
+        with patch.object(engine, "_simulate") as simulate:
+            second = engine.layout(n, edges)
+
+        simulate.assert_not_called()
+        np.testing.assert_array_equal(first, second)
+
+    def test_memory_cache_bounded(self):
+        """Test that only the max_cached most recently used layouts stay in memory."""
+        engine = ForceLayout(iterations=5, max_cached=2)
+        graphs = [self.star_graph(2, size) for size in (10, 11, 12)]
+        for n, edges in (graphs[0], graphs[1], graphs[0], graphs[2]):
+            engine.layout(n, edges)
+
+        with patch.object(engine, "_simulate", wraps=engine._simulate) as simulate:
+            engine.layout(*graphs[0])
+            engine.layout(*graphs[2])
+            simulate.assert_not_called()
+            engine.layout(*graphs[1])
+            simulate.assert_called_once()
+        assert len(engine._cache) == 2
+
+    def test_disk_cache_pruned(self, tmp_path):
+        """Test that cache_dir keeps only the max_cache_files most recently used layouts."""
+        engine = ForceLayout(iterations=5, cache_dir=str(tmp_path), max_cache_files=2)
+        graphs = [self.star_graph(2, size) for size in (10, 11, 12)]
+        seen = set()
+        for i, (n, edges) in enumerate(graphs):
+            engine.layout(n, edges)
+            # Distinct mtimes, oldest first, whatever the file system's timestamp resolution
+            for path in set(tmp_path.glob("layout_*.npy")) - seen:
+                os.utime(path, ns=(i + 1, i + 1))
+                seen.add(path)
+
+        assert len(list(tmp_path.glob("layout_*.npy"))) == 2
+        reopened = ForceLayout(iterations=5, cache_dir=str(tmp_path))
+        with patch.object(reopened, "_simulate", wraps=reopened._simulate) as simulate:
+            reopened.layout(*graphs[1])
+            reopened.layout(*graphs[2])
+            simulate.assert_not_called()
+            reopened.layout(*graphs[0])
+            simulate.assert_called_once()
@@ -0,0 +1,70 @@
+import pytest
+import time
+from unittest.mock import patch
+from llmcache import ResponseCache
+
+
+class TestResponseCache:
+    """Test the ResponseCache disk cache."""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+        yield cache
+        cache.close()
+
+    def test_key_ignores_tag_order(self):
+        """Test that the key hashes the tag set, not its order."""
+        key = ResponseCache.key("model", "template {items}", 0.5, ["b", "a"])
+
+        assert key == ResponseCache.key("model", "template {items}", 0.5, ["a", "b"])
+        assert key != ResponseCache.key("other-model", "template {items}", 0.5, ["a", "b"])
+        assert key != ResponseCache.key("model", "other {items}", 0.5, ["a", "b"])
+        assert key != ResponseCache.key("model", "template {items}", 0.7, ["a", "b"])
+        assert key != ResponseCache.key("model", "template {items}", 0.5, ["a", "b", "c"])
+        assert key != ResponseCache.key("model", "template {items}", 0.5, ["a", "b"], max_categories=3)
+
+    def test_get_and_set(self, cache):
+        """Test storing and reading back a response."""
+        assert cache.get("key") is None
+
+        cache.set("key", "# Physics\n[[xmcd]]")
+
+        assert cache.get("key") == "# Physics\n[[xmcd]]"
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test that responses survive reopening the cache file."""
+        path = str(tmp_path / "cache.sqlite")
+        cache = ResponseCache(path)
+        cache.set("key", "value")
+        cache.close()
+
+        cache = ResponseCache(path)
+        assert cache.get("key") == "value"
+        cache.close()
+
+    def test_ttl_expiry(self, tmp_path):
+        """Test that expired entries are not returned."""
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+        cache.set("key", "value")
+
+        with patch("llmcache.time.time", return_value=time.time() + 120):
+            assert cache.get("key") is None
+        assert len(cache) == 0
+        cache.close()
+
+    def test_size_eviction(self, tmp_path):
+        """Test that the least recently used entries are evicted beyond max_entries."""
+        cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+        now = time.time()
+        with patch("llmcache.time.time", side_effect=[now, now + 1, now + 2, now + 3]):
+            cache.set("a", "1")
+            cache.set("b", "2")
+            cache.get("a")
+            cache.set("c", "3")
+
+        assert len(cache) == 2
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.get("c") == "3"
+        cache.close()
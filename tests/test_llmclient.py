@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+import threading
+import time
+import openai
+from llmclient import AsyncLLMClient, TokenBucket
+from tests.fake_openai import FakeOpenAIServer
+
+
+def make_client(server, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return AsyncLLMClient("test-api-key", server.base_url, "test-model", **kwargs)
+
+
+class TestAsyncLLMClient:
+    """Test the AsyncLLMClient against a local OpenAI-compatible server."""
+
+    def test_run_keeps_prompt_order(self):
+        """Test that replies come back in prompt order."""
+        with FakeOpenAIServer(lambda r: FakeOpenAIServer.prompt(r).upper()) as server:
+            replies = make_client(server).run(["a", "b", "c"])
+
+        assert replies == ["A", "B", "C"]
+        assert all(r["temperature"] == 0.5 for r in server.requests)
+
+    def test_run_twice(self):
+        """Test that the client can be reused across event loops."""
+        with FakeOpenAIServer(lambda r: "ok") as server:
+            client = make_client(server)
+            assert client.run(["a"]) == ["ok"]
+            assert client.run(["b"]) == ["ok"]
+
+    def test_retries_rate_limit_and_server_errors(self):
+        """Test backoff and retry on 429 and 5xx responses."""
+        replies = [
+            (429, {"error": {"message": "slow down", "type": "rate_limit"}}),
+            (503, {"error": {"message": "overloaded", "type": "server_error"}}),
+            "done",
+        ]
+
+        with FakeOpenAIServer(lambda r: replies.pop(0)) as server:
+            assert make_client(server).run(["a"]) == ["done"]
+
+        assert len(server.requests) == 3
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the error surfaces once the retries are used up."""
+        error = (429, {"error": {"message": "slow down", "type": "rate_limit"}})
+
+        with FakeOpenAIServer(lambda r: error) as server:
+            with pytest.raises(openai.RateLimitError):
+                make_client(server, max_retries=2).run(["a"])
+
+        assert len(server.requests) == 3
+
+    def test_does_not_retry_client_errors(self):
+        """Test that 4xx errors other than 429 are raised immediately."""
+        error = (400, {"error": {"message": "bad request", "type": "invalid_request"}})
+
+        with FakeOpenAIServer(lambda r: error) as server:
+            with pytest.raises(openai.BadRequestError):
+                make_client(server).run(["a"])
+
+        assert len(server.requests) == 1
+
+    def test_failure_waits_for_other_replies(self):
+        """Test that a failing prompt is raised only after the other replies arrived and were reported."""
+        error = (400, {"error": {"message": "bad request", "type": "invalid_request"}})
+
+        def responder(request):
+            prompt = FakeOpenAIServer.prompt(request)
+            if prompt == "bad":
+                return error
+            time.sleep(0.1)
+            return prompt.upper()
+
+        replies = {}
+        with FakeOpenAIServer(responder) as server:
+            with pytest.raises(openai.BadRequestError):
+                make_client(server).run(["a", "bad", "c"], on_reply=replies.__setitem__)
+
+        assert replies == {0: "A", 2: "C"}
+
+    def test_concurrency_limit(self):
+        """Test that no more than max_concurrency requests are in flight."""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def responder(request):
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            return "ok"
+
+        with FakeOpenAIServer(responder) as server:
+            make_client(server, max_concurrency=2).run([str(i) for i in range(6)])
+
+        assert state["peak"] == 2
+
+
+class TestTokenBucket:
+    """Test the TokenBucket rate limiter."""
+
+    def test_rate(self):
+        """Test that acquisitions beyond the burst are spread out at the configured rate."""
+
+        async def take(n):
+            bucket = TokenBucket(rate=20, capacity=1)
+            for _ in range(n):
+                await bucket.acquire()
+
+        start = time.monotonic()
+        asyncio.run(take(5))
+
+        assert time.monotonic() - start >= 4 / 20 * 0.9
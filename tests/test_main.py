@@ -75,6 +75,8 @@ class TestCreateAnalyzer:
         assert analyzer.api_key == "test-api-key"
         assert analyzer.base_url == "https://api.test.com"
         assert analyzer.model == "test-model"
+        assert analyzer.cache is None
+        assert analyzer.db.snapshot
 
 
 class TestRunAnalysis:
@@ -88,9 +90,11 @@ class TestRunAnalysis:
 
         # Verify all expected methods were called
         mock_analyzer.categorize_tags.assert_called_once_with(
-            save=True, for_obsidian_mardown=True
+            save=True, for_obsidian_mardown=True, incremental=False
         )
         mock_analyzer.create_word_cloud.assert_called_once_with(
+            save_path="wordcloud.png",
+            show=False,
             width=800,
             height=400,
             max_words=100,
@@ -99,6 +103,25 @@ class TestRunAnalysis:
         )
         mock_analyzer.unique_tags.assert_called_once_with(save=True)
 
+    @patch("main.ZoteroVisualizer")
+    def test_run_analysis_saves_word_cloud(self, mock_visualizer):
+        """Test that the word cloud is saved without opening a window by default."""
+        mock_analyzer = MagicMock()
+
+        run_analysis(mock_analyzer)
+        run_analysis(mock_analyzer, show_wordcloud=True)
+
+        first, second = mock_analyzer.create_word_cloud.call_args_list
+        assert (first[1]["save_path"], first[1]["show"]) == ("wordcloud.png", False)
+        assert second[1]["show"] is True
+
+    @patch("main.ZoteroVisualizer")
+    def test_run_analysis_caches_layouts(self, mock_visualizer):
+        """Test that the network layouts are kept on disk between runs."""
+        run_analysis(MagicMock(), compact_html=True)
+
+        assert mock_visualizer.call_args[1]["layout_engine"].cache_dir == ".layout_cache"
+
 
 class TestMain:
     """Test the main function."""
@@ -120,7 +143,65 @@ class TestMain:
 
         mock_load_config.assert_called_once()
         mock_create_analyzer.assert_called_once_with(mock_config)
-        mock_run_analysis.assert_called_once_with(mock_analyzer)
+        mock_run_analysis.assert_called_once_with(
+            mock_analyzer, incremental=False, compact_html=False, show_wordcloud=False
+        )
+        mock_analyzer.close.assert_called_once()
+
+    @patch("main.load_config")
+    @patch("main.create_analyzer")
+    @patch("main.run_analysis")
+    def test_main_no_cache(
+        self, mock_run_analysis, mock_create_analyzer, mock_load_config
+    ):
+        """Test that --no-cache disables the response cache."""
+        mock_load_config.return_value = {"LLM_CACHE_PATH": ".llm_cache.sqlite"}
+
+        main(["--no-cache"])
+
+        config = mock_create_analyzer.call_args[0][0]
+        assert config["LLM_CACHE_PATH"] is None
+
+    @patch("main.load_config")
+    @patch("main.create_analyzer")
+    @patch("main.run_analysis")
+    def test_main_incremental(
+        self, mock_run_analysis, mock_create_analyzer, mock_load_config
+    ):
+        """Test that --incremental is passed on to the analysis."""
+        mock_load_config.return_value = {}
+
+        main(["--incremental"])
+
+        mock_run_analysis.assert_called_once_with(
+            mock_create_analyzer.return_value, incremental=True, compact_html=False, show_wordcloud=False
+        )
+
+    @patch("main.load_config")
+    @patch("main.create_analyzer")
+    @patch("main.run_analysis")
+    def test_main_compact_html(
+        self, mock_run_analysis, mock_create_analyzer, mock_load_config
+    ):
+        """Test that --compact-html is passed on to the analysis."""
+        mock_load_config.return_value = {}
+
+        main(["--compact-html"])
+
+        assert mock_run_analysis.call_args[1]["compact_html"] is True
+
+    @patch("main.load_config")
+    @patch("main.create_analyzer")
+    @patch("main.run_analysis")
+    def test_main_show_wordcloud(
+        self, mock_run_analysis, mock_create_analyzer, mock_load_config
+    ):
+        """Test that the word cloud is only displayed with --show-wordcloud."""
+        mock_load_config.return_value = {}
+
+        main(["--show-wordcloud"])
+
+        assert mock_run_analysis.call_args[1]["show_wordcloud"] is True
 
     @patch("main.load_config")
     def test_main_config_error(self, mock_load_config):
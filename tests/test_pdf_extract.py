@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from pdf_extract import ParallelExtractor  # noqa: E402
+
+
+def fake_extract(path):
+    """Stand-in for extract_pages, steered by the file name."""
+    name = os.path.basename(path)
+    if name.startswith("hang"):
+        time.sleep(60)
+    if name.startswith("crash"):
+        os._exit(3)
+    if name.startswith("broken"):
+        raise ValueError("not a PDF")
+    return [f"{name} page 1", ""]
+
+
+class TestParallelExtractor:
+    """Test the parallel PDF extraction stage."""
+
+    def test_failures_are_isolated(self):
+        """Test that hanging, crashing and broken files fail alone and the workers are replaced."""
+        paths = ["a.pdf", "hang.pdf", "crash.pdf", "broken.pdf", "b.pdf", "c.pdf"]
+        progress = []
+        extractor = ParallelExtractor(
+            workers=2,
+            timeout=2.0,
+            extract=fake_extract,
+            on_progress=lambda result, stats: progress.append(stats.files),
+        )
+
+        results = {result.path: result for result in extractor.imap(paths)}
+
+        assert set(results) == set(paths)
+        for name in ("a.pdf", "b.pdf", "c.pdf"):
+            assert results[name].pages == [f"{name} page 1", ""]
+            assert results[name].error is None
+        assert results["hang.pdf"].error.startswith("timed out")
+        assert results["crash.pdf"].error == "worker crashed (exit code 3)"
+        assert results["broken.pdf"].error == "ValueError: not a PDF"
+        assert results["hang.pdf"].transient and results["crash.pdf"].transient
+        assert not results["broken.pdf"].transient
+        assert progress == [1, 2, 3, 4, 5, 6]
+        assert extractor.stats.failed == 3 and extractor.stats.pages == 6
+
+    def test_consumer_stops_early(self):
+        """Test that closing the iterator early shuts the workers down."""
+        extractor = ParallelExtractor(workers=2, max_pending=1, extract=fake_extract)
+
+        results = extractor.imap(f"{i}.pdf" for i in range(100))
+        first = next(results)
+        results.close()
+
+        assert first.error is None
+        assert extractor.stats.files == 1
+
+    def test_invalid_pdf(self, tmp_path):
+        """Test that a file pdfplumber cannot open is reported as failed."""
+        path = tmp_path / "broken.pdf"
+        path.write_bytes(b"not a pdf")
+
+        results = list(ParallelExtractor(workers=1).imap([str(path)]))
+
+        assert results[0].pages == [] and results[0].error is not None
@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from rag_chunk import TextChunker, estimate_tokens  # noqa: E402
+
+SENTENCE = "The XMCD sum rules relate spin and orbital moments to edge intensities."
+
+
+def page(number, body):
+    return f"Phys. Rev. B 99, {number}00 (2019)\n{body}\n{number}"
+
+
+class TestTextChunker:
+    """Test the token-aware chunker."""
+
+    def test_chunks_fit_and_overlap(self):
+        """Test that chunks stay within the window, end at sentences and overlap."""
+        chunker = TextChunker(max_tokens=40, overlap=15)
+        text = " ".join([SENTENCE] * 10)
+
+        chunks = chunker.chunk_text(text)
+
+        assert len(chunks) > 1
+        for offset, chunk in chunks:
+            assert estimate_tokens(chunk) <= 40
+            assert chunk.endswith(".")
+            assert text[offset: offset + len(chunk)] == chunk
+        # Every chunk after the first starts with the last sentence of the previous one
+        assert chunks[1][0] < chunks[0][0] + len(chunks[0][1])
+
+    def test_long_sentence_is_cut_between_words(self):
+        """Test that a sentence longer than the window is split."""
+        chunks = TextChunker(max_tokens=10, overlap=2).chunk_text("word " * 25)
+
+        assert [estimate_tokens(chunk) for _, chunk in chunks] == [10, 10, 5]
+
+    def test_paragraph_ends_close_full_chunks(self):
+        """Test that a chunk more than half full ends at its paragraph."""
+        chunks = TextChunker(max_tokens=50, overlap=10).chunk_text(f"{SENTENCE} {SENTENCE}\n\n{SENTENCE}")
+
+        assert [chunk for _, chunk in chunks] == [f"{SENTENCE} {SENTENCE}", SENTENCE]
+
+    def test_headers_footers_and_hyphens(self):
+        """Test that running headers and page numbers are dropped and hyphenated words rejoined."""
+        words = ["spin", "orbit", "charge", "lattice"]
+        pages = [page(n, f"{word.title()} intro-\nduction.\nMore on {word}.") for n, word in enumerate(words, 1)] + [""]
+        chunks = TextChunker().chunk_pages(pages, "ABCD1234")
+
+        assert [chunk.id for chunk in chunks] == [f"ABCD1234_p{n}_c0" for n in range(1, 5)]
+        assert chunks[0].text == "Spin introduction. More on spin."
+        assert chunks[3].page == 4 and chunks[3].offset == 0
+
+    def test_invalid_overlap(self):
+        """Test that the overlap must be smaller than the window."""
+        with pytest.raises(ValueError):
+            TextChunker(max_tokens=10, overlap=10)
@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from rag_embed import EmbeddingBatcher  # noqa: E402
+
+
+class FakeModel:
+    """SentenceTransformer stand-in embedding a text as (length, 1, 0)."""
+
+    class device:
+        type = "cuda"
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.calls.append(len(texts))
+        return np.array([[len(text), 1.0, 0.0] for text in texts])
+
+
+class TestEmbeddingBatcher:
+    """Test cross-document embedding batches."""
+
+    @staticmethod
+    def chunks(doc, n):
+        ids = [f"{doc}_{i}" for i in range(n)]
+        return ids, ["x" * (i + 1) for i in range(n)], [{"path": doc} for _ in range(n)]
+
+    def test_batches_span_documents(self):
+        """Test that small documents are encoded together in full batches."""
+        model = FakeModel()
+        batcher = EmbeddingBatcher(batch_size=4, model=model)
+
+        batches = batcher.add(*self.chunks("a", 3))
+        assert batches == []
+        batches = batcher.add(*self.chunks("b", 3))
+        batches += batcher.flush()
+
+        assert model.calls == [4, 2]
+        assert batches[0].ids == ["a_0", "a_1", "a_2", "b_0"]
+        assert batches[1].metadatas == [{"path": "b"}, {"path": "b"}]
+        assert batcher.chunks == 6
+        assert batcher.flush() == []
+
+    def test_normalize(self):
+        """Test unit-length float32 output."""
+        batcher = EmbeddingBatcher(batch_size=2, normalize=True, model=FakeModel())
+
+        (batch,) = batcher.add(*self.chunks("a", 2))
+
+        assert batch.embeddings.dtype == np.float32
+        np.testing.assert_allclose(np.linalg.norm(batch.embeddings, axis=1), 1.0, rtol=1e-6)
+
+    def test_multi_process_pool_on_cpu(self):
+        """Test that CPU encoding goes through one reused multi-process pool."""
+        model = FakeModel()
+        model.device = type("device", (), {"type": "cpu"})
+        model.start_multi_process_pool = lambda target_devices: {"devices": target_devices}
+        model.encode_multi_process = lambda texts, pool, batch_size: model.encode(texts)
+        stopped = []
+        model.stop_multi_process_pool = stopped.append
+        batcher = EmbeddingBatcher(batch_size=2, processes=3, model=model)
+
+        batcher.encode(["a", "b"])
+        batcher.encode(["c"])
+        batcher.close()
+
+        assert stopped == [{"devices": ["cpu", "cpu", "cpu"]}]
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from rag_fts import ChunkTextIndex, fts_query  # noqa: E402
+
+
+class TestChunkTextIndex:
+    """Test the FTS5 keyword index of the RAG chunks."""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        index = ChunkTextIndex(str(tmp_path / "fts.sqlite"))
+        index.add(
+            ["A_p1_c0", "A_p2_c0", "B_p1_c0"],
+            ["Fe3O4 films on MgO.", "XMCD of Fe3O4 and Fe3O4.", "Spin-orbit coupling in NiO."],
+            [
+                {"path": "a.pdf", "item_key": "A", "page": 1},
+                {"path": "a.pdf", "item_key": "A", "page": 2},
+                {"path": "b.pdf", "item_key": "B", "page": 1},
+            ],
+        )
+        yield index
+        index.close()
+
+    def test_fts_query(self):
+        """Test that terms are quoted, deduplicated and joined with OR."""
+        assert fts_query('Fe3O4 "AND" fe3o4* (NiO)') == '"Fe3O4" OR "AND" OR "fe3o4" OR "NiO"'
+        assert fts_query("?!") == ""
+
+    def test_search_ranks_by_bm25(self, index):
+        """Test that exact terms are found case-insensitively, the best BM25 match first."""
+        hits = index.search("fe3o4")
+
+        assert [hit.id for hit in hits] == ["A_p2_c0", "A_p1_c0"]
+        assert hits[0].metadata == {"path": "a.pdf", "item_key": "A", "page": 2}
+        assert hits[0].score <= hits[1].score
+        assert index.search("?!") == []
+
+    def test_search_filters_item_keys(self, index):
+        """Test restricting a search to some attachments."""
+        assert [hit.id for hit in index.search("Fe3O4 NiO", item_keys=["B"])] == ["B_p1_c0"]
+        assert index.search("Fe3O4", item_keys=[]) == []
+
+    def test_replace_and_delete(self, index):
+        """Test that adding an existing ID replaces it and deleting a path removes its chunks."""
+        index.add(["B_p1_c0"], ["Magnons in NiO."], [{"path": "b.pdf", "item_key": "B"}])
+
+        assert [hit.document for hit in index.search("magnons spin")] == ["Magnons in NiO."]
+        assert len(index) == 3
+
+        index.delete_path("a.pdf")
+
+        assert len(index) == 1
+        assert index.search("Fe3O4") == []
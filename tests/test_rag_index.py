@@ -0,0 +1,325 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+from rag_index import RagIndex, open_collection  # noqa: E402
+from rag_fts import ChunkTextIndex  # noqa: E402
+from rag_search import RagSearcher, reciprocal_rank_fusion  # noqa: E402
+
+
+def fake_extract(path):
+    """Stand-in for extract_pages: the file content is the text of its only page."""
+    return [Path(path).read_text()]
+
+
+def failing_extract(path):
+    """Stand-in for extract_pages that fails on files containing "corrupt"."""
+    text = Path(path).read_text()
+    if "corrupt" in text:
+        raise ValueError("cannot parse PDF")
+    return [text]
+
+
+def crashing_extract(path):
+    """Stand-in for extract_pages that kills its worker on files containing "crash"."""
+    text = Path(path).read_text()
+    if "crash" in text:
+        os._exit(3)
+    return [text]
+
+
+class FakeModel:
+    """SentenceTransformer stand-in with a whitespace tokenizer."""
+
+    class device:
+        type = "cuda"
+
+    class tokenizer:
+        @staticmethod
+        def tokenize(text):
+            return text.split()
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.encoded.extend(texts)
+        return np.array([[len(text), 1.0] for text in texts])
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection."""
+
+    def __init__(self):
+        self.chunks = {}
+
+    def upsert(self, embeddings, documents, metadatas, ids):
+        for id_, document, metadata in zip(ids, documents, metadatas):
+            self.chunks[id_] = (document, metadata)
+
+    def delete(self, ids=None, where=None):
+        if ids is not None:
+            self.chunks = {k: v for k, v in self.chunks.items() if k not in ids}
+            return
+        ((key, value),) = where.items()
+        self.chunks = {k: v for k, v in self.chunks.items() if v[1].get(key) != value}
+
+    def get(self, include=None, limit=None, offset=0):
+        ids = sorted(self.chunks)[offset: offset + limit if limit is not None else None]
+        return {
+            "ids": ids,
+            "documents": [self.chunks[id_][0] for id_ in ids],
+            "metadatas": [self.chunks[id_][1] for id_ in ids],
+        }
+
+    def query(self, query_embeddings, n_results, where=None, include=None):
+        ids = sorted(self.chunks)
+        if where:
+            ((key, condition),) = where.items()
+            ids = [id_ for id_ in ids if self.chunks[id_][1].get(key) in condition["$in"]]
+        ids = ids[:n_results]
+        return {
+            "ids": [ids],
+            "documents": [[self.chunks[id_][0] for id_ in ids]],
+            "metadatas": [[self.chunks[id_][1] for id_ in ids]],
+            "distances": [[float(i) for i in range(len(ids))]],
+        }
+
+
+class TestRagIndex:
+    """Test the incremental RAG indexing pipeline."""
+
+    @pytest.fixture
+    def storage(self, tmp_path):
+        for key, text in (("AAAA1111", "Spin moments."), ("BBBB2222", "Orbital moments.")):
+            (tmp_path / "storage" / key).mkdir(parents=True)
+            (tmp_path / "storage" / key / "paper.pdf").write_text(text)
+        return tmp_path / "storage"
+
+    def make_index(self, storage, collection):
+        index = RagIndex(
+            str(storage),
+            manifest_path=str(storage.parent / "manifest.sqlite"),
+            fts_path=str(storage.parent / "fts.sqlite"),
+            extract_workers=1,
+            extract=fake_extract,
+        )
+        index.batcher._model = FakeModel()
+        index._collection = collection
+        return index
+
+    def test_update_indexes_only_changes(self, storage):
+        """Test that a second run skips unchanged PDFs and replaces or purges the others."""
+        collection = FakeCollection()
+        stats = self.make_index(storage, collection).update()
+
+        assert stats.files == 2
+        path = str(storage / "AAAA1111" / "paper.pdf")
+        metadata = {"path": path, "item_key": "AAAA1111", "page": 1, "offset": 0, "chunk": 0}
+        assert collection.chunks["AAAA1111_p1_c0"] == ("Spin moments.", metadata)
+
+        (storage / "AAAA1111" / "paper.pdf").write_text("Spin and orbital moments.")
+        (storage / "BBBB2222" / "paper.pdf").unlink()
+        stats = self.make_index(storage, collection).update()
+
+        assert stats.files == 1
+        assert {id_: chunk[0] for id_, chunk in collection.chunks.items()} == {
+            "AAAA1111_p1_c0": "Spin and orbital moments."
+        }
+        fts = ChunkTextIndex(str(storage.parent / "fts.sqlite"))
+        assert [hit.id for hit in fts.search("orbital")] == ["AAAA1111_p1_c0"]
+        fts.close()
+
+    def test_update_purges_changed_file_that_fails(self, storage):
+        """Test that the old chunks of a changed PDF are deleted even if it no longer extracts."""
+        collection = FakeCollection()
+        self.make_index(storage, collection).update()
+
+        (storage / "AAAA1111" / "paper.pdf").write_text("corrupt")
+        index = self.make_index(storage, collection)
+        index.extract = failing_extract
+        index.update()
+
+        assert sorted(collection.chunks) == ["BBBB2222_p1_c0"]
+        fts = ChunkTextIndex(str(storage.parent / "fts.sqlite"))
+        assert fts.search("spin") == []
+        fts.close()
+
+    def test_update_retries_crashed_files(self, storage):
+        """Test that files whose worker crashed are not recorded, so the next run extracts them again."""
+        (storage / "BBBB2222" / "paper.pdf").write_text("crash")
+        index = self.make_index(storage, FakeCollection())
+        index.extract = crashing_extract
+        stats = index.update()
+
+        assert stats.files == 2 and stats.failed == 1
+        assert self.make_index(storage, FakeCollection()).update().files == 1
+
+    def test_update_purges_other_index_versions(self, storage):
+        """Test that entries of an older layout, or of other chunk sizes, are replaced rather than kept alongside."""
+        collection = FakeCollection()
+        # Page-level entry without path metadata, as stored before chunking
+        collection.upsert(None, ["Spin moments."], [{}], ["paper.pdf_page_0"])
+        index = self.make_index(storage, collection)
+        stats = index.update()
+
+        assert stats.files == 2
+        assert sorted(collection.chunks) == ["AAAA1111_p1_c0", "BBBB2222_p1_c0"]
+        assert self.make_index(storage, collection).update().files == 0
+
+        index = self.make_index(storage, collection)
+        index.chunk_tokens = 120
+        assert index.update().files == 2
+        index.batcher.normalize = True
+        assert index.update().files == 2
+        assert sorted(collection.chunks) == ["AAAA1111_p1_c0", "BBBB2222_p1_c0"]
+        assert len(ChunkTextIndex(str(storage.parent / "fts.sqlite"))) == 2
+
+    def test_rebuild_fts(self, storage):
+        """Test copying the chunks stored in Chroma into an empty keyword index."""
+        collection = FakeCollection()
+        collection.upsert(None, ["Spin.", "Orbit."], [{"path": "a"}, {"path": "b"}], ["A_p1_c0", "B_p1_c0"])
+        index = self.make_index(storage, collection)
+
+        assert index.rebuild_fts(page_size=1) == 2
+        assert index._fts is None
+        assert len(index.fts) == 2
+
+    def test_rebuild_fts_without_keyword_index(self, storage):
+        """Test that rebuilding fails clearly when no keyword index is configured."""
+        index = self.make_index(storage, FakeCollection())
+        index.fts_path = None
+
+        with pytest.raises(ValueError, match="fts_path is not set"):
+            index.rebuild_fts()
+
+    def test_open_missing_collection(self, tmp_path):
+        """Test that opening an index that was never built fails clearly, without creating a database."""
+        with pytest.raises(FileNotFoundError, match="build it with rag_index.py"):
+            open_collection(str(tmp_path / "chromadb_data"), create=False)
+        assert not (tmp_path / "chromadb_data").exists()
+
+    def test_query(self, storage):
+        """Test querying the index."""
+        collection = FakeCollection()
+        index = self.make_index(storage, collection)
+        index.add_pdf(str(storage / "AAAA1111" / "paper.pdf"), ["Spin moments."])
+
+        assert index.query("spin", top_k=1) == ["Spin moments."]
+
+
+class TestRagSearcher:
+    """Test the warm search service."""
+
+    def test_search_reuses_model(self):
+        """Test that searches reuse the model and collection given or loaded once."""
+        collection = FakeCollection()
+        collection.upsert(None, ["Spin moments."], [{}], ["AAAA1111_p1_c0"])
+        searcher = RagSearcher(model=FakeModel())
+        searcher._collection = collection
+
+        assert searcher.warm().search("spin", top_k=3) == (["Spin moments."], ["AAAA1111_p1_c0"])
+
+    def test_query_filter_and_embedding_cache(self):
+        """Test metadata filters and that repeated queries are embedded once, within the cache size."""
+        collection = FakeCollection()
+        collection.upsert(None, ["Spin.", "Orbit."], [{"item_key": "A"}, {"item_key": "B"}], ["A_p1_c0", "B_p1_c0"])
+        model = FakeModel()
+        searcher = RagSearcher(model=model, query_cache_size=2)
+        searcher._collection = collection
+
+        hits = searcher.query("spin", top_k=5, where={"item_key": {"$in": ["B"]}})
+        searcher.query("spin")
+        searcher.query("orbit")
+        searcher.query("moment")
+        searcher.query("spin")
+
+        assert [(hit.id, hit.metadata) for hit in hits] == [("B_p1_c0", {"item_key": "B"})]
+        assert model.encoded == ["spin", "orbit", "moment", "spin"]
+
+    def test_keyword_index_opened_once_built(self, tmp_path):
+        """Test that a missing keyword index is not created, and is used as soon as it is built."""
+        fts_path = tmp_path / "fts.sqlite"
+        collection = FakeCollection()
+        collection.upsert(None, ["Magnetite.", "Fe3O4 films."], [{}, {}], ["A_p1_c0", "B_p1_c0"])
+        searcher = RagSearcher(model=FakeModel(), fts_path=str(fts_path))
+        searcher._collection = collection
+
+        assert [hit.id for hit in searcher.retrieve("fe3o4", top_k=1)] == ["A_p1_c0"]
+        with pytest.raises(ValueError, match="Keyword search"):
+            searcher.retrieve("fe3o4", mode="keyword")
+        assert not fts_path.exists()
+
+        ChunkTextIndex(str(fts_path)).add(["B_p1_c0"], ["Fe3O4 films."], [{"path": "b.pdf", "item_key": "B"}])
+
+        assert [hit.id for hit in searcher.retrieve("fe3o4", top_k=1, mode="keyword")] == ["B_p1_c0"]
+
+    def test_normalized_queries(self):
+        """Test that normalize scales query embeddings to unit length, like the index's embeddings."""
+        plain = RagSearcher(model=FakeModel())
+        normalized = RagSearcher(model=FakeModel(), normalize=True)
+
+        assert plain.embed_query("spin") == [4.0, 1.0]
+        np.testing.assert_allclose(normalized.embed_query("spin"), np.array([4.0, 1.0]) / np.sqrt(17), rtol=1e-6)
+
+    def test_reciprocal_rank_fusion(self):
+        """Test that IDs ranked by both lists beat IDs ranked first by only one."""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["d", "c", "b"]], k=60)
+
+        assert [id_ for id_, _ in fused] == ["b", "c", "a", "d"]
+        assert fused[0][1] == pytest.approx(1 / 62 + 1 / 63)
+
+    def test_retrieve_modes(self, tmp_path):
+        """Test keyword, dense and hybrid retrieval with an attachment filter."""
+        collection = FakeCollection()
+        fts = ChunkTextIndex(str(tmp_path / "fts.sqlite"))
+        chunks = {
+            "A_p1_c0": ("Magnetite nanoparticles.", {"item_key": "A"}),
+            "B_p1_c0": ("Fe3O4 nanoparticles were annealed.", {"item_key": "B"}),
+            "C_p1_c0": ("Fe3O4 thin films.", {"item_key": "C"}),
+        }
+        for id_, (document, metadata) in chunks.items():
+            collection.upsert(None, [document], [metadata], [id_])
+            fts.add([id_], [document], [metadata])
+        searcher = RagSearcher(model=FakeModel(), fts_path=str(tmp_path / "fts.sqlite"))
+        searcher._collection = collection
+
+        keyword = searcher.retrieve("fe3o4", top_k=5, item_keys=["A", "B"], mode="keyword")
+        dense = searcher.retrieve("fe3o4", top_k=1, mode="dense")
+        hybrid = searcher.retrieve("Fe3O4 annealed", top_k=3)
+
+        assert [hit.id for hit in keyword] == ["B_p1_c0"]
+        assert [hit.id for hit in dense] == ["A_p1_c0"]
+        # Dense ranks A, B, C; keywords rank B, C
+        assert [hit.id for hit in hybrid] == ["B_p1_c0", "C_p1_c0", "A_p1_c0"]
+        assert hybrid[0].distance == 1.0
+        assert all(hit.score is not None for hit in hybrid)
+        with pytest.raises(ValueError):
+            searcher.retrieve("fe3o4", mode="sparse")
+
+    def test_retrieve_without_keyword_index(self):
+        """Test that hybrid retrieval falls back to dense without a keyword index."""
+        collection = FakeCollection()
+        collection.upsert(None, ["Spin."], [{}], ["A_p1_c0"])
+        searcher = RagSearcher(model=FakeModel())
+        searcher._collection = collection
+
+        assert [hit.id for hit in searcher.retrieve("spin")] == ["A_p1_c0"]
+        with pytest.raises(ValueError):
+            searcher.retrieve("spin", mode="keyword")
+
+    def test_import_has_no_side_effects(self):
+        """Test that importing the modules loads neither Chroma nor the embedding model."""
+        code = (
+            "import sys; sys.path.insert(0, sys.argv[1]); import rag_index, rag_search; "
+            "print(any(m in sys.modules for m in ('chromadb', 'sentence_transformers', 'pdfplumber', 'dotenv')))"
+        )
+        output = subprocess.run([sys.executable, "-c", code, str(SRC)], capture_output=True, text=True, check=True)
+
+        assert output.stdout.strip() == "False"
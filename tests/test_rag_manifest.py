@@ -0,0 +1,77 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from rag_manifest import RagManifest  # noqa: E402
+
+
+class TestRagManifest:
+    """Test the RAG indexing manifest."""
+
+    @pytest.fixture
+    def storage(self, tmp_path):
+        for key in ("AAAA1111", "BBBB2222"):
+            (tmp_path / "storage" / key).mkdir(parents=True)
+            (tmp_path / "storage" / key / "paper.pdf").write_bytes(key.encode())
+        return tmp_path / "storage"
+
+    @pytest.fixture
+    def manifest(self, tmp_path):
+        manifest = RagManifest(str(tmp_path / "manifest.sqlite"))
+        yield manifest
+        manifest.close()
+
+    @staticmethod
+    def pdfs(storage):
+        return sorted(str(path) for path in storage.glob("*/*.pdf"))
+
+    def test_new_files(self, storage, manifest):
+        """Test that unknown files are new and carry their storage folder as item key."""
+        scan = manifest.scan(self.pdfs(storage))
+
+        assert [state.item_key for state in scan.new] == ["AAAA1111", "BBBB2222"]
+        assert scan.changed == [] and scan.unchanged == 0 and scan.removed == []
+
+    def test_recorded_files_are_skipped(self, storage, manifest):
+        """Test that recorded files are unchanged on the next scan, failed ones included."""
+        first, second = manifest.scan(self.pdfs(storage)).new
+        manifest.record(first, chunks=3)
+        manifest.record(second, chunks=0, error="timed out after 120 s")
+
+        scan = manifest.scan(self.pdfs(storage))
+
+        assert scan.new == [] and scan.changed == [] and scan.unchanged == 2
+        assert len(manifest) == 2
+
+    def test_changed_touched_and_removed(self, storage, manifest):
+        """Test that content changes are detected, touched files are not and deleted files are removed."""
+        for state in manifest.scan(self.pdfs(storage)).new:
+            manifest.record(state, chunks=1)
+        changed = storage / "AAAA1111" / "paper.pdf"
+        changed.write_bytes(b"new content")
+        touched = storage / "BBBB2222" / "paper.pdf"
+        os.utime(touched, ns=(0, 12345))
+
+        scan = manifest.scan(self.pdfs(storage))
+
+        assert [state.path for state in scan.changed] == [str(changed)]
+        assert scan.unchanged == 1
+        assert manifest.get(str(touched)).mtime_ns == 12345
+
+        (storage / "BBBB2222" / "paper.pdf").unlink()
+        assert manifest.scan(self.pdfs(storage)).removed == [str(touched)]
+
+    def test_reset(self, storage, manifest):
+        """Test that a reset forgets all files and records the new index version."""
+        assert manifest.version is None
+        for state in manifest.scan(self.pdfs(storage)).new:
+            manifest.record(state, chunks=1)
+
+        manifest.reset("2:model:240:40")
+
+        assert manifest.version == "2:model:240:40"
+        assert len(manifest) == 0
+        assert len(manifest.scan(self.pdfs(storage)).new) == 2
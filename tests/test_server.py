@@ -0,0 +1,248 @@
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("mcp")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+# The server builds its searcher at import; the tests replace it with one on a temporary database
+os.environ.setdefault("ZOTERO_DB_PATH", str(Path(__file__).resolve().parent / "zotero.sqlite"))
+import server  # noqa: E402
+from rag_search import SearchHit  # noqa: E402
+
+
+class FakeRag:
+    """RagSearcher stand-in returning one passage, or raising the given error."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def retrieve(self, query, top_k=5, item_keys=None, mode="hybrid"):
+        self.calls.append((query, top_k, item_keys, mode))
+        if self.error is not None:
+            raise self.error
+        return [SearchHit("PDF1_p2_c0", "The XMCD  sum rules.", {"item_key": "PDF1", "page": 2}, 0.25, 0.0328)]
+
+
+def tool(function):
+    """The plain function behind an MCP tool."""
+    return getattr(function, "fn", function)
+
+
+@pytest.fixture
+def zotero_db(tmp_path):
+    """Zotero database with five papers tagged "magnetism", one "XMCD" paper, one paper in the trash and a PDF."""
+    db_path = str(tmp_path / "zotero.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE items (itemID INTEGER PRIMARY KEY, key TEXT, libraryID INTEGER);
+        CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL);
+        CREATE TABLE itemTags (itemID INTEGER, tagID INTEGER);
+        CREATE TABLE itemAttachments (itemID INTEGER PRIMARY KEY, parentItemID INTEGER);
+        CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY);
+        CREATE TABLE itemData (itemID INTEGER, fieldID INTEGER, valueID INTEGER);
+        CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value TEXT);
+        CREATE TABLE collections (collectionID INTEGER PRIMARY KEY, collectionName TEXT);
+        CREATE TABLE collectionItems (collectionID INTEGER, itemID INTEGER);
+        INSERT INTO tags VALUES (1, 'Magnetism'), (2, 'XMCD'), (3, 'spintronics');
+        INSERT INTO items VALUES (1, 'PAPER1', 1), (2, 'PAPER2', 1), (3, 'PAPER3', 1), (4, 'PAPER4', 1),
+            (5, 'PAPER5', 1), (6, 'PAPER6', 1), (7, 'TRASHED', 1), (8, 'PDF1', 1);
+        INSERT INTO itemAttachments VALUES (8, 1);
+        INSERT INTO itemTags VALUES (1, 1), (2, 1), (3, 1), (4, 1), (5, 1), (6, 2), (7, 3);
+        INSERT INTO deletedItems VALUES (7);
+        INSERT INTO itemData VALUES (1, 1, 1), (1, 90, 2);
+        INSERT INTO itemDataValues VALUES (1, 'Sum rules'), (2, 'We derive...');
+    """
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def searcher(zotero_db, tmp_path, monkeypatch):
+    """ZoteroSearcher on the temporary database, installed as the server's searcher."""
+    monkeypatch.setenv("ZOTERO_DB_PATH", zotero_db)
+    monkeypatch.setenv("ZOTERO_SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    # Polled by the tests themselves
+    monkeypatch.setenv("ZOTERO_WATCH_INTERVAL", "60")
+    searcher = server.ZoteroSearcher()
+    monkeypatch.setattr(server, "searcher", searcher)
+    yield searcher
+    searcher.watcher.stop()
+    searcher.pool.close()
+
+
+class TestLibraryState:
+    """Test the in-memory tag data of the server."""
+
+    def test_refresh_reloads_state(self, searcher, zotero_db):
+        """Test that the watcher's refresh after a write reloads the tags, which tool calls no longer check."""
+        searcher.start_watcher()
+        state = searcher.state()
+        assert state.frequencies == {"Magnetism": 5, "XMCD": 1}
+
+        conn = sqlite3.connect(zotero_db)
+        conn.execute("INSERT INTO tags VALUES (4, 'Fe3O4')")
+        conn.execute("INSERT INTO itemTags VALUES (1, 4)")
+        conn.commit()
+        conn.close()
+        assert searcher.state() is state
+
+        assert searcher.watcher.poll()
+
+        assert searcher.state() is not state
+        assert searcher.state().frequencies == {"Magnetism": 5, "XMCD": 1, "Fe3O4": 1}
+        assert searcher.state().tags.lookup("fe3o4") == [4]
+
+
+class TestTagTools:
+    """Test paging, output formats and argument checks of get_all_tags and search_by_tag."""
+
+    def test_get_all_tags_pages(self, searcher):
+        """Test that following next_cursor returns every tag once, most used first."""
+        names, cursor, pages = [], "", 0
+        while cursor is not None:
+            reply = json.loads(tool(server.get_all_tags)(limit=1, cursor=cursor, format="json"))
+            assert reply["total"] == 2
+            names.extend(tag["name"] for tag in reply["tags"])
+            cursor = reply["next_cursor"]
+            pages += 1
+
+        assert names == ["Magnetism", "XMCD"]
+        assert pages == 2
+
+    def test_get_all_tags_markdown(self, searcher):
+        """Test the markdown reply with its footer pointing to the next page."""
+        reply = tool(server.get_all_tags)(limit=1)
+
+        assert "- Magnetism (5 papers)" in reply
+        assert "XMCD" not in reply
+        assert reply.endswith('More tags: call again with cursor="1"\n')
+        assert tool(server.get_all_tags)(cursor="2") == "No more tags: the library has 2."
+
+    def test_search_by_tag_pages(self, searcher):
+        """Test that following next_cursor returns every paper of a tag once, in itemID order."""
+        keys, cursor = [], ""
+        while cursor is not None:
+            reply = json.loads(tool(server.search_by_tag)("magnetism", limit=2, cursor=cursor, format="json"))
+            assert reply["total"] == 5
+            keys.extend(paper["key"] for paper in reply["papers"])
+            cursor = reply["next_cursor"]
+
+        assert keys == ["PAPER1", "PAPER2", "PAPER3", "PAPER4", "PAPER5"]
+
+        reply = tool(server.search_by_tag)("Magnetism", limit=2, cursor="2.2")
+        assert "Showing papers 3-4" in reply
+        assert "## 3. Untitled" in reply
+        assert reply.endswith('More papers: call again with cursor="4.4"\n')
+
+    def test_search_by_tag_json(self, searcher):
+        """Test the JSON shape, with similar tags for unknown names only."""
+        reply = json.loads(tool(server.search_by_tag)("MAGNETISM", limit=1, format="json"))
+
+        assert reply == {
+            "tag": "Magnetism",
+            "total": 5,
+            "papers": [{"key": "PAPER1", "title": "Sum rules", "abstract": "We derive..."}],
+            "next_cursor": "1.1",
+        }
+
+        reply = json.loads(tool(server.search_by_tag)("magnet", format="json"))
+
+        assert reply == {"tag": "magnet", "total": 0, "papers": [], "next_cursor": None, "similar_tags": ["Magnetism"]}
+        assert "Similar tags: Magnetism" in tool(server.search_by_tag)("magnet")
+
+    @pytest.mark.parametrize("cursor", ["abc", "1.2", "-1", "1.5e3"])
+    def test_malformed_tag_cursor(self, searcher, cursor):
+        """Test that get_all_tags answers a malformed cursor with an error message."""
+        assert tool(server.get_all_tags)(cursor=cursor).startswith(f"Invalid cursor: '{cursor}'")
+
+    @pytest.mark.parametrize("cursor", ["abc", "5", "1.2.3", "3.-1"])
+    def test_malformed_paper_cursor(self, searcher, cursor):
+        """Test that search_by_tag answers a malformed cursor with an error message."""
+        assert tool(server.search_by_tag)("Magnetism", cursor=cursor).startswith(f"Invalid cursor: '{cursor}'")
+
+    def test_unknown_format(self, searcher):
+        """Test that both tools reject unknown formats, naming the supported ones."""
+        expected = "Unknown format: 'xml'. Use one of: markdown, json"
+
+        assert tool(server.get_all_tags)(format="xml") == expected
+        assert tool(server.search_by_tag)("Magnetism", format="xml") == expected
+
+    def test_limit_clamped(self, searcher, monkeypatch):
+        """Test that limits below 1 return one entry and limits above MAX_PAGE_SIZE return at most that many."""
+        for limit in (0, -5):
+            assert len(json.loads(tool(server.get_all_tags)(limit=limit, format="json"))["tags"]) == 1
+            reply = json.loads(tool(server.search_by_tag)("Magnetism", limit=limit, format="json"))
+            assert len(reply["papers"]) == 1
+
+        monkeypatch.setattr(server, "MAX_PAGE_SIZE", 3)
+        reply = json.loads(tool(server.search_by_tag)("Magnetism", limit=1000, format="json"))
+        assert len(reply["papers"]) == 3
+        assert reply["next_cursor"] == "3.3"
+
+
+class TestSemanticSearch:
+    """Test the semantic_search tool with a stand-in for the RAG searcher."""
+
+    def test_passages(self, searcher, monkeypatch):
+        """Test that passages are shown with the key and title of their paper."""
+        rag = FakeRag()
+        monkeypatch.setattr(searcher, "rag", rag)
+
+        reply = tool(server.semantic_search)("sum rules", top_k=3)
+
+        assert rag.calls == [("sum rules", 3, None, "hybrid")]
+        assert "## 1. Sum rules\n**Key**: PAPER1 (page 2)\n**Distance**: 0.250\n**Score**: 0.0328\n" in reply
+        assert "**Passage**: The XMCD sum rules." in reply
+
+    def test_top_k_clamped(self, searcher, monkeypatch):
+        """Test that top_k below 1 asks for one passage and top_k above MAX_PAGE_SIZE for at most that many."""
+        rag = FakeRag()
+        monkeypatch.setattr(searcher, "rag", rag)
+
+        for top_k in (0, -3, 10000):
+            tool(server.semantic_search)("sum rules", top_k=top_k)
+
+        assert [call[1] for call in rag.calls] == [1, 1, server.MAX_PAGE_SIZE]
+
+    def test_missing_index(self, searcher, monkeypatch):
+        """Test that a missing index is answered with a message instead of an exception."""
+        error = FileNotFoundError("No RAG index 'pdf_rag' in ./chromadb_data: build it with rag_index.py first")
+        monkeypatch.setattr(searcher, "rag", FakeRag(error))
+
+        reply = tool(server.semantic_search)("sum rules")
+
+        assert reply == f"Semantic search is unavailable. {error}"
+
+    def test_filters_match_casefolded_names(self, searcher, zotero_db, monkeypatch):
+        """Test that tag and collection filters match non-ASCII names in any case, like search_by_tag."""
+        conn = sqlite3.connect(zotero_db)
+        conn.execute("INSERT INTO tags VALUES (4, 'Ökologie')")
+        conn.execute("INSERT INTO itemTags VALUES (1, 4)")
+        conn.execute("INSERT INTO collections VALUES (1, 'Études')")
+        conn.execute("INSERT INTO collectionItems VALUES (1, 1)")
+        conn.commit()
+        conn.close()
+        rag = FakeRag()
+        monkeypatch.setattr(searcher, "rag", rag)
+
+        tool(server.semantic_search)("sum rules", tag_filter="ÖKOLOGIE")
+        tool(server.semantic_search)("sum rules", collection="ÉTUDES")
+
+        assert [call[2] for call in rag.calls] == [["PDF1"], ["PDF1"]]
+        assert tool(server.semantic_search)("sum rules", tag_filter="Ökonomie") == (
+            "No papers with PDFs found with tag: 'Ökonomie'"
+        )
+
+    def test_invalid_mode(self, searcher, monkeypatch):
+        """Test that argument errors of the searcher are passed on as the reply."""
+        monkeypatch.setattr(searcher, "rag", FakeRag(ValueError("mode must be one of hybrid, dense, keyword")))
+
+        assert tool(server.semantic_search)("sum rules", mode="fuzzy") == "mode must be one of hybrid, dense, keyword"
@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from tagindex import TagIndex, trigrams
+from zoterodb import ZoteroDatabase
+
+
+class TestTagIndex:
+    """Test the in-memory tag name lookup."""
+
+    @pytest.fixture
+    def index(self):
+        return TagIndex(
+            {
+                1: "XMCD",
+                2: "Magnetism",
+                3: "xmcd",
+                4: "magnetic anisotropy",
+                5: "Machine learning",
+                6: "Straße",
+            }
+        )
+
+    def test_trigrams(self):
+        """Test that trigrams are padded at the word boundaries."""
+        assert trigrams("ab") == {"  a", " ab", "ab "}
+
+    def test_lookup_ignores_case(self, index):
+        """Test that all spellings of a name resolve to all of its tagIDs."""
+        assert index.lookup("Xmcd") == [1, 3]
+        assert index.lookup("STRASSE") == [6]
+        assert index.lookup("spin") == []
+        assert "magnetism" in index
+        assert index.display_name("xMCD") == "XMCD"
+        assert len(index) == 5
+
+    def test_prefix(self, index):
+        """Test prefix search over the sorted names."""
+        assert index.prefix("MAG") == ["magnetic anisotropy", "Magnetism"]
+        assert index.prefix("ma", limit=1) == ["Machine learning"]
+        assert index.prefix("z") == []
+
+    def test_fuzzy(self, index):
+        """Test that misspelled names find the closest tags first."""
+        matches = index.fuzzy("magnetsm", min_similarity=0.1)
+
+        assert [name for name, _ in matches[:2]] == ["Magnetism", "magnetic anisotropy"]
+        assert matches[0][1] > matches[1][1]
+        assert index.fuzzy("magnetsm") == matches[:1]
+        assert index.fuzzy("qqq") == []
+
+    def test_suggest(self, index):
+        """Test that suggestions list prefix matches before similar names, without duplicates."""
+        assert index.suggest("magnet", limit=3) == ["magnetic anisotropy", "Magnetism"]
+        assert index.suggest("machne lerning", limit=1) == ["Machine learning"]
+
+    def test_load(self, tmp_path):
+        """Test building the index from the tags table."""
+        db_path = str(tmp_path / "zotero.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (1, 'python'), (2, 'Python')")
+        conn.commit()
+        conn.close()
+
+        with ZoteroDatabase(db_path) as db:
+            index = TagIndex.load(db)
+
+        assert index.lookup("PYTHON") == [1, 2]
+        assert index.fingerprint is not None
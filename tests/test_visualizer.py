@@ -0,0 +1,85 @@
+import gzip
+import json
+import numpy as np
+import plotly.graph_objects as go
+from unittest.mock import patch
+from visualizer import ZoteroVisualizer
+
+
+class TestCreateSimpleNetwork:
+    """Test the category network figure."""
+
+    categories = {"Physics": ["xmcd", "magnetism"], "Code": ["python", "magnetism"]}
+
+    def test_edges_in_one_trace(self, tmp_path):
+        """Test that all edges are drawn as one NaN-separated trace below the nodes."""
+        with patch.object(go.Figure, "write_html", autospec=True) as write_html:
+            ZoteroVisualizer().create_simple_network(
+                self.categories, tag_to_titles={}, save_path=str(tmp_path / "net.html")
+            )
+        fig = write_html.call_args[0][0]
+
+        assert [trace.name for trace in fig.data] == ["Edges", "Categories", "Tags"]
+        edge_x = np.asarray(fig.data[0].x, dtype=float)
+        assert len(edge_x) == 3 * 4
+        assert np.isnan(edge_x[2::3]).all()
+        assert not np.isnan(edge_x[0::3]).any()
+        assert all(isinstance(trace, go.Scatter) for trace in fig.data)
+
+    def test_edges_per_category_and_webgl(self, tmp_path):
+        """Test one edge trace per category and the switch to Scattergl above the threshold."""
+        with patch.object(go.Figure, "write_html", autospec=True) as write_html:
+            ZoteroVisualizer().create_simple_network(
+                self.categories,
+                tag_to_titles={},
+                save_path=str(tmp_path / "net.html"),
+                edges_per_category=True,
+                webgl_threshold=0,
+            )
+        fig = write_html.call_args[0][0]
+
+        assert [trace.name for trace in fig.data] == ["Physics", "Code", "Categories", "Tags"]
+        assert all(isinstance(trace, go.Scattergl) for trace in fig.data)
+        # Both edges of "magnetism" end at the same shared tag node
+        physics, code = fig.data[0], fig.data[1]
+        assert physics.x[4] == code.x[4] and physics.y[4] == code.y[4]
+
+
+class TestCompactOutput:
+    """Test the size-bounded output options."""
+
+    categories = {"Physics": ["xmcd", "magnetism"], "Code": ["python", "magnetism"]}
+    tag_to_titles = {
+        "xmcd": ["A" * 100, "Shared title"],
+        "magnetism": ["Shared title", "Third", "Fourth"],
+        "python": ["Fourth"],
+    }
+
+    def test_hover_preview_and_title_lookup(self, tmp_path):
+        """Test that titles are stored once and hovers show a truncated preview."""
+        visualizer = ZoteroVisualizer(hover_preview=1, max_title_length=10)
+        with patch.object(go.Figure, "write_html", autospec=True) as write_html:
+            visualizer.create_simple_network(
+                self.categories, self.tag_to_titles, save_path=str(tmp_path / "net.html")
+            )
+        fig = write_html.call_args[0][0]
+        titles = fig.layout.meta["titles"]
+        tags = fig.data[-1]
+
+        assert sorted(titles) == sorted({t for ts in self.tag_to_titles.values() for t in ts})
+        assert tags.hovertext[0] == "AAAAAAAAA…<br>… and 1 more"
+        assert [titles[i] for i in tags.customdata[1]] == self.tag_to_titles["magnetism"]
+
+    def test_external_plotlyjs_and_json(self, tmp_path):
+        """Test that plotly.js is written once next to the HTML and the figure as gzip JSON."""
+        visualizer = ZoteroVisualizer(include_plotlyjs="directory", hover_preview=5, write_json_gz=True)
+
+        visualizer.create_simple_network(self.categories, self.tag_to_titles, save_path=str(tmp_path / "net.html"))
+        visualizer.create_category_radar(self.categories, save_path=str(tmp_path / "radar.html"))
+
+        assert (tmp_path / "plotly.min.js").exists()
+        assert (tmp_path / "net.html").stat().st_size < 100_000
+        assert 'plot.on("plotly_click"' in (tmp_path / "net.html").read_text()
+        assert "plotly_click" not in (tmp_path / "radar.html").read_text()
+        with gzip.open(tmp_path / "radar.json.gz", "rt") as f:
+            assert json.loads(f.read())["data"][0]["type"] == "scatterpolar"
@@ -1,9 +1,14 @@
 import pytest
+import ast
+import re
 import sqlite3
 import tempfile
 import os
+import openai
 from unittest.mock import patch, MagicMock, mock_open
 from zoteroanalyzer import ZoteroAnalyzer
+from llmcache import ResponseCache
+from tests.fake_openai import FakeOpenAIServer
 
 
 class TestZoteroAnalyzer:
@@ -146,6 +151,20 @@ class TestZoteroAnalyzer:
         expected = ["python", "machine-learning", "data-science", "python"]
         assert all_tags == expected
 
+    def test_tag_frequencies(self, temp_db):
+        """Test tag frequencies aggregated in SQL."""
+        analyzer = ZoteroAnalyzer(
+            db_path=temp_db,
+            api_key="test-api-key",
+            base_url="https://api.test.com",
+            model="test-model",
+        )
+
+        frequencies = analyzer.tag_frequencies()
+
+        assert frequencies == {"python": 2, "machine-learning": 1, "data-science": 1}
+        assert analyzer.tag_frequencies() is frequencies
+
     def test_categorize_tags_obsidian(self, analyzer):
         """Test categorizing tags for Obsidian markdown."""
         with patch.object(
@@ -223,12 +242,230 @@ class TestZoteroAnalyzer:
                 mock_file.assert_called_once_with("categorized_tags.md", "w")
                 mock_file().write.assert_called_once_with("Test categorization")
 
+    def test_categorize_tags_chunked(self):
+        """Test chunked categorization against a local OpenAI-compatible server."""
+        tags = [f"tag-{i:02d}" for i in range(30)]
+
+        def responder(request):
+            chunk = ast.literal_eval(re.search(r"(\[.*?\])", FakeOpenAIServer.prompt(request)).group(1))
+            even = [t for t in chunk if int(t[-2:]) % 2 == 0]
+            odd = [t for t in chunk if int(t[-2:]) % 2 == 1]
+            # Vary the header spelling per chunk and add a tag the model made up
+            header = "Even" if chunk[0] == "tag-00" else "even "
+            return (
+                f"# {header}\n" + "|".join(f"[[{t}]]" for t in even)
+                + "\n# Odd\n" + "|".join(f"[[{t}]]" for t in odd) + "|[[invented]]"
+            )
+
+        with FakeOpenAIServer(responder) as server:
+            analyzer = ZoteroAnalyzer(
+                db_path="/test/path/db.sqlite",
+                api_key="test-api-key",
+                base_url=server.base_url,
+                model="test-model",
+            )
+            with patch.object(analyzer, "unique_tags", return_value=tags):
+                result = analyzer.categorize_tags(save=False, max_tokens_per_chunk=20)
+
+        assert len(server.requests) > 1
+        assert result.splitlines() == [
+            "# Even",
+            "|".join(f"[[{t}]]" for t in tags[0::2]),
+            "# Odd",
+            "|".join(f"[[{t}]]" for t in tags[1::2]),
+        ]
+
+    def test_categorize_tags_chunked_merges_categories(self):
+        """Test the reduce step that merges categories down to max_categories."""
+
+        def responder(request):
+            prompt = FakeOpenAIServer.prompt(request)
+            if prompt.startswith("Group the following categories"):
+                return "# Science\n[[Physics]]|[[Chemistry]]\n# Code\n[[Python]]"
+            return "# Physics\n[[xmcd]]\n# Chemistry\n[[oxides]]\n# Python\n[[numpy]]"
+
+        with FakeOpenAIServer(responder) as server:
+            analyzer = ZoteroAnalyzer(
+                db_path="/test/path/db.sqlite",
+                api_key="test-api-key",
+                base_url=server.base_url,
+                model="test-model",
+            )
+            with patch.object(analyzer, "unique_tags", return_value=["xmcd", "oxides", "numpy"]):
+                result = analyzer.categorize_tags(
+                    save=False, max_tokens_per_chunk=1000, max_categories=2
+                )
+
+        assert len(server.requests) == 2
+        assert result == "# Science\n[[xmcd]]|[[oxides]]\n# Code\n[[numpy]]\n"
+
+    def test_categorize_tags_cached(self, tmp_path):
+        """Test that unchanged tag sets are served from the cache and only new chunks are asked."""
+        tags = [f"tag-{i:02d}" for i in range(30)]
+
+        def responder(request):
+            chunk = ast.literal_eval(re.search(r"(\[.*?\])", FakeOpenAIServer.prompt(request)).group(1))
+            return "# All\n" + "|".join(f"[[{t}]]" for t in chunk)
+
+        with FakeOpenAIServer(responder) as server:
+            analyzer = ZoteroAnalyzer(
+                db_path="/test/path/db.sqlite",
+                api_key="test-api-key",
+                base_url=server.base_url,
+                model="test-model",
+                cache=ResponseCache(str(tmp_path / "cache.sqlite")),
+            )
+            with patch.object(analyzer, "unique_tags", return_value=tags):
+                first = analyzer.categorize_tags(save=False, max_tokens_per_chunk=40)
+                asked = len(server.requests)
+                assert analyzer.categorize_tags(save=False, max_tokens_per_chunk=40) == first
+                assert len(server.requests) == asked
+
+            with patch.object(analyzer, "unique_tags", return_value=tags + ["zz-new"]):
+                result = analyzer.categorize_tags(save=False, max_tokens_per_chunk=40)
+            analyzer.close()
+
+        assert len(server.requests) == asked + 1
+        assert "[[zz-new]]" in result
+
+    def test_categorize_tags_failed_chunk_keeps_others_cached(self, tmp_path):
+        """Test that the replies of the other chunks are cached even if one chunk fails for good."""
+        tags = [f"tag-{i:02d}" for i in range(30)]
+        failing = []
+
+        def responder(request):
+            chunk = ast.literal_eval(re.search(r"(\[.*?\])", FakeOpenAIServer.prompt(request)).group(1))
+            if "tag-29" in chunk and not failing:
+                failing.append(chunk)
+                return 400, {"error": {"message": "context too long", "type": "invalid_request_error"}}
+            return "# All\n" + "|".join(f"[[{t}]]" for t in chunk)
+
+        with FakeOpenAIServer(responder) as server:
+            analyzer = ZoteroAnalyzer(
+                db_path="/test/path/db.sqlite",
+                api_key="test-api-key",
+                base_url=server.base_url,
+                model="test-model",
+                cache=ResponseCache(str(tmp_path / "cache.sqlite")),
+            )
+            with patch.object(analyzer, "unique_tags", return_value=tags):
+                with pytest.raises(openai.BadRequestError):
+                    analyzer.categorize_tags(save=False, max_tokens_per_chunk=40)
+                asked = len(server.requests)
+                assert asked > 1
+
+                result = analyzer.categorize_tags(save=False, max_tokens_per_chunk=40)
+            analyzer.close()
+
+        # Only the chunk that failed is asked again
+        assert len(server.requests) == asked + 1
+        assert FakeOpenAIServer.prompt(server.requests[-1]).count("tag-29") == 1
+        assert result.count("[[") == len(tags)
+
+    def test_categorize_tags_incremental(self, tmp_path, monkeypatch):
+        """Test that only new tags are sent and removed tags are dropped locally."""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "categorized_tags.md").write_text(
+            "# Physics\n[[xmcd]]|[[removed]]\n# Old\n[[gone]]\n# Code\n[[python]]\n"
+        )
+
+        def responder(request):
+            return "# physics\n[[sum rules]]\n# Machine Learning\n[[pytorch]]|[[made-up]]"
+
+        with FakeOpenAIServer(responder) as server:
+            analyzer = ZoteroAnalyzer(
+                db_path="/test/path/db.sqlite",
+                api_key="test-api-key",
+                base_url=server.base_url,
+                model="test-model",
+            )
+            with patch.object(
+                analyzer, "unique_tags", return_value=["python", "xmcd", "sum rules", "pytorch"]
+            ):
+                result = analyzer.categorize_tags(save=True, incremental=True)
+
+        assert len(server.requests) == 1
+        prompt = FakeOpenAIServer.prompt(server.requests[0])
+        assert "['pytorch', 'sum rules']" in prompt
+        assert "['Physics', 'Old', 'Code']" in prompt
+        assert result == (
+            "# Physics\n[[xmcd]]|[[sum rules]]\n# Code\n[[python]]\n# Machine Learning\n[[pytorch]]\n"
+        )
+        assert (tmp_path / "categorized_tags.md").read_text() == result
+
+    def test_categorize_tags_incremental_no_changes(self, analyzer, tmp_path, monkeypatch):
+        """Test that an unchanged tag set does not call the model at all."""
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / "categorized_tags.md").write_text("# Code\n[[python]]\n")
+
+        with patch.object(analyzer, "unique_tags", return_value=["python"]):
+            with patch.object(analyzer.client.chat.completions, "create") as mock_create:
+                result = analyzer.categorize_tags(save=False, incremental=True)
+
+        mock_create.assert_not_called()
+        assert result == "# Code\n[[python]]\n"
+
+    def test_categorize_tags_incremental_without_previous(self, analyzer, tmp_path, monkeypatch):
+        """Test that incremental mode falls back to a full run on the first run."""
+        monkeypatch.chdir(tmp_path)
+
+        with patch.object(analyzer, "unique_tags", return_value=["python"]):
+            with patch.object(analyzer.client.chat.completions, "create") as mock_create:
+                mock_response = MagicMock()
+                mock_response.choices[0].message.content = "# Code\n[[python]]"
+                mock_create.return_value = mock_response
+
+                result = analyzer.categorize_tags(save=False, incremental=True)
+
+        mock_create.assert_called_once()
+        assert result == "# Code\n[[python]]"
+
+    def test_categorize_tags_structured(self, tmp_path, monkeypatch):
+        """Test streamed structured output with validation against the library tags."""
+        monkeypatch.chdir(tmp_path)
+        content = (
+            '{"categories": [{"name": "AI/ML", "tags": ["python", "machine-learning", "deep-learning"]}, '
+            '{"name": "ai/ml", "tags": ["python"]}]}'
+        )
+        seen = []
+
+        with FakeOpenAIServer(lambda request: content) as server:
+            analyzer = ZoteroAnalyzer(
+                db_path="/test/path/db.sqlite",
+                api_key="test-api-key",
+                base_url=server.base_url,
+                model="test-model",
+            )
+            with patch.object(
+                analyzer, "unique_tags", return_value=["python", "machine-learning", "data-science"]
+            ):
+                result = analyzer.categorize_tags_structured(
+                    save=True, on_category=lambda name, tags: seen.append(name)
+                )
+
+        request = server.requests[0]
+        assert request["stream"] is True
+        assert request["response_format"]["type"] == "json_schema"
+        assert seen == ["AI/ML", "ai/ml"]
+        assert result.categories == {"AI/ML": ["python", "machine-learning"]}
+        assert result.unknown_tags == ["deep-learning"]
+        assert result.uncategorized_tags == ["data-science"]
+        assert (tmp_path / "categorized_tags.md").read_text() == "# AI/ML\n[[python]]|[[machine-learning]]\n"
+
+    def test_categorize_tags_chunked_requires_markdown(self, analyzer):
+        """Test that chunked mode is only available for the mergeable markdown format."""
+        with patch.object(analyzer, "unique_tags", return_value=["python"]):
+            with pytest.raises(ValueError, match="for_obsidian_mardown=True"):
+                analyzer.categorize_tags(
+                    save=False, for_obsidian_mardown=False, max_tokens_per_chunk=100
+                )
+
     def test_create_word_cloud(self, analyzer):
         """Test creating word cloud."""
         with patch.object(
             analyzer,
-            "all_tags",
-            return_value=["python", "machine-learning", "data-science"],
+            "tag_frequencies",
+            return_value={"python": 2, "machine-learning": 1, "data-science": 1},
         ):
             with patch("zoteroanalyzer.WordCloud") as mock_wordcloud:
                 with patch("zoteroanalyzer.plt") as mock_plt:
@@ -237,10 +474,12 @@ class TestZoteroAnalyzer:
 
                     analyzer.create_word_cloud(width=400, height=300, max_words=50)
 
-                    analyzer.all_tags.assert_called_once()
-                    mock_wordcloud.assert_called_once()
+                    analyzer.tag_frequencies.assert_called_once()
+                    mock_wordcloud.assert_called_once_with(width=400, height=300, max_words=50)
+                    mock_wc_instance.generate_from_frequencies.assert_called_once_with(
+                        {"python": 2, "machine-learning": 1, "data-science": 1}
+                    )
                     mock_plt.figure.assert_called_once()
-                    # The WordCloud.generate() method is called, so we need to check for that
                     mock_plt.imshow.assert_called_once()
                     # Check that imshow was called with the generated wordcloud
                     call_args = mock_plt.imshow.call_args
@@ -249,6 +488,118 @@ class TestZoteroAnalyzer:
                     mock_plt.tight_layout.assert_called_once_with(pad=0)
                     mock_plt.show.assert_called_once()
 
+    def test_create_word_cloud_headless(self, temp_db, tmp_path):
+        """Test saving word clouds at several scales without displaying them."""
+        analyzer = ZoteroAnalyzer(
+            db_path=temp_db,
+            api_key="test-api-key",
+            base_url="https://api.test.com",
+            model="test-model",
+        )
+        save_path = str(tmp_path / "wordcloud.png")
+
+        with patch("zoteroanalyzer.plt") as mock_plt:
+            wordcloud = analyzer.create_word_cloud(
+                save_path=save_path, show=False, scales=[1, 2], width=100, height=50, scale=3
+            )
+
+        mock_plt.show.assert_not_called()
+        assert os.path.exists(tmp_path / "wordcloud@1x.png")
+        assert os.path.exists(tmp_path / "wordcloud@2x.png")
+        assert wordcloud.words_["python"] == 1.0
+        # The caller's scale is restored after the scaled files are written
+        assert wordcloud.scale == 3
+        assert wordcloud.to_array().shape[:2] == (150, 300)
+
+    def test_create_word_cloud_scales_without_path(self, analyzer):
+        """Test that scales without a save path is rejected."""
+        with pytest.raises(ValueError, match="scales requires a save_path"):
+            analyzer.create_word_cloud(show=False, scales=[1, 2])
+
+    def test_shared_connection(self, temp_db):
+        """Test that all queries share one connection that close() releases."""
+        with ZoteroAnalyzer(
+            db_path=temp_db,
+            api_key="test-api-key",
+            base_url="https://api.test.com",
+            model="test-model",
+        ) as analyzer:
+            analyzer.unique_tags(save=False)
+            conn = analyzer.db.connection
+            analyzer.all_tags()
+            assert analyzer.db.connection is conn
+
+        assert analyzer.db._conn is None
+
+    def test_library_is_memoized(self, temp_db):
+        """Test that the library snapshot is reused until the database changes."""
+        analyzer = ZoteroAnalyzer(
+            db_path=temp_db,
+            api_key="test-api-key",
+            base_url="https://api.test.com",
+            model="test-model",
+        )
+
+        library = analyzer.library()
+        assert analyzer.library() is library
+
+        conn = sqlite3.connect(temp_db)
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (4, 'physics')")
+        conn.execute("INSERT INTO itemTags (tagID, itemID) VALUES (4, 2)")
+        conn.commit()
+        conn.close()
+
+        assert analyzer.library() is not library
+        assert "physics" in analyzer.unique_tags(save=False)
+        analyzer.close()
+
+    def test_tag_cooccurrence(self, temp_db, tmp_path):
+        """Test the co-occurrence API, its .npz cache and the update after a database change."""
+        cache_dir = str(tmp_path / "cooccurrence")
+        analyzer = ZoteroAnalyzer(
+            db_path=temp_db,
+            api_key="test-api-key",
+            base_url="https://api.test.com",
+            model="test-model",
+        )
+
+        cooccurrence = analyzer.tag_cooccurrence(cache_dir)
+        assert analyzer.tag_cooccurrence(cache_dir) is cooccurrence
+        assert cooccurrence.count(1, 2) == 1
+        assert analyzer.tag_neighbors(k=3, method="count", min_count=1, cache_dir=cache_dir) == {
+            "python": [("machine-learning", 1.0)],
+            "machine-learning": [("python", 1.0)],
+            "data-science": [],
+        }
+        assert len(os.listdir(cache_dir)) == 1
+
+        conn = sqlite3.connect(temp_db)
+        conn.execute("INSERT INTO itemTags (tagID, itemID) VALUES (3, 3)")
+        conn.commit()
+        conn.close()
+
+        with patch("zoteroanalyzer.TagCooccurrence.from_library") as from_library:
+            updated = analyzer.tag_cooccurrence(cache_dir)
+            from_library.assert_not_called()
+        assert updated is not cooccurrence
+        assert updated.count(1, 3) == 1
+        analyzer.close()
+
+        # An unchanged database is answered from the file, without reading its tags
+        with patch("zoteroanalyzer.TagCooccurrence.from_library") as from_library, patch(
+            "zoteroanalyzer.LibrarySnapshot.load"
+        ) as load:
+            reopened = ZoteroAnalyzer(
+                db_path=temp_db,
+                api_key="test-api-key",
+                base_url="https://api.test.com",
+                model="test-model",
+            )
+            assert reopened.tag_cooccurrence(cache_dir).count(1, 3) == 1
+            from_library.assert_not_called()
+            load.assert_not_called()
+            reopened.close()
+
     def test_database_connection_error(self):
         """Test handling of database connection errors."""
         analyzer = ZoteroAnalyzer(
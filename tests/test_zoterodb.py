@@ -0,0 +1,402 @@
+import pytest
+import sqlite3
+import tempfile
+import threading
+import time
+import os
+from zoterodb import ConnectionPool, DatabaseWatcher, ZoteroDatabase, snapshot_copy
+
+
+class TestZoteroDatabase:
+    """Test the ZoteroDatabase connection manager."""
+
+    @pytest.fixture
+    def temp_db(self):
+        """Create a temporary SQLite database for testing."""
+        with tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False) as f:
+            db_path = f.name
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (1, 'python'), (2, 'physics')")
+        conn.commit()
+        conn.close()
+
+        yield db_path
+
+        os.unlink(db_path)
+
+    def test_uri(self):
+        """Test the read-only URI form."""
+        db = ZoteroDatabase("/test/path/db.sqlite")
+        assert db.uri() == "file:///test/path/db.sqlite?mode=ro"
+
+        db = ZoteroDatabase("/test/path/db.sqlite", immutable=True)
+        assert db.uri() == "file:///test/path/db.sqlite?mode=ro&immutable=1"
+
+    def test_connection_is_shared(self, temp_db):
+        """Test that the connection is opened once and reused."""
+        db = ZoteroDatabase(temp_db)
+
+        assert db.connection is db.connection
+        rows = db.execute("SELECT name FROM tags ORDER BY tagID").fetchall()
+        assert rows == [("python",), ("physics",)]
+
+    def test_connection_is_read_only(self, temp_db):
+        """Test that writes are rejected."""
+        db = ZoteroDatabase(temp_db)
+
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute("INSERT INTO tags (tagID, name) VALUES (3, 'chemistry')")
+
+    def test_snapshot(self, temp_db, tmp_path):
+        """Test that snapshot mode reads from a copy."""
+        db = ZoteroDatabase(temp_db, snapshot=True, snapshot_dir=str(tmp_path))
+        db.connection
+
+        conn = sqlite3.connect(temp_db)
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (3, 'chemistry')")
+        conn.commit()
+        conn.close()
+
+        assert db.execute("SELECT COUNT(*) FROM tags").fetchone()[0] == 2
+
+    def test_tag_frequencies(self, temp_db):
+        """Test SQL-aggregated tag counts, optionally skipping deleted items."""
+        conn = sqlite3.connect(temp_db)
+        conn.execute("CREATE TABLE itemTags (tagID INTEGER, itemID INTEGER)")
+        conn.execute("CREATE TABLE items (itemID INTEGER PRIMARY KEY, libraryID INTEGER)")
+        conn.execute("CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY)")
+        conn.execute("INSERT INTO itemTags (tagID, itemID) VALUES (1, 1), (2, 1), (1, 2), (1, 3), (5, 3)")
+        conn.execute("INSERT INTO items (itemID, libraryID) VALUES (1, 1), (2, 1), (3, 1)")
+        conn.execute("INSERT INTO deletedItems (itemID) VALUES (3)")
+        conn.commit()
+        conn.close()
+
+        db = ZoteroDatabase(temp_db)
+
+        assert db.tag_frequencies() == {"python": 3, "physics": 1, "Unknown": 1}
+        assert db.tag_frequencies(exclude_deleted=True) == {"python": 2, "physics": 1}
+
+    def test_attachments(self, temp_db):
+        """Test finding attachments by tag and mapping them to their parent items."""
+        conn = sqlite3.connect(temp_db)
+        conn.execute("CREATE TABLE items (itemID INTEGER PRIMARY KEY, key TEXT)")
+        conn.execute("CREATE TABLE itemAttachments (itemID INTEGER PRIMARY KEY, parentItemID INTEGER)")
+        conn.execute("CREATE TABLE itemTags (tagID INTEGER, itemID INTEGER)")
+        conn.execute("CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TABLE itemData (itemID INTEGER, fieldID INTEGER, valueID INTEGER)")
+        conn.execute("CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value TEXT)")
+        conn.execute(
+            "INSERT INTO items (itemID, key) VALUES "
+            "(1, 'PAPER1'), (2, 'PDF1'), (3, 'PAPER2'), (4, 'PDF2'), (5, 'LOOSE')"
+        )
+        conn.execute("INSERT INTO itemAttachments (itemID, parentItemID) VALUES (2, 1), (4, 3), (5, NULL)")
+        conn.execute("INSERT INTO itemTags (tagID, itemID) VALUES (1, 1), (1, 3), (2, 5)")
+        conn.execute("INSERT INTO deletedItems (itemID) VALUES (3)")
+        conn.execute("INSERT INTO itemData (itemID, fieldID, valueID) VALUES (1, 1, 1), (5, 1, 2)")
+        conn.execute("INSERT INTO itemDataValues (valueID, value) VALUES (1, 'Sum rules'), (2, 'Notes')")
+        conn.commit()
+        conn.close()
+
+        db = ZoteroDatabase(temp_db)
+
+        assert db.attachment_keys(tag_ids=[1]) == ["PDF1"]
+        assert db.attachment_keys(tag_ids=[2]) == ["LOOSE"]
+        assert sorted(db.attachment_keys(tag_ids=[1, 2])) == ["LOOSE", "PDF1"]
+        assert db.attachment_keys(tag_ids=[]) == []
+        assert db.attachment_parents(["PDF1", "LOOSE", "PDF2", "MISSING"]) == {
+            "PDF1": ("PAPER1", "Sum rules"),
+            "LOOSE": ("LOOSE", "Notes"),
+            "PDF2": ("PAPER2", None),
+        }
+        assert db.attachment_parents([]) == {}
+
+    def test_attachment_filters(self, temp_db):
+        """Test filtering attachments by the year and collection of their item."""
+        conn = sqlite3.connect(temp_db)
+        conn.executescript(
+            """
+            CREATE TABLE items (itemID INTEGER PRIMARY KEY, key TEXT);
+            CREATE TABLE itemAttachments (itemID INTEGER PRIMARY KEY, parentItemID INTEGER);
+            CREATE TABLE itemTags (tagID INTEGER, itemID INTEGER);
+            CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY);
+            CREATE TABLE fields (fieldID INTEGER PRIMARY KEY, fieldName TEXT);
+            CREATE TABLE itemData (itemID INTEGER, fieldID INTEGER, valueID INTEGER);
+            CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value TEXT);
+            CREATE TABLE collections (collectionID INTEGER PRIMARY KEY, collectionName TEXT);
+            CREATE TABLE collectionItems (collectionID INTEGER, itemID INTEGER);
+            INSERT INTO items VALUES (1, 'PAPER1'), (2, 'PDF1'), (3, 'PAPER2'), (4, 'PDF2');
+            INSERT INTO itemAttachments VALUES (2, 1), (4, 3);
+            INSERT INTO itemTags VALUES (1, 1), (1, 3);
+            INSERT INTO fields VALUES (6, 'date');
+            INSERT INTO itemData VALUES (1, 6, 1), (3, 6, 2);
+            INSERT INTO itemDataValues VALUES (1, '2019-03-00 March 2019'), (2, '2021-00-00 2021');
+            INSERT INTO collections VALUES (1, 'Thesis'), (2, 'Études'), (3, 'ÉTUDES');
+            INSERT INTO collectionItems VALUES (1, 3);
+        """
+        )
+        conn.commit()
+        conn.close()
+
+        db = ZoteroDatabase(temp_db)
+
+        assert sorted(db.attachment_keys()) == ["PDF1", "PDF2"]
+        assert db.attachment_keys(year=2019) == ["PDF1"]
+        assert db.attachment_keys(tag_ids=[1], collection_ids=[1]) == ["PDF2"]
+        assert db.attachment_keys(year=2019, collection_ids=[1]) == []
+        # Casefolded, unlike SQLite's ASCII-only LOWER()
+        assert db.collection_ids() == {"thesis": [1], "études": [2, 3]}
+
+    def test_items_with_tags(self, temp_db):
+        """Test listing the live items of some tagIDs with their title and abstract."""
+        conn = sqlite3.connect(temp_db)
+        conn.executescript(
+            """
+            CREATE TABLE items (itemID INTEGER PRIMARY KEY, key TEXT, libraryID INTEGER);
+            CREATE TABLE itemTags (tagID INTEGER, itemID INTEGER);
+            CREATE TABLE deletedItems (itemID INTEGER PRIMARY KEY);
+            CREATE TABLE itemData (itemID INTEGER, fieldID INTEGER, valueID INTEGER);
+            CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value TEXT);
+            INSERT INTO items VALUES (1, 'PAPER1', 1), (2, 'PAPER2', 1), (3, 'PAPER3', 1);
+            INSERT INTO itemTags VALUES (1, 1), (1, 2), (2, 3);
+            INSERT INTO deletedItems VALUES (2);
+            INSERT INTO itemData VALUES (1, 1, 1), (1, 90, 2);
+            INSERT INTO itemDataValues VALUES (1, 'Sum rules'), (2, 'We derive...');
+        """
+        )
+        conn.commit()
+        conn.close()
+
+        db = ZoteroDatabase(temp_db)
+
+        assert db.items_with_tags([1]) == [(1, "PAPER1", "Sum rules", "We derive...")]
+        assert [row[1] for row in db.items_with_tags([1, 2])] == ["PAPER1", "PAPER3"]
+        assert [row[1] for row in db.items_with_tags([1, 2], after_item_id=1, limit=1)] == ["PAPER3"]
+        assert db.items_with_tags([1, 2], limit=0) == []
+        assert db.items_with_tags([]) == []
+        assert db.count_items_with_tags([1, 2]) == 2
+
+    def test_context_manager_closes(self, temp_db):
+        """Test that leaving the context closes the connection."""
+        with ZoteroDatabase(temp_db) as db:
+            db.execute("SELECT 1")
+            assert db._conn is not None
+
+        assert db._conn is None
+
+    def test_missing_database(self):
+        """Test that a missing file is not silently created."""
+        db = ZoteroDatabase("/nonexistent/path/db.sqlite")
+
+        with pytest.raises(sqlite3.OperationalError):
+            db.execute("SELECT 1")
+
+
+class TestSnapshotCopy:
+    """Test the cached snapshot copies."""
+
+    @pytest.fixture
+    def temp_db(self, tmp_path):
+        db_path = str(tmp_path / "zotero.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (1, 'python')")
+        conn.commit()
+        conn.close()
+        return db_path
+
+    @staticmethod
+    def count_tags(path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_copy_is_reused_until_the_source_changes(self, temp_db, tmp_path):
+        """Test that an unchanged source reuses its copy and a changed one replaces it."""
+        snapshots = tmp_path / "snapshots"
+        first = snapshot_copy(temp_db, str(snapshots), pages=1)
+
+        assert snapshot_copy(temp_db, str(snapshots)) == first
+        assert self.count_tags(first) == 1
+
+        conn = sqlite3.connect(temp_db)
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (2, 'physics')")
+        conn.commit()
+        conn.close()
+        os.utime(temp_db, ns=(0, 0))
+        second = snapshot_copy(temp_db, str(snapshots))
+
+        assert second != first
+        assert self.count_tags(second) == 2
+        assert os.listdir(snapshots) == [os.path.basename(second)]
+
+    def test_copy_while_locked(self, temp_db, tmp_path):
+        """Test that a source held under an exclusive lock, as Zotero does, is still copied."""
+        zotero = sqlite3.connect(temp_db)
+        zotero.execute("PRAGMA locking_mode = EXCLUSIVE")
+        zotero.execute("BEGIN EXCLUSIVE")
+        try:
+            path = snapshot_copy(temp_db, str(tmp_path / "snapshots"), busy_timeout=0.1)
+        finally:
+            zotero.rollback()
+            zotero.close()
+
+        assert self.count_tags(path) == 1
+
+    def test_missing_source(self, tmp_path):
+        """Test that a missing database is reported, not copied."""
+        with pytest.raises(sqlite3.OperationalError):
+            snapshot_copy(str(tmp_path / "missing.sqlite"), str(tmp_path / "snapshots"))
+        assert os.listdir(tmp_path / "snapshots") == []
+
+
+class TestConnectionPool:
+    """Test the thread-safe pool of read-only connections."""
+
+    @pytest.fixture
+    def temp_db(self, tmp_path):
+        db_path = str(tmp_path / "zotero.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (1, 'python')")
+        conn.commit()
+        conn.close()
+        return db_path
+
+    def test_connections_are_reused(self, temp_db):
+        """Test that a released connection is handed out again and can move between threads."""
+        pool = ConnectionPool(temp_db, size=2)
+        with pool.connection() as db:
+            first = db.connection
+        seen = []
+
+        def query():
+            with pool.connection() as db:
+                seen.append((db.connection, db.execute("SELECT name FROM tags").fetchone()))
+
+        thread = threading.Thread(target=query)
+        thread.start()
+        thread.join()
+
+        assert seen == [(first, ("python",))]
+        assert first.execute("SELECT 1").fetchone() == (1,)
+
+    def test_size_limits_open_connections(self, temp_db):
+        """Test that callers wait for a connection once size connections are busy."""
+        pool = ConnectionPool(temp_db, size=1)
+        acquired = threading.Event()
+
+        def borrow():
+            with pool.connection():
+                acquired.set()
+
+        with pool.connection():
+            thread = threading.Thread(target=borrow)
+            thread.start()
+            assert not acquired.wait(0.1)
+        thread.join(1)
+
+        assert acquired.is_set()
+        assert pool._open == 1
+
+    def test_reload_when_database_changes(self, temp_db):
+        """Test that snapshot connections are reopened once the database file changes."""
+        pool = ConnectionPool(temp_db, check_interval=0, snapshot=True, snapshot_dir=os.path.dirname(temp_db))
+        with pool.connection() as db:
+            assert db.execute("SELECT COUNT(*) FROM tags").fetchone() == (1,)
+            conn = sqlite3.connect(temp_db)
+            conn.execute("INSERT INTO tags (tagID, name) VALUES (2, 'physics')")
+            conn.commit()
+            conn.close()
+            os.utime(temp_db, ns=(0, 0))
+            assert pool.check()
+
+        assert db._conn is None
+        assert pool.generation == 1
+        with pool.connection() as db:
+            assert db.execute("SELECT COUNT(*) FROM tags").fetchone() == (2,)
+        assert not pool.check()
+
+    def test_close(self, temp_db):
+        """Test that a closed pool closes its connections and hands out no more."""
+        pool = ConnectionPool(temp_db)
+        with pool.connection() as db:
+            db.execute("SELECT 1")
+        pool.close()
+
+        assert db._conn is None
+        with pytest.raises(RuntimeError):
+            with pool.connection():
+                pass
+
+
+class TestDatabaseWatcher:
+    """Test the background change detection."""
+
+    @pytest.fixture
+    def temp_db(self, tmp_path):
+        db_path = str(tmp_path / "zotero.sqlite")
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        conn.commit()
+        yield db_path, conn
+        conn.close()
+
+    def test_poll(self, temp_db):
+        """Test that a commit is reported once, by the next poll."""
+        db_path, conn = temp_db
+        changes = []
+        watcher = DatabaseWatcher(db_path, on_change=lambda: changes.append(1))
+
+        assert not watcher.poll()
+        assert not watcher.poll()
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (1, 'python')")
+        conn.commit()
+        assert watcher.poll()
+        assert not watcher.poll()
+        assert changes == [1]
+        watcher.stop()
+
+    def test_unreadable_database(self, tmp_path):
+        """Test that a database that cannot be opened falls back to the file stats."""
+        watcher = DatabaseWatcher(str(tmp_path / "missing.sqlite"))
+
+        assert watcher.fingerprint() == (0, 0, 0, 0, None)
+
+    def test_locked_database(self, tmp_path):
+        """Test that a poll gives up quickly while another connection holds an exclusive lock."""
+        db_path = str(tmp_path / "zotero.sqlite")
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        watcher = DatabaseWatcher(db_path, lock_timeout=0.05)
+        conn.execute("BEGIN EXCLUSIVE")
+
+        start = time.perf_counter()
+        fingerprint = watcher.fingerprint()
+
+        assert time.perf_counter() - start < 1
+        assert fingerprint[-1] is None
+        conn.execute("ROLLBACK")
+        conn.close()
+        watcher.stop()
+
+    def test_thread_calls_back(self, temp_db):
+        """Test that the thread reports changes and survives failing callbacks."""
+        db_path, conn = temp_db
+        changed = threading.Event()
+
+        def on_change():
+            changed.set()
+            raise RuntimeError("reload failed")
+
+        watcher = DatabaseWatcher(db_path, interval=0.01, on_change=on_change).start()
+        conn.execute("INSERT INTO tags (tagID, name) VALUES (1, 'python')")
+        conn.commit()
+
+        assert changed.wait(2)
+        watcher.stop()
+        assert isinstance(watcher.last_error, RuntimeError)
@@ -0,0 +1,75 @@
+import pytest
+import sqlite3
+import tempfile
+import os
+from zoterodb import ZoteroDatabase
+from zoterolibrary import LibrarySnapshot
+
+
+class TestLibrarySnapshot:
+    """Test the LibrarySnapshot in-memory model."""
+
+    @pytest.fixture
+    def temp_db(self):
+        """Create a temporary SQLite database with tags and titles."""
+        with tempfile.NamedTemporaryFile(suffix=".sqlite", delete=False) as f:
+            db_path = f.name
+
+        conn = sqlite3.connect(db_path)
+        cur = conn.cursor()
+        cur.execute("CREATE TABLE tags (tagID INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+        cur.execute("CREATE TABLE itemTags (tagID INTEGER, itemID INTEGER)")
+        cur.execute("CREATE TABLE itemData (itemID INTEGER, fieldID INTEGER, valueID INTEGER)")
+        cur.execute("CREATE TABLE itemDataValues (valueID INTEGER PRIMARY KEY, value TEXT)")
+        cur.execute(
+            "INSERT INTO tags (tagID, name) VALUES (1, 'python'), (2, 'machine-learning'), (3, 'data-science')"
+        )
+        cur.execute(
+            "INSERT INTO itemTags (tagID, itemID) VALUES (1, 1), (2, 1), (3, 2), (1, 3), (4, 3)"
+        )
+        cur.execute("INSERT INTO itemDataValues (valueID, value) VALUES (10, 'Paper A'), (11, 'Paper C')")
+        cur.execute("INSERT INTO itemData (itemID, fieldID, valueID) VALUES (1, 1, 10), (3, 1, 11)")
+        conn.commit()
+        conn.close()
+
+        yield db_path
+
+        os.unlink(db_path)
+
+    @pytest.fixture
+    def library(self, temp_db):
+        with ZoteroDatabase(temp_db) as db:
+            yield LibrarySnapshot.load(db)
+
+    def test_item_index(self, library):
+        """Test itemID -> tagIDs lookups."""
+        assert list(library.tags_for_item(1)) == [1, 2]
+        assert list(library.tags_for_item(3)) == [1, 4]
+        assert list(library.tags_for_item(99)) == []
+
+    def test_tag_index(self, library):
+        """Test tagID -> itemIDs lookups."""
+        assert list(library.items_for_tag(1)) == [1, 3]
+        assert list(library.items_for_tag(3)) == [2]
+        assert list(library.items_for_tag(99)) == []
+
+    def test_tag_names(self, library):
+        """Test unique and per-assignment tag names, with Unknown for dangling tagIDs."""
+        assert library.unique_tag_names() == ["python", "machine-learning", "data-science", "Unknown"]
+        assert library.all_tag_names() == ["python", "machine-learning", "data-science", "python", "Unknown"]
+
+    def test_tag_to_titles(self, library):
+        """Test the tag to titles mapping skips untitled items."""
+        assert library.tag_to_titles() == {
+            "python": ["Paper A", "Paper C"],
+            "machine-learning": ["Paper A"],
+            "Unknown": ["Paper C"],
+        }
+
+    def test_missing_title_tables(self):
+        """Test loading a database without itemData."""
+        pairs = [(1, 1), (1, 2)]
+        library = LibrarySnapshot({1: "python", 2: "physics"}, pairs)
+
+        assert library.tag_to_titles() == {}
+        assert library.unique_tag_names() == ["python", "physics"]
@@ -1,14 +1,71 @@
+import gzip
+import os
+import numpy as np
 import plotly.graph_objects as go
-from typing import Dict, List
-import re
+from typing import Dict, List, Optional, Tuple, Union
+
+from categories import parse_categorized_markdown
+from layout import ForceLayout, build_category_graph
+from zoterolibrary import LibrarySnapshot
+
+# Run by plotly after the figure is drawn: clicking a node lists all of its paper titles, looked up
+# through the node's customdata in layout.meta.titles, in a panel below the plot
+TITLE_LIST_SCRIPT = """
+var plot = document.getElementById("{plot_id}");
+var panel = document.createElement("div");
+panel.style.cssText = "font-family: sans-serif; font-size: 13px; margin: 8px 16px;";
+plot.parentNode.insertBefore(panel, plot.nextSibling);
+plot.on("plotly_click", function(event) {
+    var point = event.points[0];
+    var titles = (plot.layout.meta || {}).titles || [];
+    if (!point || !Array.isArray(point.customdata)) {
+        return;
+    }
+    panel.replaceChildren();
+    var heading = document.createElement("strong");
+    heading.textContent = point.text + " (" + point.customdata.length + " papers)";
+    var list = document.createElement("ul");
+    point.customdata.forEach(function(i) {
+        var item = document.createElement("li");
+        item.textContent = titles[i];
+        list.appendChild(item);
+    });
+    panel.append(heading, list);
+});
+"""
 
 
 class ZoteroVisualizer:
     """Simple visualization class for Zotero data using Plotly."""
 
-    def __init__(self):
-        """Initialize the visualizer."""
-        pass
+    def __init__(
+        self,
+        layout_engine: Optional[ForceLayout] = None,
+        include_plotlyjs: Union[bool, str] = True,
+        hover_preview: Optional[int] = None,
+        max_title_length: int = 80,
+        write_json_gz: bool = False,
+    ):
+        """
+        Initialize the visualizer.
+
+        :param layout_engine: ForceLayout used for the network. Keeping one visualizer around reuses its
+            layout cache, so re-rendering an unchanged graph skips the simulation.
+        :param include_plotlyjs: Passed to write_html. True inlines the ~3.5 MB plotly.js bundle in every
+            file, "directory" writes plotly.min.js once next to the HTML files and references it, "cdn" or
+            a path/URL ending in .js references an external copy.
+        :param hover_preview: Number of paper titles shown per node on hover. None shows all of them.
+            Otherwise the full title lists are stored once in layout.meta["titles"], every node's
+            customdata holds indices into it, and clicking a node in the HTML file lists all of its titles
+            below the plot.
+        :param max_title_length: Characters of each title shown in a hover preview.
+        :param write_json_gz: Also write the figure as gzip-compressed JSON next to the HTML file.
+        """
+        self.layout_engine = layout_engine if layout_engine is not None else ForceLayout()
+        self.include_plotlyjs = include_plotlyjs
+        self.hover_preview = hover_preview
+        self.max_title_length = max_title_length
+        self.write_json_gz = write_json_gz
 
     def parse_categorized_tags(self, categorized_content: str) -> Dict[str, List[str]]:
         """
@@ -17,27 +74,7 @@ class ZoteroVisualizer:
         :param categorized_content: String content from categorize_tags method
         :return: Dictionary with categories as keys and lists of tags as values
         """
-        categories = {}
-        current_category = None
-
-        # Split by lines and process
-        lines = categorized_content.strip().split("\n")
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Check if this is a category header (starts with #)
-            if line.startswith("#"):
-                current_category = line.lstrip("#").strip()
-                categories[current_category] = []
-            elif current_category and line:
-                # Extract tags from the line (anything in [[...]])
-                tags = re.findall(r"\[\[(.*?)\]\]", line)
-                categories[current_category].extend(tags)
-
-        return categories
+        return parse_categorized_markdown(categorized_content)
 
     def create_category_radar(
         self, categories: Dict[str, List[str]], save_path: str = "category_radar.html"
@@ -76,14 +113,16 @@ class ZoteroVisualizer:
         )
 
         # Save to HTML file
-        fig.write_html(save_path)
-        return save_path
+        return self._write_figure(fig, save_path)
 
     def create_simple_network(
         self,
         categories: Dict[str, List[str]],
         tag_to_titles: Dict[str, List[str]] = None,
         save_path: str = "category_network.html",
+        library: Optional[LibrarySnapshot] = None,
+        edges_per_category: bool = False,
+        webgl_threshold: int = 2000,
     ) -> str:
         """
         Create a simple network visualization showing categories and tags, with paper titles on hover
@@ -92,12 +131,15 @@ class ZoteroVisualizer:
         :param categories: Dictionary with categories and their tags
         :param tag_to_titles: Dictionary mapping tag names to lists of paper titles
         :param save_path: Path to save the HTML file
+        :param library: LibrarySnapshot to take the tag-to-titles mapping from if tag_to_titles is not given
+        :param edges_per_category: Draw one edge trace per category (toggleable in the legend) instead of one
+        :param webgl_threshold: Render with WebGL (Scattergl) when nodes plus edges exceed this count
         :return: Path to the saved HTML file
         """
         if tag_to_titles is None:
-            tag_to_titles = {}
+            tag_to_titles = library.tag_to_titles() if library is not None else {}
         nodes = []
-        edges = []
+        title_ids: Dict[str, int] = {}
 
         # Build category to paper titles mapping
         category_to_titles = {}
@@ -116,76 +158,66 @@ class ZoteroVisualizer:
                     "label": category,
                     "group": "category",
                     "size": 20 + 5 * len(paper_titles),
-                    "hovertext": (
-                        "<br>".join(paper_titles) if paper_titles else "No papers"
-                    ),
+                    **self._hover(paper_titles, title_ids),
                 }
             )
 
-        # Add tag nodes and edges
-        tag_id = 0
-        for category, tags in categories.items():
-            for tag in tags:
-                tag_name = f"tag_{tag_id}"
-                tag_papers = tag_to_titles.get(tag, [])
-                nodes.append(
-                    {
-                        "id": tag_name,
-                        "label": tag,
-                        "group": "tag",
-                        "size": 10 + 2 * len(tag_papers),
-                        "hovertext": (
-                            "<br>".join(tag_papers) if tag_papers else "No papers"
-                        ),
-                    }
-                )
-                edges.append({"from": category, "to": tag_name})
-                tag_id += 1
+        # Add tag nodes and edges, one shared node per tag linked to each of its categories
+        category_names, tag_names, graph_edges = build_category_graph(categories)
+        for i, tag in enumerate(tag_names):
+            tag_papers = tag_to_titles.get(tag, [])
+            nodes.append(
+                {
+                    "id": f"tag_{i}",
+                    "label": tag,
+                    "group": "tag",
+                    "size": 10 + 2 * len(tag_papers),
+                    **self._hover(tag_papers, title_ids),
+                }
+            )
+        category_nodes = [n for n in nodes if n["group"] == "category"]
+        tag_nodes = [n for n in nodes if n["group"] == "tag"]
+
+        # Force-directed layout, starting from categories on a circle and every tag
+        # at the centre of its categories
+        n_categories = len(category_names)
+        angles = 2 * np.pi * np.arange(n_categories) / max(n_categories, 1)
+        initial = np.zeros((n_categories + len(tag_names), 2))
+        initial[:n_categories] = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        if graph_edges:
+            src, dst = np.asarray(graph_edges).T
+            for axis in range(2):
+                initial[n_categories:, axis] = (
+                    np.bincount(dst, weights=initial[src, axis], minlength=len(initial))
+                    / np.maximum(np.bincount(dst, minlength=len(initial)), 1)
+                )[n_categories:]
+        positions = self.layout_engine.layout(len(initial), graph_edges, initial=initial)
+        category_positions = {
+            node["id"]: tuple(positions[i]) for i, node in enumerate(category_nodes)
+        }
+        tag_positions = {
+            node["id"]: tuple(positions[n_categories + i]) for i, node in enumerate(tag_nodes)
+        }
 
         # Create network using plotly
         fig = go.Figure()
+        scatter = go.Scattergl if len(nodes) + len(graph_edges) > webgl_threshold else go.Scatter
 
-        # Add edges
-        for edge in edges:
+        # Add edges as gap-separated polylines, drawn below the nodes
+        for name, x, y in self._edge_polylines(positions, graph_edges, category_names, edges_per_category):
             fig.add_trace(
-                go.Scatter(
-                    x=[],
-                    y=[],
+                scatter(
+                    x=x,
+                    y=y,
                     mode="lines",
                     line=dict(width=0.5, color="#888"),
                     hoverinfo="none",
-                    showlegend=False,
+                    name=name,
+                    legendgroup=name,
+                    showlegend=edges_per_category,
                 )
             )
 
-        # Add nodes
-        category_nodes = [n for n in nodes if n["group"] == "category"]
-        tag_nodes = [n for n in nodes if n["group"] == "tag"]
-
-        # Position nodes in a circle
-        import math
-
-        # Position categories in outer circle
-        category_positions = {}
-        for i, node in enumerate(category_nodes):
-            angle = 2 * math.pi * i / len(category_nodes)
-            x = 2 * math.cos(angle)
-            y = 2 * math.sin(angle)
-            category_positions[node["id"]] = (x, y)
-
-        # Position tags around their categories
-        tag_positions = {}
-        for edge in edges:
-            if edge["to"] not in tag_positions:
-                cat_x, cat_y = category_positions[edge["from"]]
-                import random
-
-                angle = random.uniform(0, 2 * math.pi)
-                radius = 0.8
-                x = cat_x + radius * math.cos(angle)
-                y = cat_y + radius * math.sin(angle)
-                tag_positions[edge["to"]] = (x, y)
-
         # Add category nodes
         cat_x = [category_positions[n["id"]][0] for n in category_nodes]
         cat_y = [category_positions[n["id"]][1] for n in category_nodes]
@@ -194,7 +226,7 @@ class ZoteroVisualizer:
         cat_hover = [n["hovertext"] for n in category_nodes]
 
         fig.add_trace(
-            go.Scatter(
+            scatter(
                 x=cat_x,
                 y=cat_y,
                 mode="markers+text",
@@ -205,6 +237,7 @@ class ZoteroVisualizer:
                 textfont=dict(size=12, color="white"),
                 hovertext=cat_hover,
                 hoverinfo="text",
+                customdata=[n.get("title_ids", []) for n in category_nodes] if title_ids else None,
             )
         )
 
@@ -216,7 +249,7 @@ class ZoteroVisualizer:
         tag_hover = [n["hovertext"] for n in tag_nodes]
 
         fig.add_trace(
-            go.Scatter(
+            scatter(
                 x=tag_x,
                 y=tag_y,
                 mode="markers+text",
@@ -227,6 +260,7 @@ class ZoteroVisualizer:
                 textfont=dict(size=8),
                 hovertext=tag_hover,
                 hoverinfo="text",
+                customdata=[n.get("title_ids", []) for n in tag_nodes] if title_ids else None,
             )
         )
 
@@ -239,8 +273,82 @@ class ZoteroVisualizer:
             margin=dict(b=20, l=5, r=5, t=40),
             xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
             yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+            # Full title lists, referenced by index from each node's customdata
+            meta={"titles": list(title_ids)} if title_ids else None,
         )
 
         # Save to HTML file
-        fig.write_html(save_path)
+        return self._write_figure(fig, save_path)
+
+    def _hover(self, titles: List[str], title_ids: Dict[str, int]) -> Dict[str, object]:
+        """
+        Build the hover fields of a node.
+
+        Without hover_preview the hovertext lists every title. Otherwise it shows the first
+        hover_preview titles, shortened to max_title_length, and the node refers to its full
+        list through indices into title_ids, which collects every title once.
+
+        :return: Dictionary with "hovertext" and, in preview mode, "title_ids".
+        """
+        if not titles:
+            return {"hovertext": "No papers"}
+        if self.hover_preview is None:
+            return {"hovertext": "<br>".join(titles)}
+        shown = [
+            title if len(title) <= self.max_title_length else title[: self.max_title_length - 1] + "…"
+            for title in titles[: self.hover_preview]
+        ]
+        if len(titles) > len(shown):
+            shown.append(f"… and {len(titles) - len(shown)} more")
+        return {
+            "hovertext": "<br>".join(shown),
+            "title_ids": [title_ids.setdefault(title, len(title_ids)) for title in titles],
+        }
+
+    def _write_figure(self, fig: go.Figure, save_path: str) -> str:
+        """
+        Write a figure to HTML, and to gzip-compressed JSON if write_json_gz is set.
+
+        :param fig: Figure to write.
+        :param save_path: Path of the HTML file. The JSON goes to the same path with a .json.gz suffix.
+        :return: Path to the saved HTML file
+        """
+        meta = fig.layout.meta
+        post_script = TITLE_LIST_SCRIPT if isinstance(meta, dict) and "titles" in meta else None
+        fig.write_html(save_path, include_plotlyjs=self.include_plotlyjs, post_script=post_script)
+        if self.write_json_gz:
+            with gzip.open(os.path.splitext(save_path)[0] + ".json.gz", "wt", encoding="utf-8") as f:
+                f.write(fig.to_json())
         return save_path
+
+    @staticmethod
+    def _edge_polylines(
+        positions: np.ndarray,
+        graph_edges: List[Tuple[int, int]],
+        category_names: List[str],
+        per_category: bool,
+    ) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+        """
+        Build edge coordinates as x0, x1, NaN, x0, x1, NaN, ... arrays, one per trace.
+
+        Plotly breaks lines at the NaN gaps, so a whole set of edges is a single trace.
+
+        :return: List of (trace name, x, y) tuples.
+        """
+        if not graph_edges:
+            return []
+        src, dst = np.asarray(graph_edges).T
+        if per_category:
+            groups = [(name, src == c) for c, name in enumerate(category_names) if np.any(src == c)]
+        else:
+            groups = [("Edges", slice(None))]
+        polylines = []
+        for name, selected in groups:
+            coords = []
+            for axis in range(2):
+                segment = np.full((len(src[selected]), 3), np.nan)
+                segment[:, 0] = positions[src[selected], axis]
+                segment[:, 1] = positions[dst[selected], axis]
+                coords.append(segment.ravel())
+            polylines.append((name, coords[0], coords[1]))
+        return polylines
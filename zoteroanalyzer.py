@@ -1,13 +1,66 @@
-import sqlite3
 import openai
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
-import random
-from typing import Dict, List
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from categories import (
+    CATEGORY_SCHEMA,
+    CategoryStreamParser,
+    StructuredCategories,
+    chunk_tags,
+    merge_categories,
+    parse_categorized_markdown,
+    render_categorized_markdown,
+)
+from cooccurrence import COOCCURRENCE_DIR, TagCooccurrence, cache_path
+from llmcache import ResponseCache
+from llmclient import AsyncLLMClient
+from zoterodb import ZoteroDatabase, file_fingerprint
+from zoterolibrary import LibrarySnapshot
+
+CATEGORIZED_TAGS_PATH = "categorized_tags.md"
+CATEGORIZE_PROMPT = (
+    "Categorize the following tags for my publication collection: {items}"
+    " One tag can belong to multiple categories. "
+    "Do not change the format of the tags."
+)
+OBSIDIAN_FORMAT = (
+    " Use the following format as an output:"
+    "# category 1 \n [[tag-1]]|[[tag-2]] \n # category 2 \n [[tag-2]]|[[tag-3]]"
+)
+STRUCTURED_FORMAT = (
+    ' Answer with a JSON object of the form {{"categories": [{{"name": "category 1", "tags": ["tag-1", "tag-2"]}}]}}.'
+)
+PLACE_PROMPT = (
+    "Assign the following new tags of my publication collection to these existing categories: "
+    "{categories} New tags: {items} Only create a new category if none of the existing ones fits. "
+    "One tag can belong to multiple categories. Do not change the format of the tags or categories."
+)
+MERGE_PROMPT = (
+    "Group the following categories of my publication collection into at most "
+    "{max_categories} broader categories: {items} "
+    "Every category must be listed exactly once. Do not change the format of the categories."
+    " Use the following format as an output:"
+    "# broader category 1 \n [[category-1]]|[[category-2]] \n # broader category 2 \n [[category-3]]"
+)
 
 
 class ZoteroAnalyzer:
-    def __init__(self, db_path: str, api_key: str, base_url: str, model: str):
+    temperature = 0.5
+
+    def __init__(
+        self,
+        db_path: str,
+        api_key: str,
+        base_url: str,
+        model: str,
+        immutable: bool = False,
+        snapshot: bool = False,
+        cache: Optional[ResponseCache] = None,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+    ):
         """
         Initialize the ZoteroAnalyzer with database path, API key, base URL, and model.
 
@@ -15,12 +68,129 @@ class ZoteroAnalyzer:
         :param api_key: API key for OpenAI.
         :param base_url: Base URL for OpenAI API.
         :param model: Model name for OpenAI API.
+        :param immutable: Open the database with immutable=1 (only safe while Zotero is closed).
+        :param snapshot: Work on a cached snapshot copy of the database so Zotero can stay open.
+        :param cache: Cache for chat completion responses. None always asks the model.
+        :param max_concurrency: Maximum number of chunk requests in flight.
+        :param requests_per_minute: Request rate limit for chunk requests. None disables it.
         """
         self.db_path = db_path
         self.api_key = api_key
         self.base_url = base_url
         self.model = model
         self.client = openai.Client(api_key=self.api_key, base_url=self.base_url)
+        self.llm = AsyncLLMClient(
+            api_key,
+            base_url,
+            model,
+            temperature=self.temperature,
+            max_concurrency=max_concurrency,
+            requests_per_minute=requests_per_minute,
+        )
+        self.db = ZoteroDatabase(db_path, immutable=immutable, snapshot=snapshot)
+        self.cache = cache
+        self._fingerprint = None
+        self._cache = {}
+
+    def close(self) -> None:
+        """
+        Close the shared database connection and the response cache.
+        """
+        self.db.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def __enter__(self) -> "ZoteroAnalyzer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _check_fresh(self) -> None:
+        """
+        Drop memoized results if the database changed since they were computed.
+        """
+        fingerprint = self.db.fingerprint()
+        if fingerprint != self._fingerprint:
+            # A copied connection would keep serving the old data, so take a fresh copy
+            if self.db.snapshot and self._fingerprint is not None:
+                self.db.close()
+            self._fingerprint = fingerprint
+            self._cache = {}
+
+    def library(self) -> LibrarySnapshot:
+        """
+        Returns the in-memory tag/item model, reloading it only when the database changed.
+
+        :return: Current LibrarySnapshot.
+        """
+        self._check_fresh()
+        if "library" not in self._cache:
+            self._cache["library"] = LibrarySnapshot.load(self.db)
+        return self._cache["library"]
+
+    def tag_frequencies(self) -> Dict[str, int]:
+        """
+        Returns how many items carry each tag, aggregated in SQL and memoized until the database changes.
+
+        :return: Dictionary with tag names as keys and item counts as values.
+        """
+        self._check_fresh()
+        if "tag_frequencies" not in self._cache:
+            self._cache["tag_frequencies"] = self.db.tag_frequencies()
+        return self._cache["tag_frequencies"]
+
+    def tag_cooccurrence(self, cache_dir: Optional[str] = COOCCURRENCE_DIR) -> TagCooccurrence:
+        """
+        Returns the sparse tag x tag co-occurrence counts, memoized until the database changes.
+
+        With a cache directory, the counts are also kept in a .npz file per database, together
+        with the file fingerprint of the database they were counted from. A later run reads
+        them back without loading the library if the database file is unchanged, and otherwise
+        only counts the items whose tags changed since, then rewrites the file.
+
+        :param cache_dir: Directory of the .npz files, see cooccurrence.cache_path(). None always counts from scratch.
+        :return: Current TagCooccurrence.
+        """
+        self._check_fresh()
+        if "tag_cooccurrence" not in self._cache:
+            path = cache_path(self.db_path, cache_dir) if cache_dir else None
+            # File stats only: PRAGMA data_version is per connection, so it means nothing to another run
+            fingerprint = file_fingerprint(self.db_path)
+            cooccurrence, saved = None, None
+            if path and os.path.exists(path):
+                try:
+                    cooccurrence, saved = TagCooccurrence.load(path)
+                except (OSError, ValueError, KeyError):
+                    # Unreadable or written by another version: count from scratch
+                    cooccurrence = None
+            if cooccurrence is None:
+                cooccurrence = TagCooccurrence.from_library(self.library())
+            elif saved != fingerprint:
+                cooccurrence.update(self.library())
+            if path and saved != fingerprint:
+                cooccurrence.save(path, fingerprint)
+            self._cache["tag_cooccurrence"] = cooccurrence
+        return self._cache["tag_cooccurrence"]
+
+    def tag_neighbors(
+        self, k: int = 10, method: str = "pmi", min_count: int = 2, cache_dir: Optional[str] = COOCCURRENCE_DIR
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        Returns the tags most related to each tag, e.g. to cluster or visualize tag relationships.
+
+        :param k: Maximum number of neighbors per tag.
+        :param method: "pmi", "jaccard" or "count", see TagCooccurrence.scores().
+        :param min_count: Ignore pairs of tags sharing fewer items.
+        :param cache_dir: Directory of the co-occurrence cache, see tag_cooccurrence().
+        :return: Dictionary with tag names as keys and (tag name, score) tuples, best first, as values.
+        """
+        library = self.library()
+        neighbors = self.tag_cooccurrence(cache_dir).top_neighbors(k, method, min_count)
+        return {
+            library.tag_name(tag_id): [(library.tag_name(other), score) for other, score in tags]
+            for tag_id, tags in neighbors.items()
+        }
 
     def get_tags_with_tagid(self) -> Dict[int, str]:
         """
@@ -28,11 +198,8 @@ class ZoteroAnalyzer:
 
         :return: Dictionary with tagID as keys and tag names as values.
         """
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        cur.execute("SELECT name, tagID FROM tags")
+        cur = self.db.execute("SELECT name, tagID FROM tags")
         tags = {tag[1]: tag[0] for tag in cur.fetchall()}
-        conn.close()
         return tags
 
     def get_item_tags(self) -> List[int]:
@@ -41,11 +208,8 @@ class ZoteroAnalyzer:
 
         :return: List of tagIDs.
         """
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        cur.execute("SELECT tagID, itemID FROM itemTags")
+        cur = self.db.execute("SELECT tagID, itemID FROM itemTags")
         item_tags = [tag[0] for tag in cur.fetchall()]
-        conn.close()
         return item_tags
 
     def unique_tags(self, save: bool = True) -> List[str]:
@@ -55,10 +219,7 @@ class ZoteroAnalyzer:
         :param save: Whether to save the unique tags to a file.
         :return: List of unique tags.
         """
-        tags = self.get_tags_with_tagid()
-        item_tags = self.get_item_tags()
-        non_empty_tags = set(item_tags)
-        unique_tags = [tags.get(i, "Unknown") for i in non_empty_tags]
+        unique_tags = list(self.tag_frequencies())
         if save:
             with open("unique_tags.txt", "w") as f:
                 f.write("\n".join(unique_tags))
@@ -70,95 +231,303 @@ class ZoteroAnalyzer:
 
         :return: List of all tags.
         """
-        tags = self.get_tags_with_tagid()
-        item_tags = self.get_item_tags()
-        all_tags = [tags.get(i, "Unknown") for i in item_tags]
-        return all_tags
+        return self.library().all_tag_names()
+
+    def _complete(self, template: str, items: List[str], **fields) -> str:
+        """
+        Fill the template with the sorted items, send it as a chat completion request and
+        return the reply text. Replies are served from and stored in the cache if one is set.
+
+        :param template: Prompt template with an {items} placeholder.
+        :param items: Tags or category names to fill in.
+        :param fields: Other template fields.
+        :return: Content of the first choice.
+        """
+        prompt, key, cached = self._prepare(template, items, **fields)
+        if cached is not None:
+            return cached
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature,
+        )
+        content = response.choices[0].message.content
+        if key is not None:
+            self.cache.set(key, content)
+        return content
+
+    def _prepare(self, template: str, items: List[str], **fields):
+        """
+        Fill the template with the sorted items and look the request up in the cache.
+
+        :return: Tuple of prompt, cache key (None without a cache) and cached reply (None on a miss).
+        """
+        items = sorted(items)
+        prompt = template.format(items=items, **fields)
+        if self.cache is None:
+            return prompt, None, None
+        key = ResponseCache.key(self.model, template, self.temperature, items, **fields)
+        return prompt, key, self.cache.get(key)
 
     def categorize_tags(
-        self, save: bool = True, for_obsidian_mardown: bool = True
+        self,
+        save: bool = True,
+        for_obsidian_mardown: bool = True,
+        max_tokens_per_chunk: Optional[int] = None,
+        max_categories: Optional[int] = None,
+        incremental: bool = False,
     ) -> str:
         """
         Categorize the tags using the chat completions API and optionally saves it as a markdown file.
 
+        With max_tokens_per_chunk set, the tags are split into chunks that are categorized
+        concurrently and merged afterwards, so large libraries do not overflow the context window.
+
+        With incremental set and a previous categorized_tags.md present, only tags that are not
+        in it yet are sent to the model, to be placed into the existing categories; tags that
+        no longer exist in the library are dropped without asking the model.
+
         :param save: Whether to save the categorized tags to a file.
         :param for_obsidian_mardown: Whether to format the output for Obsidian markdown.
+        :param max_tokens_per_chunk: Token budget for the tags of one request. None sends all tags at once.
+        :param max_categories: Ask the model to merge the chunk categories down to this many.
+        :param incremental: Update the previous categorized_tags.md instead of starting from scratch.
         :return: Categorized tags as a string.
         """
         tags = self.unique_tags(save=False)
-        if for_obsidian_mardown:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": (
-                            "Categorize the following tags for my publication collection: "
-                            + str(tags)
-                            + " One tag can belong to multiple categories. "
-                            "Do not change the format of the tags."
-                            + "Use the following format as an output:"
-                            + "# category 1 \n [[tag-1]]|[[tag-2]] \n # category 2 \n [[tag-2]]|[[tag-3]]"
-                        ),
-                    }
-                ],
-                temperature=0.5,
-            )
+        if (max_tokens_per_chunk is not None or incremental) and not for_obsidian_mardown:
+            raise ValueError("Chunked and incremental categorization require for_obsidian_mardown=True")
+        if incremental and os.path.exists(CATEGORIZED_TAGS_PATH):
+            with open(CATEGORIZED_TAGS_PATH) as f:
+                previous = parse_categorized_markdown(f.read())
+            categories = self._categorize_new_tags(previous, tags, max_tokens_per_chunk)
+            responded = render_categorized_markdown(categories)
+        elif max_tokens_per_chunk is None:
+            template = CATEGORIZE_PROMPT + (OBSIDIAN_FORMAT if for_obsidian_mardown else "")
+            responded = self._complete(template, tags)
         else:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": (
-                            "Categorize the following tags for my publication collection: "
-                            + str(tags)
-                            + " One tag can belong to multiple categories. "
-                            "Do not change the format of the tags."
-                        ),
-                    }
-                ],
-                temperature=0.5,
-            )
-        responded = response.choices[0].message.content
+            categories = self._categorize_chunked(tags, max_tokens_per_chunk, max_categories)
+            responded = render_categorized_markdown(categories)
         if save:
-            with open("categorized_tags.md", "w") as f:
-                f.write(response.choices[0].message.content)
+            with open(CATEGORIZED_TAGS_PATH, "w") as f:
+                f.write(responded)
         return responded
 
-    def create_word_cloud(self, **kwargs) -> None:
+    def _complete_chunks(self, template: str, chunks: List[List[str]], **fields) -> List[str]:
         """
-        Creates and displays a word cloud from the tags.
+        Complete one request per chunk concurrently through the async client. Cached chunks
+        are not sent, and each reply is cached as soon as it arrives, so a chunk that fails
+        does not cost the replies of the others.
 
+        :return: Reply texts in chunk order.
+        """
+        replies = [None] * len(chunks)
+        pending = []
+        for i, chunk in enumerate(chunks):
+            prompt, key, cached = self._prepare(template, chunk, **fields)
+            if cached is None:
+                pending.append((i, prompt, key))
+            else:
+                replies[i] = cached
+
+        def store(index: int, response: str) -> None:
+            i, _, key = pending[index]
+            replies[i] = response
+            if key is not None:
+                self.cache.set(key, response)
+
+        self.llm.run([prompt for _, prompt, _ in pending], on_reply=store)
+        return replies
+
+    def _categorize_chunked(
+        self,
+        tags: List[str],
+        max_tokens_per_chunk: int,
+        max_categories: Optional[int],
+    ) -> Dict[str, List[str]]:
+        """
+        Map: categorize each tag chunk concurrently. Reduce: merge the per-chunk categories.
+
+        :return: Dictionary with categories as keys and lists of tags as values.
+        """
+        responses = self._complete_chunks(
+            CATEGORIZE_PROMPT + OBSIDIAN_FORMAT, chunk_tags(tags, max_tokens_per_chunk)
+        )
+        categories = merge_categories(
+            (parse_categorized_markdown(response) for response in responses),
+            allowed_tags=tags,
+        )
+        if max_categories is not None and len(categories) > max_categories:
+            categories = self._merge_similar_categories(categories, max_categories)
+        return categories
+
+    def _categorize_new_tags(
+        self,
+        previous: Dict[str, List[str]],
+        tags: List[str],
+        max_tokens_per_chunk: Optional[int],
+    ) -> Dict[str, List[str]]:
+        """
+        Drop removed tags from the previous categories and ask the model to place only the new ones.
+
+        :return: Dictionary with categories as keys and lists of tags as values.
+        """
+        kept = merge_categories([previous], allowed_tags=tags)
+        known = {tag for category_tags in previous.values() for tag in category_tags}
+        new_tags = [tag for tag in tags if tag not in known]
+        if not new_tags:
+            return kept
+        if max_tokens_per_chunk is None:
+            chunks = [new_tags]
+        else:
+            chunks = chunk_tags(new_tags, max_tokens_per_chunk)
+        responses = self._complete_chunks(
+            PLACE_PROMPT + OBSIDIAN_FORMAT, chunks, categories=list(previous)
+        )
+        placed = merge_categories(
+            (parse_categorized_markdown(response) for response in responses),
+            allowed_tags=new_tags,
+        )
+        return merge_categories([kept, placed])
+
+    def _merge_similar_categories(
+        self, categories: Dict[str, List[str]], max_categories: int
+    ) -> Dict[str, List[str]]:
+        """
+        Ask the model to group category names (not tags) into at most max_categories broader ones.
+
+        :return: Dictionary with the merged categories as keys and lists of tags as values.
+        """
+        response = self._complete(MERGE_PROMPT, list(categories), max_categories=max_categories)
+        renamed = {
+            old.casefold(): new
+            for new, olds in parse_categorized_markdown(response).items()
+            for old in olds
+        }
+        return merge_categories(
+            {renamed.get(name.casefold(), name): tags} for name, tags in categories.items()
+        )
+
+    def iter_categorized_tags(
+        self, tags: Optional[List[str]] = None
+    ) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Categorize the tags with JSON-schema structured output and yield every category as soon
+        as it has been streamed completely, so consumers can start before the response ends.
+
+        The tags are passed through as returned by the model; see categorize_tags_structured
+        for validation against the library.
+
+        :param tags: Tags to categorize. Defaults to all unique tags.
+        :return: Iterator of (category, tags) tuples.
+        :raises ValueError: If the response does not match the schema or is truncated.
+        """
+        if tags is None:
+            tags = self.unique_tags(save=False)
+        template = CATEGORIZE_PROMPT + STRUCTURED_FORMAT
+        prompt, key, cached = self._prepare(template, tags)
+        parser = CategoryStreamParser()
+        if cached is not None:
+            yield from parser.feed(cached)
+            parser.close()
+            return
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {"name": "categorized_tags", "strict": True, "schema": CATEGORY_SCHEMA},
+            },
+            stream=True,
+        )
+        received = []
+        for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            received.append(chunk.choices[0].delta.content)
+            yield from parser.feed(received[-1])
+        parser.close()
+        if key is not None:
+            self.cache.set(key, "".join(received))
+
+    def categorize_tags_structured(
+        self,
+        save: bool = True,
+        on_category: Optional[Callable[[str, List[str]], None]] = None,
+    ) -> StructuredCategories:
+        """
+        Categorize the tags with structured output, validated against the tags in the library.
+
+        :param save: Whether to save the categorized tags to a markdown file.
+        :param on_category: Called with (category, tags) for every category while the response streams.
+        :return: StructuredCategories with the categories and the unknown and uncategorized tags.
+        """
+        tags = self.unique_tags(save=False)
+        known = set(tags)
+        parts = []
+        unknown = {}
+        for name, category_tags in self.iter_categorized_tags(tags):
+            valid = [tag for tag in category_tags if tag in known]
+            unknown.update(dict.fromkeys(tag for tag in category_tags if tag not in known))
+            if on_category is not None:
+                on_category(name, valid)
+            parts.append({name: valid})
+        categories = merge_categories(parts)
+        categorized = {tag for category_tags in categories.values() for tag in category_tags}
+        if save:
+            with open(CATEGORIZED_TAGS_PATH, "w") as f:
+                f.write(render_categorized_markdown(categories))
+        return StructuredCategories(
+            categories=categories,
+            unknown_tags=list(unknown),
+            uncategorized_tags=[tag for tag in tags if tag not in categorized],
+        )
+
+    def create_word_cloud(
+        self,
+        save_path: Optional[str] = None,
+        show: bool = True,
+        scales: Optional[Sequence[float]] = None,
+        **kwargs,
+    ) -> WordCloud:
+        """
+        Creates a word cloud from the tag frequencies and optionally displays and/or saves it.
+
+        The layout is computed once; every entry in scales re-renders that layout at a
+        different resolution, saved as "<name>@<scale>x<ext>" next to save_path. The returned
+        word cloud keeps the scale given in kwargs.
+
+        :param save_path: Path to save the rendered image to, e.g. "wordcloud.png".
+        :param show: Whether to display the word cloud with matplotlib. Set to False for headless runs.
+        :param scales: Render scales to save, e.g. [1, 2, 4]. Requires save_path.
         :param kwargs: Additional keyword arguments for WordCloud.
+        :return: The generated WordCloud.
         """
-        tags = self.all_tags()
-        tags = [tag.replace(" ", "-") for tag in tags]
-        random.shuffle(tags)  # shuffle the tags to get a random word cloud
-        wordcloud = WordCloud(regexp=r"\w[\w'-]*", **kwargs).generate(" ".join(tags))
-        plt.figure()
-        plt.imshow(wordcloud, interpolation="bilinear")
-        plt.axis("off")
-        plt.tight_layout(pad=0)
-        plt.show()
+        if scales and not save_path:
+            raise ValueError("scales requires a save_path")
+        wordcloud = WordCloud(**kwargs).generate_from_frequencies(self.tag_frequencies())
+        if save_path and scales:
+            stem, ext = os.path.splitext(save_path)
+            base_scale = wordcloud.scale
+            try:
+                for scale in scales:
+                    wordcloud.scale = scale
+                    wordcloud.to_file(f"{stem}@{scale:g}x{ext}")
+            finally:
+                wordcloud.scale = base_scale
+        elif save_path:
+            wordcloud.to_file(save_path)
+        if show:
+            plt.figure()
+            plt.imshow(wordcloud, interpolation="bilinear")
+            plt.axis("off")
+            plt.tight_layout(pad=0)
+            plt.show()
+        return wordcloud
 
     def get_tag_to_titles(self) -> Dict[str, List[str]]:
         """
         Returns a dictionary mapping tag names to a list of paper titles.
         """
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT tags.name, itemDataValues.value as title
-            FROM itemTags
-            JOIN tags ON itemTags.tagID = tags.tagID
-            JOIN itemData ON itemTags.itemID = itemData.itemID AND itemData.fieldID = 1
-            JOIN itemDataValues ON itemData.valueID = itemDataValues.valueID
-        """
-        )
-        tag_to_titles = {}
-        for tag, title in cur.fetchall():
-            tag_to_titles.setdefault(tag, []).append(title)
-        conn.close()
-        return tag_to_titles
+        return self.library().tag_to_titles()
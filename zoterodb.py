@@ -0,0 +1,656 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Iterable, List, Optional, Tuple
+
+
+def file_fingerprint(db_path: str) -> Tuple[int, ...]:
+    """
+    Returns the mtime and size of a database file and its WAL file.
+
+    :param db_path: Path to the SQLite file.
+    :return: Tuple that compares unequal after a write, (0, 0) for missing files.
+    """
+    stats = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            stats.extend([st.st_mtime_ns, st.st_size])
+        except FileNotFoundError:
+            stats.extend([0, 0])
+    return tuple(stats)
+
+
+SNAPSHOT_DIR = os.path.join(tempfile.gettempdir(), "zotero-snapshots")
+
+
+def _backup(source_uri: str, target_path: str, pages: int, busy_timeout: float) -> None:
+    """Copy a database page-stepped with the backup API, giving up once the source stayed locked for busy_timeout."""
+    source = sqlite3.connect(source_uri, uri=True, timeout=busy_timeout)
+    target = sqlite3.connect(target_path)
+    busy_since = []
+
+    def progress(status: int, remaining: int, total: int) -> None:
+        # sqlite3's backup loop retries locked steps forever, so stop it here
+        if status in (5, 6):  # SQLITE_BUSY, SQLITE_LOCKED
+            busy_since.append(time.monotonic())
+            if busy_since[-1] - busy_since[0] > busy_timeout:
+                raise sqlite3.OperationalError("database is locked")
+        else:
+            busy_since.clear()
+
+    try:
+        # Reading the schema first fails fast if Zotero holds its exclusive lock
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=pages, progress=progress, sleep=0.05)
+    finally:
+        source.close()
+        target.close()
+
+
+def snapshot_copy(
+    db_path: str, snapshot_dir: Optional[str] = None, pages: int = 256, busy_timeout: float = 2.0, retries: int = 3
+) -> str:
+    """
+    Returns the path of a consistent copy of a database, copying it only when it changed since the last copy.
+
+    The copy is made with the SQLite online backup API, pages at a time, so the
+    source is only locked for one step at a time and Zotero can keep writing.
+    While Zotero holds its exclusive lock, the file is read without locking
+    instead and the copy is only kept if the file did not change meanwhile.
+    Copies are named after the source path and file fingerprint, so every
+    process reuses the same copy until Zotero writes; older copies of the
+    same source are removed.
+
+    :param db_path: Path to the zotero.sqlite file.
+    :param snapshot_dir: Directory for the copies. Defaults to SNAPSHOT_DIR in the temp directory.
+    :param pages: Pages copied per backup step.
+    :param busy_timeout: Seconds to wait for a lock before reading without locking.
+    :param retries: Attempts at copying a file that keeps changing.
+    :return: Path of the copy.
+    """
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    os.makedirs(snapshot_dir, exist_ok=True)
+    source = Path(db_path).absolute()
+    prefix = hashlib.sha1(str(source).encode()).hexdigest()[:16]
+    for _ in range(retries):
+        fingerprint = file_fingerprint(str(source))
+        version = hashlib.sha1(repr(fingerprint).encode()).hexdigest()[:16]
+        path = os.path.join(snapshot_dir, f"{prefix}-{version}.sqlite")
+        if os.path.exists(path):
+            return path
+        partial = f"{path}.{os.getpid()}-{threading.get_ident()}.partial"
+        try:
+            try:
+                _backup(f"{source.as_uri()}?mode=ro", partial, pages, busy_timeout)
+                # A locked backup restarts on writes and is consistent; it is named after the
+                # state it started from, so a later change is copied again
+                consistent = True
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    raise
+                os.remove(partial)
+                _backup(f"{source.as_uri()}?mode=ro&immutable=1", partial, pages, busy_timeout)
+                consistent = file_fingerprint(str(source)) == fingerprint
+            if consistent:
+                os.replace(partial, path)
+                for name in os.listdir(snapshot_dir):
+                    if name.startswith(prefix) and name.endswith(".sqlite") and name != os.path.basename(path):
+                        try:
+                            os.remove(os.path.join(snapshot_dir, name))
+                        except OSError:
+                            # Still open, e.g. on Windows; removed by a later copy
+                            pass
+                return path
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    raise sqlite3.OperationalError(f"{db_path} kept changing while it was copied")
+
+
+class ZoteroDatabase:
+    """Shared read-only connection to a Zotero SQLite database.
+
+    By default the live zotero.sqlite is opened with mode=ro, which needs Zotero
+    to be closed while queries run. In snapshot mode the connection instead
+    opens an on-disk copy of the file made by snapshot_copy(), cached in
+    snapshot_dir and reused by every process until Zotero writes again; the
+    copy is opened immutable, since nothing writes to it.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        immutable: bool = False,
+        snapshot: bool = False,
+        cache_size_kib: int = 65536,
+        mmap_size: int = 268435456,
+        cached_statements: int = 128,
+        snapshot_dir: Optional[str] = None,
+        timeout: float = 5.0,
+    ):
+        """
+        Initialize the database wrapper. The connection is opened lazily on first use.
+
+        :param db_path: Path to the zotero.sqlite file.
+        :param immutable: Open with immutable=1, skipping all locking. Only safe while Zotero is closed.
+        :param snapshot: Read from a copy made with snapshot_copy() so Zotero can stay open. The copy is
+            reused while the database is unchanged and refreshed when the connection is reopened.
+        :param cache_size_kib: Page cache size in KiB for the connection.
+        :param mmap_size: Maximum number of bytes to memory-map from the database file.
+        :param cached_statements: Number of prepared statements the connection keeps for reuse.
+        :param snapshot_dir: Directory for the snapshot copies, see snapshot_copy().
+        :param timeout: Seconds a statement waits for a lock held by Zotero before failing.
+        """
+        self.db_path = db_path
+        self.immutable = immutable
+        self.snapshot = snapshot
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.snapshot_dir = snapshot_dir
+        self.timeout = timeout
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def uri(self) -> str:
+        """
+        Returns the read-only SQLite URI for the database file.
+
+        :return: URI string usable with sqlite3.connect(..., uri=True).
+        """
+        params = "mode=ro"
+        if self.immutable:
+            params += "&immutable=1"
+        return f"{Path(self.db_path).absolute().as_uri()}?{params}"
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the shared connection, opening it on first access.
+
+        :return: Open sqlite3 connection.
+        """
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # The connection may be handed between threads by ConnectionPool, which never shares it concurrently
+        options = {"check_same_thread": False, "cached_statements": self.cached_statements, "timeout": self.timeout}
+        if self.snapshot:
+            # Nothing writes to the copy, so it needs no locking
+            path = snapshot_copy(self.db_path, self.snapshot_dir)
+            conn = sqlite3.connect(f"{Path(path).as_uri()}?mode=ro&immutable=1", uri=True, **options)
+        else:
+            conn = sqlite3.connect(self.uri(), uri=True, **options)
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    def execute(self, sql: str, params: Iterable = ()) -> sqlite3.Cursor:
+        """
+        Execute a statement on the shared connection.
+
+        :param sql: SQL statement.
+        :param params: Statement parameters.
+        :return: Cursor with the results.
+        """
+        return self.connection.execute(sql, tuple(params))
+
+    def has_table(self, name: str) -> bool:
+        """
+        Check whether a table exists in the database.
+
+        :param name: Table name.
+        :return: True if the table exists.
+        """
+        cur = self.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        )
+        return cur.fetchone() is not None
+
+    def tag_frequencies(self, exclude_deleted: bool = False) -> Dict[str, int]:
+        """
+        Returns how many items carry each tag, aggregated in SQL.
+
+        :param exclude_deleted: Skip items in the trash and items without a library.
+        :return: Dictionary with tag names as keys and item counts as values.
+        """
+        where = ""
+        if exclude_deleted:
+            where = """
+                JOIN items ON itemTags.itemID = items.itemID
+                WHERE items.libraryID IS NOT NULL
+                    AND items.itemID NOT IN (SELECT itemID FROM deletedItems)
+            """
+        cur = self.execute(
+            f"""
+            SELECT COALESCE(tags.name, 'Unknown'), COUNT(*)
+            FROM itemTags
+            LEFT JOIN tags ON itemTags.tagID = tags.tagID
+            {where}
+            GROUP BY itemTags.tagID
+        """
+        )
+        frequencies: Dict[str, int] = {}
+        for name, count in cur:
+            frequencies[name] = frequencies.get(name, 0) + count
+        return frequencies
+
+    def items_with_tags(
+        self, tag_ids: Iterable[int], after_item_id: int = 0, limit: int = -1
+    ) -> List[Tuple[int, str, Optional[str], Optional[str]]]:
+        """
+        Returns the items carrying any of the given tags, skipping items in the trash and items without a library.
+
+        The tags are matched by ID, e.g. from a TagIndex lookup, so the query only
+        uses the integer indexes of itemTags and deletedItems. Items come in itemID
+        order, so a page can continue after the last itemID of the previous one.
+
+        :param tag_ids: tagIDs to match.
+        :param after_item_id: Only return items with a larger itemID.
+        :param limit: Maximum number of items, -1 for all.
+        :return: List of (itemID, item key, title, abstract) tuples.
+        """
+        cur = self.execute(
+            """
+            SELECT
+                items.itemID,
+                items.key,
+                title.value as title,
+                abstract.value as abstract
+            FROM items
+            LEFT JOIN itemData title_data ON items.itemID = title_data.itemID AND title_data.fieldID = 1
+            LEFT JOIN itemDataValues title ON title_data.valueID = title.valueID
+            LEFT JOIN itemData abstract_data ON items.itemID = abstract_data.itemID AND abstract_data.fieldID = 90
+            LEFT JOIN itemDataValues abstract ON abstract_data.valueID = abstract.valueID
+            WHERE items.itemID IN (
+                    SELECT itemID FROM itemTags WHERE tagID IN (SELECT value FROM json_each(?))
+                )
+                AND NOT EXISTS (SELECT 1 FROM deletedItems WHERE deletedItems.itemID = items.itemID)
+                AND items.libraryID IS NOT NULL
+                AND items.itemID > ?
+            ORDER BY items.itemID
+            LIMIT ?
+        """,
+            (json.dumps([int(tag_id) for tag_id in tag_ids]), int(after_item_id), int(limit)),
+        )
+        return cur.fetchall()
+
+    def count_items_with_tags(self, tag_ids: Iterable[int]) -> int:
+        """
+        Returns the number of items items_with_tags() lists for the given tags.
+
+        :param tag_ids: tagIDs to match.
+        :return: Number of items.
+        """
+        cur = self.execute(
+            """
+            SELECT COUNT(*) FROM items
+            WHERE items.itemID IN (
+                    SELECT itemID FROM itemTags WHERE tagID IN (SELECT value FROM json_each(?))
+                )
+                AND NOT EXISTS (SELECT 1 FROM deletedItems WHERE deletedItems.itemID = items.itemID)
+                AND items.libraryID IS NOT NULL
+        """,
+            (json.dumps([int(tag_id) for tag_id in tag_ids]),),
+        )
+        return cur.fetchone()[0]
+
+    def attachment_keys(
+        self,
+        tag_ids: Optional[Iterable[int]] = None,
+        year: Optional[int] = None,
+        collection_ids: Optional[Iterable[int]] = None,
+    ) -> List[str]:
+        """
+        Returns the keys of the attachments whose item matches all given filters.
+
+        An attachment matches through its parent item, or through itself if it is a
+        standalone attachment. Items in the trash are skipped. Names are resolved to IDs
+        by the caller, e.g. with TagIndex, which matches them casefolded.
+
+        :param tag_ids: tagIDs of which the item or the attachment must carry one.
+        :param year: Year of the item's date field.
+        :param collection_ids: collectionIDs of which the item must be in one.
+        :return: Attachment keys, i.e. the names of their folders in Zotero's storage.
+        """
+        conditions = ["owner NOT IN (SELECT itemID FROM deletedItems)"]
+        params: List = []
+        if tag_ids is not None:
+            conditions.append(
+                """EXISTS (
+                    SELECT 1 FROM itemTags
+                    WHERE itemTags.itemID IN (attachmentID, owner)
+                        AND itemTags.tagID IN (SELECT value FROM json_each(?))
+                )"""
+            )
+            params.append(json.dumps(list(tag_ids)))
+        if year is not None:
+            # Zotero stores dates as "YYYY-MM-DD original text"
+            conditions.append(
+                """EXISTS (
+                    SELECT 1 FROM itemData
+                    JOIN fields ON itemData.fieldID = fields.fieldID
+                    JOIN itemDataValues ON itemData.valueID = itemDataValues.valueID
+                    WHERE itemData.itemID = owner AND fields.fieldName = 'date'
+                        AND SUBSTR(itemDataValues.value, 1, 4) = ?
+                )"""
+            )
+            params.append(f"{int(year):04d}")
+        if collection_ids is not None:
+            conditions.append(
+                """EXISTS (
+                    SELECT 1 FROM collectionItems
+                    WHERE collectionItems.itemID = owner
+                        AND collectionItems.collectionID IN (SELECT value FROM json_each(?))
+                )"""
+            )
+            params.append(json.dumps(list(collection_ids)))
+        cur = self.execute(
+            f"""
+            SELECT DISTINCT key FROM (
+                SELECT items.key, itemAttachments.itemID AS attachmentID,
+                    COALESCE(itemAttachments.parentItemID, itemAttachments.itemID) AS owner
+                FROM itemAttachments
+                JOIN items ON items.itemID = itemAttachments.itemID
+            )
+            WHERE {" AND ".join(conditions)}
+        """,
+            params,
+        )
+        return [key for (key,) in cur]
+
+    def collection_ids(self) -> Dict[str, List[int]]:
+        """
+        Returns the collectionIDs of every collection name, casefolded like TagIndex names.
+
+        :return: Dictionary with casefolded collection names as keys and collectionIDs as values.
+        """
+        ids: Dict[str, List[int]] = {}
+        for collection_id, name in self.execute("SELECT collectionID, collectionName FROM collections"):
+            ids.setdefault(name.casefold(), []).append(collection_id)
+        return ids
+
+    def attachment_parents(self, attachment_keys: Iterable[str]) -> Dict[str, Tuple[str, Optional[str]]]:
+        """
+        Returns the key and title of the item each attachment belongs to.
+
+        Standalone attachments map to their own key and title.
+
+        :param attachment_keys: Attachment keys.
+        :return: Dictionary with attachment keys as keys and (item key, title) tuples as values.
+        """
+        keys = list(dict.fromkeys(attachment_keys))
+        if not keys:
+            return {}
+        cur = self.execute(
+            """
+            SELECT attachment.key, COALESCE(parent.key, attachment.key), title.value
+            FROM items attachment
+            LEFT JOIN itemAttachments ON itemAttachments.itemID = attachment.itemID
+            LEFT JOIN items parent ON parent.itemID = itemAttachments.parentItemID
+            LEFT JOIN itemData title_data
+                ON title_data.itemID = COALESCE(parent.itemID, attachment.itemID) AND title_data.fieldID = 1
+            LEFT JOIN itemDataValues title ON title_data.valueID = title.valueID
+            WHERE attachment.key IN (SELECT value FROM json_each(?))
+        """,
+            (json.dumps(keys),),
+        )
+        return {key: (item_key, title) for key, item_key, title in cur}
+
+    def fingerprint(self) -> Tuple[int, ...]:
+        """
+        Returns a value that changes whenever Zotero writes to the database.
+
+        Combines the mtime and size of the database and its WAL file with
+        PRAGMA data_version, which changes when another connection commits.
+
+        :return: Tuple that compares unequal after any write.
+        """
+        stats = file_fingerprint(self.db_path)
+        if self.snapshot or self.immutable:
+            # The connection cannot see new writes, so data_version never moves
+            return stats
+        data_version = self.execute("PRAGMA data_version").fetchone()[0]
+        return stats + (data_version,)
+
+    def close(self) -> None:
+        """
+        Close the shared connection if it is open.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "ZoteroDatabase":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class ConnectionPool:
+    """Thread-safe pool of read-only ZoteroDatabase connections for long-running processes such as the MCP server.
+
+    Connections are opened on demand, up to size, and reused with their page
+    cache and prepared statements, so repeated queries are neither reconnected
+    nor re-parsed. When the database files change, the pool starts a new
+    generation: idle connections are closed and busy ones are closed when
+    released, so snapshot and immutable connections, which cannot see new
+    writes, are reopened on the current data.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        check_interval: Optional[float] = 1.0,
+        cached_statements: int = 256,
+        **options,
+    ):
+        """
+        :param db_path: Path to the zotero.sqlite file.
+        :param size: Maximum number of open connections; further callers wait for one to be released.
+        :param check_interval: Minimum seconds between checks of the database files for changes.
+            None disables the checks, e.g. when a DatabaseWatcher calls reload() instead.
+        :param cached_statements: Number of prepared statements each connection keeps for reuse.
+        :param options: Further ZoteroDatabase options, e.g. snapshot=True.
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.db_path = db_path
+        self.size = size
+        self.check_interval = check_interval
+        self.options = dict(options, cached_statements=cached_statements)
+        self._idle: List[Tuple[ZoteroDatabase, int]] = []
+        self._open = 0
+        self._generation = 0
+        self._closed = False
+        self._available = threading.Condition()
+        self._fingerprint = file_fingerprint(db_path)
+        self._checked = time.monotonic()
+
+    @property
+    def generation(self) -> int:
+        """Number of reloads so far; caches derived from the database can compare it to know when to refresh."""
+        return self._generation
+
+    @contextmanager
+    def connection(self) -> Iterator[ZoteroDatabase]:
+        """
+        Borrow a connection for the duration of a with block.
+
+        :return: Context manager yielding a ZoteroDatabase.
+        """
+        db, generation = self._acquire()
+        try:
+            yield db
+        finally:
+            self._release(db, generation)
+
+    def _acquire(self) -> Tuple[ZoteroDatabase, int]:
+        self.check()
+        with self._available:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._open < self.size:
+                    self._open += 1
+                    # Opened lazily by ZoteroDatabase on first use, outside the lock
+                    return ZoteroDatabase(self.db_path, **self.options), self._generation
+                self._available.wait()
+
+    def _release(self, db: ZoteroDatabase, generation: int) -> None:
+        with self._available:
+            if self._closed or generation != self._generation:
+                db.close()
+                self._open -= 1
+            else:
+                self._idle.append((db, generation))
+            self._available.notify()
+
+    def check(self, force: bool = False) -> bool:
+        """
+        Reload the pool if the database files changed since the last check.
+
+        :param force: Check even if the last check was less than check_interval ago.
+        :return: True if the pool was reloaded.
+        """
+        with self._available:
+            now = time.monotonic()
+            if not force and (self.check_interval is None or now - self._checked < self.check_interval):
+                return False
+            self._checked = now
+            fingerprint = file_fingerprint(self.db_path)
+            if fingerprint == self._fingerprint:
+                return False
+            self._fingerprint = fingerprint
+        self.reload()
+        return True
+
+    def reload(self) -> None:
+        """
+        Start a new generation: close the idle connections and retire the busy ones.
+        """
+        with self._available:
+            self._generation += 1
+            for db, _ in self._idle:
+                db.close()
+            self._open -= len(self._idle)
+            self._idle.clear()
+            self._available.notify_all()
+
+    def close(self) -> None:
+        """
+        Close the idle connections; busy ones are closed when released.
+        """
+        with self._available:
+            self._closed = True
+        self.reload()
+
+    def __enter__(self) -> "ConnectionPool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class DatabaseWatcher:
+    """Background thread that polls a Zotero database and calls back after every write.
+
+    Each poll compares the mtime and size of the database and WAL files and
+    PRAGMA data_version, which also catches commits that leave the file stats
+    unchanged. While Zotero holds its exclusive lock the data_version cannot be
+    read and the file stats alone are compared. A change is reported at most
+    interval seconds after it happened.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        interval: float = 2.0,
+        on_change: Optional[Callable[[], None]] = None,
+        lock_timeout: float = 0.1,
+    ):
+        """
+        :param db_path: Path to the zotero.sqlite file.
+        :param interval: Seconds between polls.
+        :param on_change: Called from the watcher thread after each detected change.
+        :param lock_timeout: Seconds a poll waits for Zotero's lock before comparing the file stats only.
+        """
+        self.db_path = db_path
+        self.interval = interval
+        self.on_change = on_change
+        self.last_error: Optional[Exception] = None
+        # A short timeout keeps polls at the interval while Zotero holds its lock
+        self._db = ZoteroDatabase(db_path, timeout=lock_timeout)
+        self._fingerprint: Optional[Tuple] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def fingerprint(self) -> Tuple:
+        """
+        Returns the current fingerprint of the database.
+
+        :return: File stats and data_version, or the file stats and None if the database cannot be read.
+        """
+        try:
+            return self._db.fingerprint()
+        except sqlite3.Error:
+            # Locked by Zotero or replaced on disk: reconnect on the next poll
+            self._db.close()
+            return file_fingerprint(self.db_path) + (None,)
+
+    def poll(self) -> bool:
+        """
+        Check the database once and call on_change if it changed since the previous poll.
+
+        :return: True if the database changed.
+        """
+        fingerprint = self.fingerprint()
+        changed = self._fingerprint is not None and fingerprint != self._fingerprint
+        self._fingerprint = fingerprint
+        if changed and self.on_change is not None:
+            try:
+                self.on_change()
+            except Exception as e:
+                # Keep watching; the next change retries
+                self.last_error = e
+        return changed
+
+    def start(self) -> "DatabaseWatcher":
+        """
+        Take the current state as the baseline and start polling in a daemon thread.
+
+        :return: The watcher itself.
+        """
+        if self._thread is None:
+            self.poll()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="zotero-db-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def stop(self) -> None:
+        """
+        Stop polling and close the watcher's connection.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._db.close()
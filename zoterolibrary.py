@@ -0,0 +1,153 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from zoterodb import ZoteroDatabase
+
+
+class LibrarySnapshot:
+    """In-memory tag/item model of a Zotero library, loaded in one pass."""
+
+    def __init__(
+        self,
+        tag_names: Dict[int, str],
+        item_tag_pairs: Sequence[Tuple[int, int]],
+        titles: Optional[Dict[int, str]] = None,
+        fingerprint: Optional[tuple] = None,
+    ):
+        """
+        Build the indexes from (itemID, tagID) pairs sorted by itemID, then tagID.
+
+        Both directions are stored as CSR-style arrays: a sorted key array, an
+        offsets array and a flat values array, so a 50k-item library costs a few
+        hundred KB instead of one Python list per item.
+
+        :param tag_names: Dictionary with tagID as keys and tag names as values.
+        :param item_tag_pairs: (itemID, tagID) pairs sorted by itemID, then tagID.
+        :param titles: Dictionary with itemID as keys and titles as values.
+        :param fingerprint: Database fingerprint the snapshot was loaded at.
+        """
+        self.tag_names = tag_names
+        self.titles = titles if titles is not None else {}
+        self.fingerprint = fingerprint
+
+        # itemID -> tagIDs
+        self.item_ids = array("q")
+        self.item_offsets = array("q", [0])
+        self.item_tag_ids = array("q")
+        for item_id, tag_id in item_tag_pairs:
+            if not self.item_ids or self.item_ids[-1] != item_id:
+                if self.item_ids:
+                    self.item_offsets.append(len(self.item_tag_ids))
+                self.item_ids.append(item_id)
+            self.item_tag_ids.append(tag_id)
+        if self.item_ids:
+            self.item_offsets.append(len(self.item_tag_ids))
+
+        # tagID -> itemIDs, built with a counting sort over the item index
+        counts: Dict[int, int] = {}
+        for tag_id in self.item_tag_ids:
+            counts[tag_id] = counts.get(tag_id, 0) + 1
+        self.tag_ids = array("q", sorted(counts))
+        self.tag_offsets = array("q", [0])
+        cursor = {}
+        for tag_id in self.tag_ids:
+            cursor[tag_id] = self.tag_offsets[-1]
+            self.tag_offsets.append(self.tag_offsets[-1] + counts[tag_id])
+        self.tag_item_ids = array("q", bytes(8 * len(self.item_tag_ids)))
+        for i, item_id in enumerate(self.item_ids):
+            for k in range(self.item_offsets[i], self.item_offsets[i + 1]):
+                tag_id = self.item_tag_ids[k]
+                self.tag_item_ids[cursor[tag_id]] = item_id
+                cursor[tag_id] += 1
+
+    @classmethod
+    def load(cls, db: ZoteroDatabase) -> "LibrarySnapshot":
+        """
+        Load the tags, tag assignments and titles from the database.
+
+        :param db: Database to read from.
+        :return: New LibrarySnapshot.
+        """
+        fingerprint = db.fingerprint()
+        tag_names = {tag_id: name for tag_id, name in db.execute("SELECT tagID, name FROM tags")}
+        pairs = db.execute("SELECT itemID, tagID FROM itemTags ORDER BY itemID, tagID")
+        titles = {}
+        if db.has_table("itemData") and db.has_table("itemDataValues"):
+            cur = db.execute(
+                """
+                SELECT itemData.itemID, itemDataValues.value
+                FROM itemData
+                JOIN itemDataValues ON itemData.valueID = itemDataValues.valueID
+                WHERE itemData.fieldID = 1
+            """
+            )
+            titles = dict(cur.fetchall())
+        return cls(tag_names, pairs, titles=titles, fingerprint=fingerprint)
+
+    @staticmethod
+    def _lookup(keys: array, offsets: array, values: array, key: int) -> array:
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return array("q")
+        return values[offsets[i]:offsets[i + 1]]
+
+    def tag_name(self, tag_id: int) -> str:
+        """
+        Returns the name of a tag, or "Unknown" for dangling tagIDs.
+
+        :param tag_id: tagID to look up.
+        :return: Tag name.
+        """
+        return self.tag_names.get(tag_id, "Unknown")
+
+    def tags_for_item(self, item_id: int) -> array:
+        """
+        Returns the tagIDs assigned to an item.
+
+        :param item_id: itemID to look up.
+        :return: Array of tagIDs.
+        """
+        return self._lookup(self.item_ids, self.item_offsets, self.item_tag_ids, item_id)
+
+    def items_for_tag(self, tag_id: int) -> array:
+        """
+        Returns the itemIDs carrying a tag.
+
+        :param tag_id: tagID to look up.
+        :return: Array of itemIDs.
+        """
+        return self._lookup(self.tag_ids, self.tag_offsets, self.tag_item_ids, tag_id)
+
+    def unique_tag_names(self) -> List[str]:
+        """
+        Returns the names of all tags that are assigned to at least one item.
+
+        :return: List of unique tag names.
+        """
+        return [self.tag_name(tag_id) for tag_id in self.tag_ids]
+
+    def all_tag_names(self) -> List[str]:
+        """
+        Returns the tag name of every tag assignment, ordered by itemID.
+
+        :return: List of tag names including duplicates.
+        """
+        return [self.tag_name(tag_id) for tag_id in self.item_tag_ids]
+
+    def tag_to_titles(self) -> Dict[str, List[str]]:
+        """
+        Returns a dictionary mapping tag names to the titles of their items.
+
+        :return: Dictionary with tag names as keys and lists of titles as values.
+        """
+        tag_to_titles = {}
+        for i, tag_id in enumerate(self.tag_ids):
+            titles = [
+                self.titles[item_id]
+                for item_id in self.tag_item_ids[self.tag_offsets[i]:self.tag_offsets[i + 1]]
+                if item_id in self.titles
+            ]
+            if titles:
+                tag_to_titles.setdefault(self.tag_name(tag_id), []).extend(titles)
+        return tag_to_titles